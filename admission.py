@@ -0,0 +1,283 @@
+"""Cost-aware admission control for model calls.
+
+Each request is admitted against two token buckets, one per client (IP) and one
+global, using an estimate of its token cost. When the response arrives the real
+usage is charged and the estimate refunded; usage from a hedged call that
+finishes after its request was settled is billed when it arrives. Requests that do not fit, because
+budgets are exhausted or ``max_concurrent`` upstream calls are already running,
+wait in a priority queue (cheaper requests first) instead of being rejected
+outright. They are only turned away after ``max_wait`` seconds.
+
+Bucket levels and a per-request usage ledger live in SQLite, so budgets survive
+restarts and are shared by all workers using the same file.
+"""
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('solar_assistant')
+
+GLOBAL_KEY = "__global__"
+
+# Tokens used by model calls made on behalf of the current request. Executors that
+# run model calls in worker threads copy the context so usage is still attributed.
+current_charge = contextvars.ContextVar("admission_charge", default=None)
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a request could not be admitted within the wait limit"""
+
+
+class Charge:
+    """Accumulates real token usage reported by the model for one request.
+
+    Usage reported after the request has been settled (e.g. by a hedged call that
+    lost the race but still completed) is passed to ``on_late`` so it is billed too.
+    """
+
+    def __init__(self, on_late=None):
+        self.tokens = 0
+        self.reported = False
+        self.settled = False
+        self.on_late = on_late
+        self._lock = threading.Lock()
+
+    def add(self, tokens):
+        with self._lock:
+            late = self.settled
+            if not late:
+                self.tokens += tokens
+                self.reported = True
+        if late and self.on_late is not None:
+            self.on_late(tokens)
+
+    def settle(self):
+        """Stop accumulating; returns (tokens, reported)"""
+        with self._lock:
+            self.settled = True
+            return self.tokens, self.reported
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)"""
+    return max(1, len(text) // 4)
+
+
+def record_usage(usage):
+    """Charge a response's ``usage`` to the request currently being admitted"""
+    charge = current_charge.get()
+    if charge is None or usage is None:
+        return
+    total = usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+    if isinstance(total, int):
+        charge.add(total)
+
+
+class TokenBudgetStore:
+    """SQLite-backed token buckets and usage ledger"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or ":memory:"
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            if db_path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                               "(key TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS ledger (ts REAL NOT NULL, client TEXT NOT NULL, "
+                               "estimated INTEGER NOT NULL, actual INTEGER NOT NULL, outcome TEXT NOT NULL)")
+
+    def _level(self, key, capacity, rate, now):
+        row = self._conn.execute("SELECT level, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return capacity
+        level, updated = row
+        return min(capacity, level + max(0.0, now - updated) * rate)
+
+    def _set(self, key, level, now):
+        self._conn.execute("INSERT INTO buckets (key, level, updated) VALUES (?, ?, ?) "
+                           "ON CONFLICT(key) DO UPDATE SET level = excluded.level, updated = excluded.updated",
+                           (key, level, now))
+
+    def try_reserve(self, buckets, amount):
+        """Atomically take ``amount`` from every ``(key, capacity, rate)`` bucket.
+
+        Returns None on success, otherwise the key of the first bucket that was short.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                levels = []
+                for key, capacity, rate in buckets:
+                    level = self._level(key, capacity, rate, now)
+                    if level < min(amount, capacity):
+                        self._conn.execute("ROLLBACK")
+                        return key
+                    levels.append((key, level))
+                for key, level in levels:
+                    self._set(key, level - amount, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return None
+
+    def adjust(self, buckets, delta):
+        """Add ``delta`` tokens to each bucket (negative to charge extra usage)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, capacity, rate in buckets:
+                    self._set(key, min(capacity, self._level(key, capacity, rate, now) + delta), now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def record(self, client, estimated, actual, outcome):
+        with self._lock:
+            self._conn.execute("INSERT INTO ledger (ts, client, estimated, actual, outcome) VALUES (?, ?, ?, ?, ?)",
+                               (time.time(), client, estimated, actual, outcome))
+
+    def level(self, key, capacity, rate):
+        with self._lock:
+            return self._level(key, capacity, rate, time.time())
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "client_blocked")
+
+    def __init__(self, priority, seq):
+        self.priority = priority
+        self.seq = seq
+        self.client_blocked = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """Admits model calls against token budgets, queueing by priority when saturated"""
+
+    def __init__(self, store, client_capacity=60000, client_per_hour=30000, global_capacity=1000000,
+                 global_per_hour=500000, max_concurrent=8, max_wait=30.0, poll_interval=0.25):
+        self.store = store
+        self.client_capacity = client_capacity
+        self.client_rate = client_per_hour / 3600.0
+        self.global_capacity = global_capacity
+        self.global_rate = global_per_hour / 3600.0
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._queue = []
+        self._active = 0
+        self._seq = itertools.count()
+
+    def _buckets(self, client):
+        return [(f"client:{client}", self.client_capacity, self.client_rate),
+                (GLOBAL_KEY, self.global_capacity, self.global_rate)]
+
+    def _head(self):
+        """Best-priority waiter that is not stalled on its own client budget"""
+        for waiter in sorted(self._queue):
+            if not waiter.client_blocked:
+                return waiter
+        return None
+
+    def _acquire(self, client, estimate, priority):
+        waiter = _Waiter(priority, next(self._seq))
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            heapq.heappush(self._queue, waiter)
+        try:
+            while True:
+                with self._cond:
+                    # A client-blocked waiter retries its own budget without holding up others
+                    eligible = self._active < self.max_concurrent and (waiter.client_blocked or
+                                                                       self._head() is waiter)
+                    if eligible:
+                        self._active += 1  # hold the slot while the budget is checked without the lock
+                if eligible:
+                    # SQLite may wait on other workers here, so this runs outside the condition lock
+                    try:
+                        short = self.store.try_reserve(self._buckets(client), estimate)
+                    except Exception:
+                        self._release()
+                        raise
+                    if short is None:
+                        return
+                    with self._cond:
+                        self._active -= 1
+                        waiter.client_blocked = short != GLOBAL_KEY
+                        self._cond.notify_all()
+                with self._cond:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionRejected("Token budget exhausted; please retry later")
+                    self._cond.wait(min(self.poll_interval, remaining))
+        finally:
+            with self._cond:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _charge_late(self, client, tokens):
+        """Bill usage that arrived after its request was settled"""
+        try:
+            self.store.adjust(self._buckets(client), -tokens)
+            self.store.record(client, 0, tokens, "late")
+        except sqlite3.Error as e:
+            logger.error(f"Could not record late usage: {e}")
+
+    @contextmanager
+    def admit(self, client, estimate, priority=1):
+        """Block until the request fits, then yield a ``Charge`` for its real usage"""
+        estimate = int(estimate)
+        start = time.monotonic()
+        try:
+            self._acquire(client, estimate, priority)
+        except AdmissionRejected:
+            self.store.record(client, estimate, 0, "rejected")
+            logger.warning(f"Admission rejected for {client} (estimate {estimate} tokens)")
+            raise
+        waited = time.monotonic() - start
+        if waited > self.poll_interval:
+            logger.info(f"Admitted {client} after queueing {waited:.1f}s (priority {priority})")
+
+        charge = Charge(on_late=lambda tokens: self._charge_late(client, tokens))
+        token = current_charge.set(charge)
+        outcome = "ok"
+        try:
+            yield charge
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            current_charge.reset(token)
+            tokens, reported = charge.settle()
+            actual = tokens if reported else estimate
+            try:
+                self.store.adjust(self._buckets(client), estimate - actual)
+                self.store.record(client, estimate, actual, outcome)
+            except sqlite3.Error as e:
+                logger.error(f"Could not update usage ledger: {e}")
+            self._release()
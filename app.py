@@ -1,4 +1,6 @@
-from flask import Flask, render_template, request, redirect, url_for, session, send_file, jsonify
+from flask import (Flask, render_template, request, redirect, url_for, session, send_file, send_from_directory,
+                   jsonify, abort, after_this_request)
+from itsdangerous import BadSignature, URLSafeSerializer
 import openai
 import os
 import logging
@@ -19,7 +21,26 @@ from flask_talisman import Talisman
 import jwt
 import bcrypt
 import re
-from forms import PromptForm
+import mimetypes
+import sqlite3
+from forms import PromptForm, LoadUploadForm, ReportSearchForm, FinanceForm
+from component_catalog import CatalogStore, candidates_for_prompt
+from load_profile import LoadFileError, summarise_upload, summary_for_prompt
+from prompt_cache import PromptCache
+from prompt_classifier import OUT_OF_SCOPE, ScopeClassifier
+from single_flight import SingleFlight, flight_key
+from model_router import FAST_TIER, REPORT_TIER, ModelRouter, detect_intent
+from sectioned_report import SectionedReportGenerator, parse_template
+from translation import ReportTranslator
+from report_render import ReportRenderer
+from compression import apply_etag, compress_response
+from assets import IMMUTABLE_CACHE_CONTROL, AssetManifest, build as build_assets, is_stale as assets_stale
+from profiler import TOKEN_HEADER, ProfileStore, ProfilingMiddleware
+from readiness import ReadinessChecker, ReadinessMiddleware, default_probes
+from report_archive import ReportArchive
+from financial_model import analyse, analyse_prompt, facts_for_prompt
+from load_aggregation import LoadAggregator, aggregation_for_prompt, connection_mix
+from admission import AdmissionController, AdmissionRejected, TokenBudgetStore, estimate_tokens, record_usage
 from urllib.parse import urlparse
 from unittest.mock import MagicMock
 
@@ -92,6 +113,23 @@ def create_app(config_name=None):
         response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
         return response
+
+    # Strong ETags for cacheable GETs, then gzip/brotli for text responses above a size threshold
+    etag_endpoints = {'health_check', 'healthz', 'view_report'}
+
+    @app.after_request
+    def conditional_and_compress(response):
+        min_size = app.config['COMPRESSION_MIN_SIZE']
+        compress = app.config.get('COMPRESSION_ENABLED')
+        if request.endpoint in etag_endpoints:
+            response = apply_etag(response, request, min_size=min_size,
+                                  private=request.endpoint == 'view_report', compress=compress)
+        if compress:
+            response = compress_response(response, request.headers.get('Accept-Encoding'),
+                                         min_size=min_size,
+                                         level=app.config['COMPRESSION_LEVEL'],
+                                         brotli_quality=app.config['BROTLI_QUALITY'])
+        return response
     
     # Set up rate limiting 
     limiter = Limiter(
@@ -113,6 +151,38 @@ def create_app(config_name=None):
         """Health check endpoint for Render monitoring."""
         return jsonify({"status": "healthy"}), 200
 
+    # Fingerprinted, precompressed static bundles (see assets.py); unbundled files are the fallback
+    if app.config.get('ASSET_BUILD_ON_START') and assets_stale(app.static_folder):
+        try:
+            build_assets(app.static_folder)
+        except OSError as e:
+            logger.warning(f"Static asset build failed, serving unbundled files: {e}")
+    app.assets = AssetManifest(app.static_folder)
+
+    @app.template_global()
+    def asset_url(filename):
+        """url_for('static') that resolves bundles to their content-hashed names"""
+        return url_for('static', filename=app.assets.resolve(filename))
+
+    @app.route('/static/dist/<path:filename>')
+    @limiter.exempt
+    def hashed_asset(filename):
+        """Serve a fingerprinted bundle, precompressed when the client accepts it"""
+        directory = app.assets.directory
+        if not os.path.isfile(os.path.join(directory, filename)):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for suffix, coding in app.assets.encodings(request.headers.get('Accept-Encoding')):
+            if os.path.isfile(os.path.join(directory, filename + suffix)):
+                response = send_from_directory(directory, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = coding
+                break
+        else:
+            response = send_from_directory(directory, filename, mimetype=mimetype)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
     # Initialize OpenAI client with better error handling for tests
     # Make client available at app level so routes can access it
     app.openai_client = None
@@ -132,7 +202,10 @@ def create_app(config_name=None):
         # New style client (OpenAI v1.0.0+)
         if hasattr(openai, "OpenAI"):
             try:
-                app.openai_client = openai.OpenAI(api_key=api_key)
+                # OPENAI_BASE_URL points the client at a compatible endpoint, e.g. a local stub
+                base_url = app.config.get('OPENAI_BASE_URL')
+                client_kwargs = {'base_url': base_url} if base_url else {}
+                app.openai_client = openai.OpenAI(api_key=api_key, **client_kwargs)
                 logger.info("OpenAI client initialized via class")
             except Exception as e:
                 if not app.config.get('TESTING'):
@@ -165,6 +238,154 @@ def create_app(config_name=None):
             app.openai_client = MagicMock()
             logger.info("Created mock OpenAI client for testing after error")
 
+    # Component catalog is loaded lazily and hot-reloaded when the CSV changes
+    app.catalog_store = CatalogStore(
+        app.config['CATALOG_PATH'],
+        app.config.get('CATALOG_SNAPSHOT_PATH'),
+        check_interval=app.config.get('CATALOG_RELOAD_INTERVAL', 2.0)
+    )
+
+    # Near-duplicate prompt cache so reworded repeat queries skip the model call
+    app.prompt_cache = None
+    if app.config.get('PROMPT_CACHE_ENABLED'):
+        app.prompt_cache = PromptCache(
+            threshold=app.config['PROMPT_CACHE_THRESHOLD'],
+            max_entries=app.config['PROMPT_CACHE_MAX_ENTRIES']
+        )
+
+    # Local scope classifier answers off-topic prompts from the guardrail refusal templates
+    app.scope_classifier = None
+    if app.config.get('SCOPE_CLASSIFIER_ENABLED'):
+        try:
+            app.scope_classifier = ScopeClassifier.from_files(
+                app.config['SCOPE_MODEL_PATH'],
+                examples_path=app.config.get('SCOPE_EXAMPLES_PATH'),
+                guardrails_path=app.config['GUARDRAILS_PATH'],
+                in_threshold=app.config['SCOPE_IN_THRESHOLD'],
+                out_threshold=app.config['SCOPE_OUT_THRESHOLD']
+            )
+        except (OSError, ValueError) as e:
+            logger.error(f"Scope classifier disabled: {e}")
+
+    # Coalesce identical in-flight model calls (double-clicks, retries) across threads and workers
+    app.single_flight = None
+    if app.config.get('SINGLE_FLIGHT_ENABLED'):
+        try:
+            app.single_flight = SingleFlight(
+                db_path=app.config.get('SINGLE_FLIGHT_DB'),
+                timeout=app.config['SINGLE_FLIGHT_TIMEOUT'],
+                result_ttl=app.config['SINGLE_FLIGHT_RESULT_TTL']
+            )
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Single-flight table unavailable, coalescing within this worker only: {e}")
+            app.single_flight = SingleFlight(timeout=app.config['SINGLE_FLIGHT_TIMEOUT'])
+
+    # Route each request to a model tier and hedge slow calls to an alternate model
+    app.model_router = None
+    if app.config.get('MODEL_ROUTING_ENABLED'):
+        hedge_model = app.config.get('OPENAI_HEDGE_MODEL')
+
+        def tier(primary):
+            return (primary, hedge_model if hedge_model and hedge_model != primary else None)
+
+        app.model_router = ModelRouter(
+            lambda model, system_prompt, prompt: chat_completion(app.openai_client, model, system_prompt, prompt),
+            tiers={
+                FAST_TIER: tier(app.config['OPENAI_FAST_MODEL']),
+                REPORT_TIER: tier(app.config['OPENAI_MODEL']),
+            },
+            fast_max_chars=app.config['ROUTER_FAST_MAX_CHARS'],
+            hedge_after=app.config['ROUTER_HEDGE_AFTER'],
+            min_samples=app.config['ROUTER_MIN_SAMPLES'],
+            log_path=app.config.get('ROUTING_LOG_PATH'),
+            model_costs=app.config['MODEL_COSTS']
+        )
+
+    # Optional sectioned mode: fact sheet first, then template sections generated in parallel
+    app.report_generator = None
+    if app.config.get('SECTIONED_REPORTS_ENABLED'):
+        def section_call(system_prompt, prompt):
+            if app.model_router is not None:
+                return app.model_router.complete(system_prompt, prompt)
+            return chat_completion(app.openai_client, app.config['OPENAI_MODEL'], system_prompt, prompt)
+
+        app.report_generator = SectionedReportGenerator(
+            section_call,
+            max_parallel=app.config['SECTION_PARALLELISM'],
+            retries=app.config['SECTION_RETRIES'],
+            cache_entries=app.config['SECTION_CACHE_ENTRIES']
+        )
+
+    # Reports are generated once in English and translated per language, reusing a translation memory
+    app.translator = None
+    if app.config.get('TRANSLATION_PIPELINE_ENABLED'):
+        app.translator = ReportTranslator(
+            lambda system_prompt, text: chat_completion(app.openai_client, app.config['TRANSLATION_MODEL'],
+                                                        system_prompt, text),
+            max_parallel=app.config['TRANSLATION_PARALLELISM'],
+            memory_entries=app.config['TRANSLATION_MEMORY_ENTRIES']
+        )
+
+    # Reports are rendered from Markdown once per distinct text and served from cache afterwards
+    app.report_renderer = ReportRenderer(max_entries=app.config['RENDER_CACHE_ENTRIES'])
+
+    def finance_options():
+        """Scenario grid and project assumptions for the financial model, from config"""
+        return {
+            "tariffs": app.config['FINANCE_TARIFFS'],
+            "discount_rates": app.config['FINANCE_DISCOUNT_RATES'],
+            "degradations": app.config['FINANCE_DEGRADATIONS'],
+            "price_factors": app.config['FINANCE_PRICE_FACTORS'],
+            "diesel_price": app.config['FINANCE_DIESEL_PRICE'] or None,
+            "lifetime": app.config['FINANCE_LIFETIME_YEARS'],
+            "battery_life": app.config['FINANCE_BATTERY_LIFE_YEARS'],
+        }
+
+    # Stochastic demand aggregation for mini-grid prompts, cached per connection mix
+    app.load_aggregator = None
+    if app.config.get('MINIGRID_ENABLED'):
+        app.load_aggregator = LoadAggregator(trials=app.config['MINIGRID_TRIALS'],
+                                             sample_budget=app.config['MINIGRID_SAMPLE_BUDGET'],
+                                             workers=app.config['MINIGRID_WORKERS'],
+                                             seed=app.config['MINIGRID_SEED'],
+                                             max_connections=app.config['MINIGRID_MAX_CONNECTIONS'])
+
+    # Searchable archive of generated reports, written in batches off the request path
+    app.report_archive = None
+    if app.config.get('ARCHIVE_ENABLED'):
+        try:
+            app.report_archive = ReportArchive(app.config.get('ARCHIVE_DB'),
+                                               batch_size=app.config['ARCHIVE_BATCH_SIZE'],
+                                               flush_interval=app.config['ARCHIVE_FLUSH_INTERVAL'])
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Report archive disabled: {e}")
+
+    # Token-spend budgets per client and globally; requests that do not fit are queued by cost
+    app.admission = None
+    if app.config.get('ADMISSION_ENABLED'):
+        try:
+            store = TokenBudgetStore(app.config.get('ADMISSION_DB'))
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Usage ledger unavailable, keeping budgets in memory: {e}")
+            store = TokenBudgetStore()
+        app.admission = AdmissionController(
+            store,
+            client_capacity=app.config['CLIENT_TOKEN_BUDGET'],
+            client_per_hour=app.config['CLIENT_TOKENS_PER_HOUR'],
+            global_capacity=app.config['GLOBAL_TOKEN_BUDGET'],
+            global_per_hour=app.config['GLOBAL_TOKENS_PER_HOUR'],
+            max_concurrent=app.config['MAX_CONCURRENT_UPSTREAM'],
+            max_wait=app.config['ADMISSION_MAX_WAIT']
+        )
+
+    def admitted(estimate, fn):
+        """Run ``fn`` once the current client's token budget admits ``estimate`` tokens"""
+        if app.admission is None:
+            return fn()
+        priority = 0 if estimate <= app.config['ADMISSION_PRIORITY_TOKENS'] else 1
+        with app.admission.admit(get_remote_address(), estimate, priority):
+            return fn()
+
     # Add security middleware
     @app.before_request
     def security_checks():
@@ -191,6 +412,11 @@ def create_app(config_name=None):
         logger.error(f"Server Error: {error}")
         return render_template('error.html', error="An internal error occurred"), 500
     
+    @app.errorhandler(413)
+    def request_too_large(error):
+        logger.warning(f"Upload exceeding MAX_CONTENT_LENGTH rejected from {request.remote_addr}")
+        return render_template('error.html', error="Uploaded file is too large"), 413
+    
     @app.errorhandler(429)
     def ratelimit_handler(e):
         logger.warning(f"Rate limit exceeded: {e.description}")
@@ -208,6 +434,8 @@ def create_app(config_name=None):
     @app.route('/', methods=['GET', 'POST'])
     def index():
         form = PromptForm()
+        upload_form = LoadUploadForm(formdata=None)
+        load_summary = session.get('load_summary')
         response_text = ""
         error_message = None
 
@@ -215,7 +443,8 @@ def create_app(config_name=None):
         if app.openai_client is None:
             error_message = "OpenAI service is currently unavailable. Please try again later."
             logger.error("Route accessed with uninitialized OpenAI client")
-            return render_template('index.html', form=form, response=session.get('response_text', ''), error=error_message)
+            return render_template('index.html', form=form, upload_form=upload_form, load_summary=load_summary,
+                                   response=session.get('response_text', ''), error=error_message)
 
         # Load the professional system prompt from the external file
         try:
@@ -226,6 +455,9 @@ def create_app(config_name=None):
             system_prompt = "You are a helpful solar PV system design assistant."
             error_message = "System configuration warning: Using default prompt."
         
+        # Sectioned generation builds on the base prompt without the whole-report instructions
+        base_prompt = system_prompt
+
         # Append structured report generation instructions
         report_instructions = """
 1. Title and Definition
@@ -265,6 +497,7 @@ def create_app(config_name=None):
         system_prompt += "\n" + report_instructions
 
         # Append ProReport AI template for report formatting
+        template_content = ""
         try:
             with open(app.config['TEMPLATE_PATH'], "r", encoding="utf-8") as tf:
                 template_content = tf.read()
@@ -275,6 +508,7 @@ def create_app(config_name=None):
 
         if form.validate_on_submit():
             prompt = form.prompt.data
+            scope = app.scope_classifier.classify(prompt) if app.scope_classifier else None
             # Adjust system prompt to respond in the selected language
             lang_map = {
                 'en': 'English',
@@ -286,53 +520,177 @@ def create_app(config_name=None):
             }
             selected = form.language.data
             lang_name = lang_map.get(selected, 'English')
+            # With the translation pipeline the canonical report is always generated in English
+            translate_to = lang_name if app.translator is not None and selected != 'en' else None
+            generation_lang = 'en' if translate_to else selected
+
+            context_blocks = []
+            # Pass only the locally calculated summary of an uploaded appliance list
+            if load_summary:
+                context_blocks.append(summary_for_prompt(load_summary))
+
+            intent = detect_intent(prompt)
+            design_kwh = expected_kwh = load_summary and load_summary['daily_kwh']
+
+            # Mini-grid demand is diversified by simulation instead of summing household peaks
+            if app.load_aggregator is not None and intent == "design" and not load_summary:
+                mix = connection_mix(prompt)
+                connections = sum(mix.values())
+                if app.config['MINIGRID_MIN_CONNECTIONS'] <= connections <= app.load_aggregator.max_connections:
+                    aggregation = app.load_aggregator.simulate(mix)
+                    context_blocks.append(aggregation_for_prompt(aggregation))
+                    design_kwh = aggregation['daily_kwh']['p90']
+                    expected_kwh = aggregation['daily_kwh']['p50']
+
+            # Inject verified catalog candidates rather than letting the model invent components
+            catalog_block = candidates_for_prompt(app.catalog_store.get(), prompt, daily_kwh=design_kwh)
+            if catalog_block:
+                context_blocks.append(catalog_block)
+
+            # Payback, LCOE and NPV are computed locally across tariff and price scenarios
+            if app.config.get('FINANCE_ENABLED') and intent == "design":
+                finance = analyse_prompt(prompt, app.catalog_store.get(), daily_kwh=expected_kwh,
+                                         **finance_options())
+                if finance:
+                    context_blocks.append(facts_for_prompt(finance))
+
+            context = "".join("\n\n" + block for block in context_blocks)
             # Instruct the AI to respond in the chosen language
-            system_prompt = f"{system_prompt}\nPlease respond in {lang_name}."
+            language_instruction = f"\nPlease respond in {lang_map.get(generation_lang, 'English')}."
+            system_prompt = system_prompt + context + language_instruction
+            section_prompt = base_prompt + context + language_instruction
+            sectioned = app.report_generator is not None and bool(template_content) and intent == "design"
 
             # Wrap actual chat call in try/except
             logger.info(f"Processing prompt of length {len(prompt)}")
             try:
-                # Handle both new and legacy OpenAI client styles
-                if hasattr(app.openai_client, 'chat') and hasattr(app.openai_client.chat, 'completions'):
-                    # New style client (v1.0.0+)
-                    response = app.openai_client.chat.completions.create(
-                        model=app.config['OPENAI_MODEL'],
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": prompt}
-                        ]
-                    )
-                    response_text = response.choices[0].message.content
+                local_response = None
+                if scope is not None and scope.label == OUT_OF_SCOPE:
+                    # Off-topic prompts are refused locally without a model call, translations included
+                    canned = app.scope_classifier.localised_refusal(scope, selected)
+                    if canned is not None:
+                        local_response, translate_to = canned, None
+                    else:
+                        local_response = scope.refusal
+                elif app.prompt_cache is not None:
+                    local_response = app.prompt_cache.get(prompt, generation_lang, context=system_prompt)
+                if local_response is not None:
+                    response_text = local_response
+                    logger.info("Served prompt without a model call")
                 else:
-                    # Legacy style client
-                    response = app.openai_client.ChatCompletion.create(
-                        model=app.config['OPENAI_MODEL'],
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": prompt}
-                        ]
-                    )
-                    response_text = response.choices[0].message.content
-                
-                formatted_response = response_text.replace('\n', '<br>')
+                    def generate():
+                        if sectioned:
+                            return app.report_generator.generate(section_prompt, prompt, template_content)
+                        if app.model_router is not None:
+                            return app.model_router.complete(system_prompt, prompt,
+                                                             has_local_facts=bool(load_summary))
+                        return chat_completion(app.openai_client, app.config['OPENAI_MODEL'],
+                                               system_prompt, prompt)
+
+                    # Sectioned reports send the system prompt once per section plus the fact sheet
+                    calls = len(parse_template(template_content)) + 1 if sectioned else 1
+                    estimate = (estimate_tokens(system_prompt + prompt) * calls +
+                                app.config['EXPECTED_COMPLETION_TOKENS'].get(intent, 3000))
+
+                    def admitted_generate():
+                        return admitted(estimate, generate)
+
+                    # Coalesced followers share the leader's call and are not charged for it
+                    if app.single_flight is not None:
+                        response_text = app.single_flight.do(
+                            flight_key(prompt, generation_lang, system_prompt), admitted_generate)
+                    else:
+                        response_text = admitted_generate()
+                    if app.prompt_cache is not None:
+                        app.prompt_cache.put(prompt, response_text, generation_lang, context=system_prompt)
+
+                if translate_to:
+                    english = response_text
+                    # Translation costs roughly the report's tokens in and out
+                    response_text = admitted(estimate_tokens(english) * 2,
+                                             lambda: app.translator.translate(english, translate_to))
+
                 session['response_text'] = response_text
-                session['formatted_response'] = formatted_response
+                if app.report_archive is not None and not (scope is not None and scope.label == OUT_OF_SCOPE):
+                    app.report_archive.submit(prompt, response_text, selected, archive_owner(create=True))
                 logger.info(f"Successfully generated response of length {len(response_text)}")
+            except AdmissionRejected as e:
+                error_message = f"{e}. The service is busy or your usage allowance is used up."
+                response_text = "Sorry, your request could not be processed right now."
+                session['response_text'] = response_text
             except Exception as e:
                 logger.error(f"OpenAI API Error: {e}")
                 error_message = f"Error generating response: {e}"
                 response_text = "Sorry, there was an error processing your request."
                 session['response_text'] = response_text
-                session['formatted_response'] = response_text
 
-        # Use the formatted response for display if available
-        display_response = session.get('formatted_response', session.get('response_text', ''))
+        display_response = app.report_renderer.render(session.get('response_text', ''))
 
         return render_template('index.html', 
                               form=form,
+                              upload_form=upload_form,
+                              load_summary=load_summary,
                               response=display_response, 
                               error=error_message)
     
+    @app.route('/upload-loads', methods=['POST'])
+    def upload_loads():
+        """Summarise an uploaded appliance schedule for the next report"""
+        upload_form = LoadUploadForm()
+        wants_json = request.accept_mimetypes.best == 'application/json'
+        error_message = None
+
+        if upload_form.validate_on_submit():
+            try:
+                summary = summarise_upload(upload_form.loads_file.data,
+                                           max_rows=app.config['LOAD_UPLOAD_MAX_ROWS'])
+                session['load_summary'] = summary
+                if wants_json:
+                    return jsonify(summary)
+                return redirect(url_for('index'))
+            except LoadFileError as e:
+                logger.warning(f"Rejected appliance list upload: {e}")
+                error_message = str(e)
+        else:
+            error_message = "; ".join(upload_form.loads_file.errors) or "Invalid upload."
+
+        if wants_json:
+            return jsonify({"error": error_message}), 400
+        return render_template('index.html',
+                              form=PromptForm(formdata=None),
+                              upload_form=upload_form,
+                              load_summary=session.get('load_summary'),
+                              response=app.report_renderer.render(session.get('response_text', '')),
+                              error=error_message), 400
+    
+    @app.route('/finance')
+    def finance():
+        """Financial scenario analysis as JSON, for ?daily_kwh= or the uploaded appliance list"""
+        if not app.config.get('FINANCE_ENABLED'):
+            abort(404)
+        form = FinanceForm(request.args)
+        if not form.validate():
+            return jsonify({"errors": form.errors}), 400
+        load_summary = session.get('load_summary')
+        daily_kwh = form.daily_kwh.data or (load_summary and load_summary['daily_kwh'])
+        if not daily_kwh:
+            return jsonify({"errors": {"daily_kwh": ["Give daily_kwh or upload an appliance list first."]}}), 400
+
+        options = finance_options()
+        for name in ('tariffs', 'discount_rates', 'degradations', 'price_factors'):
+            if getattr(form, name).data:
+                options[name] = getattr(form, name).data
+        if form.diesel_price.data is not None:
+            options['diesel_price'] = form.diesel_price.data or None
+        if form.lifetime.data:
+            options['lifetime'] = form.lifetime.data
+        scenarios = ((len(options['tariffs']) + bool(options['diesel_price'])) * len(options['discount_rates']) *
+                     len(options['degradations']) * len(options['price_factors']))
+        if scenarios > app.config['FINANCE_MAX_SCENARIOS']:
+            return jsonify({"errors": {"scenarios": [f"{scenarios} scenarios requested; the limit is "
+                                                     f"{app.config['FINANCE_MAX_SCENARIOS']}."]}}), 400
+        return jsonify(analyse(daily_kwh, app.catalog_store.get(), **options))
+
     @app.route('/robots.txt')
     def robots():
         """Serve robots.txt from static folder"""
@@ -346,7 +704,8 @@ def create_app(config_name=None):
     @app.route('/clear')
     def clear():
         session.pop('response_text', None)
-        session.pop('formatted_response', None)
+        session.pop('formatted_response', None)  # left by older sessions
+        session.pop('load_summary', None)
         return redirect(url_for('index'))
     
     @app.route('/view-report', methods=['GET', 'POST'])
@@ -358,7 +717,8 @@ def create_app(config_name=None):
         raw_text = session.get('response_text', 'No report available.')
         # Construct shareable URL for social/sharing
         share_url = request.url
-        return render_template('view_report.html', response=raw_text, share_url=share_url)
+        return render_template('view_report.html', response=raw_text,
+                               rendered=app.report_renderer.render(raw_text), share_url=share_url)
     
     @app.route('/download-report')
     def download_report():
@@ -369,18 +729,7 @@ def create_app(config_name=None):
             return redirect(url_for('index'))
             
         try:
-            doc = Document()
-            doc.add_heading("Solar System Design Report", 0)
-            
-            for line in response_text.split('\n'):
-                if line.strip().startswith("**") and line.strip().endswith("**"):
-                    doc.add_heading(line.strip().strip("*"), level=1)
-                else:
-                    doc.add_paragraph(line.strip())
-            
-            file_stream = BytesIO()
-            doc.save(file_stream)
-            file_stream.seek(0)
+            file_stream = report_docx(response_text)
             
             logger.info("Report document generated successfully")
             
@@ -393,9 +742,134 @@ def create_app(config_name=None):
         except Exception as e:
             logger.error(f"Error generating report document: {e}")
             return render_template('error.html', error="Error generating document"), 500
+
+    # Archive ownership lives in its own long-lived signed cookie rather than the 4-hour session, so
+    # reports stay reachable after the session expires (but not after the browser's cookies are cleared)
+    owner_signer = URLSafeSerializer(app.config['SECRET_KEY'], salt='archive-owner')
+
+    def archive_owner(create=False):
+        """This browser's archive owner id; reports are only visible to the browser that made them"""
+        try:
+            return owner_signer.loads(request.cookies.get(app.config['ARCHIVE_OWNER_COOKIE'], ''))
+        except BadSignature:
+            pass
+        if not create:
+            return None
+        owner = secrets.token_urlsafe(16)
+
+        @after_this_request
+        def remember_owner(response):
+            response.set_cookie(app.config['ARCHIVE_OWNER_COOKIE'], owner_signer.dumps(owner),
+                                max_age=app.config['ARCHIVE_OWNER_MAX_AGE'], httponly=True,
+                                secure=app.config['SESSION_COOKIE_SECURE'], samesite='Lax')
+            return response
+        return owner
+
+    def owned_report(report_id):
+        """This browser's archived report (metadata, text), or 404"""
+        owner = archive_owner()
+        archived = app.report_archive.get(report_id, owner) if app.report_archive is not None and owner else None
+        if archived is None:
+            abort(404)
+        return archived
+
+    @app.route('/reports')
+    def reports():
+        """Search this browser's archived reports by text, language and system size"""
+        if app.report_archive is None:
+            abort(404)
+        search_form = ReportSearchForm(request.args)
+        results = []
+        owner = archive_owner()
+        if owner and search_form.validate():
+            results = app.report_archive.search(owner, search_form.q.data or "",
+                                                language=search_form.language.data or None,
+                                                min_kw=search_form.min_kw.data,
+                                                max_kw=search_form.max_kw.data,
+                                                limit=app.config['ARCHIVE_SEARCH_LIMIT'])
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({"reports": [r._asdict() for r in results], "errors": search_form.errors})
+        return render_template('reports.html', form=search_form, results=results)
+
+    @app.route('/reports/<int:report_id>')
+    def reopen_report(report_id):
+        """Load an archived report into the session for viewing, editing and download"""
+        session['response_text'] = owned_report(report_id)[1]
+        return redirect(url_for('view_report'))
+
+    @app.route('/reports/<int:report_id>/export')
+    def export_report(report_id):
+        """Download an archived report as Word (default) or Markdown"""
+        meta, text = owned_report(report_id)
+        if request.args.get('format') == 'md':
+            return send_file(BytesIO(text.encode('utf-8')), as_attachment=True,
+                             download_name=f"Solar_Report_{meta.id}.md", mimetype='text/markdown')
+        return send_file(report_docx(text), as_attachment=True,
+                         download_name=f"Solar_Report_{meta.id}.docx",
+                         mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+
+    # Opt-in sampling profiler around the whole WSGI app (admin token header or sample rate)
+    profile_store = ProfileStore(app.config['PROFILE_DIR'], fmt=app.config['PROFILE_FORMAT'],
+                                 max_files=app.config['PROFILE_MAX_FILES'])
+    profiling = ProfilingMiddleware(app.wsgi_app, profile_store,
+                                    token=app.config.get('PROFILE_TOKEN'),
+                                    sample_rate=app.config['PROFILE_SAMPLE_RATE'],
+                                    interval=app.config['PROFILE_INTERVAL'])
+    if profiling.token or profiling.sample_rate > 0:
+        app.wsgi_app = profiling
+
+    # /readyz is answered from a cached background check, ahead of every other middleware. The
+    # checker thread starts on the first probe in each process, i.e. after a pre-forking server forks.
+    app.readiness = ReadinessChecker(default_probes(app.config, app.openai_client, app.catalog_store),
+                                     interval=app.config['READINESS_INTERVAL'],
+                                     timeout=app.config['READINESS_TIMEOUT'])
+    app.wsgi_app = ReadinessMiddleware(app.wsgi_app, app.readiness,
+                                       background=app.config.get('READINESS_BACKGROUND', False))
+
+    @app.route('/admin/profiles')
+    @app.route('/admin/profiles/<name>')
+    def admin_profiles(name=None):
+        """List recent request profiles, or download one, for holders of the profile token"""
+        if not profiling.authorised(request.headers.get(TOKEN_HEADER)):
+            abort(404)
+        if name is None:
+            return jsonify({"profiles": profile_store.recent()})
+        if name not in {p["name"] for p in profile_store.recent(limit=profile_store.max_files)}:
+            abort(404)
+        return send_from_directory(os.path.abspath(profile_store.directory), name, as_attachment=True)
     
     return app
 
+def report_docx(text):
+    """Build the Word document for a report; returns a rewound BytesIO"""
+    doc = Document()
+    doc.add_heading("Solar System Design Report", 0)
+    
+    for line in text.split('\n'):
+        if line.strip().startswith("**") and line.strip().endswith("**"):
+            doc.add_heading(line.strip().strip("*"), level=1)
+        else:
+            doc.add_paragraph(line.strip())
+    
+    file_stream = BytesIO()
+    doc.save(file_stream)
+    file_stream.seek(0)
+    return file_stream
+
+def chat_completion(client, model, system_prompt, prompt):
+    """Run a chat completion with either the new (v1.0.0+) or legacy OpenAI client"""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+    if hasattr(client, 'chat') and hasattr(client.chat, 'completions'):
+        response = client.chat.completions.create(model=model, messages=messages)
+    else:
+        response = client.ChatCompletion.create(model=model, messages=messages)
+    # Charge real usage to the admitted request, if any
+    record_usage(getattr(response, 'usage', None))
+    return response.choices[0].message.content
+
 def contains_suspicious_patterns(value):
     """Check for potentially malicious patterns in input"""
     # Check for common SQL injection or XSS patterns
@@ -0,0 +1,192 @@
+"""Static asset build: bundle, minify, fingerprint and precompress.
+
+``build()`` concatenates the sources of each bundle, minifies them, and writes
+``static/dist/<name>.<hash>.<ext>`` alongside ``.gz`` and, when the optional
+``brotli`` package is installed, ``.br`` variants, plus a ``manifest.json``
+mapping logical names to hashed ones. Templates call ``asset_url('app.js')``,
+which resolves through the manifest and falls back to the unbundled file when
+no build exists. Hashed files never change, so they are served with
+``Cache-Control: immutable``. Each build deletes fingerprinted files that
+neither it nor the previous build's manifest lists, so pages still open from
+the last deploy keep working while ``dist`` stops growing.
+
+Usage: python assets.py
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:  # optional; gzip variants are always written
+    brotli = None
+
+from compression import accepted_encodings
+
+logger = logging.getLogger('solar_assistant')
+
+# Logical bundle name -> source files (relative to the static folder), in load order
+BUNDLES = {
+    "app.js": ["app.js"],
+    "styles.css": ["styles.css"],
+}
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+FINGERPRINTED_RE = re.compile(r"^.+\.[0-9a-f]{12}\.\w+(?:\.gz|\.br)?$")
+
+
+def _strip_js_comments(source):
+    """Remove // and /* */ comments outside string literals"""
+    out = []
+    i, n = 0, len(source)
+    quote = None
+    while i < n:
+        ch = source[i]
+        if quote:
+            out.append(ch)
+            if ch == "\\" and i + 1 < n:
+                out.append(source[i + 1])
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+            out.append(ch)
+        elif source.startswith("//", i):
+            while i < n and source[i] != "\n":
+                i += 1
+            continue
+        elif source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def minify_js(source):
+    """Conservative minifier: drops comments, indentation and blank lines.
+
+    Line breaks are kept so automatic semicolon insertion behaves as in the source.
+    """
+    lines = (line.strip() for line in _strip_js_comments(source).splitlines())
+    return "\n".join(line for line in lines if line) + "\n"
+
+
+def minify_css(source):
+    source = re.sub(r"/\*.*?\*/", "", source, flags=re.S)
+    source = re.sub(r"\s+", " ", source)
+    source = re.sub(r"\s*([{};,>])\s*", r"\1", source)
+    # Whitespace before a colon can be a descendant combinator (".a :focus"), so keep it
+    source = re.sub(r":\s+", ":", source)
+    return source.replace(";}", "}").strip() + "\n"
+
+
+MINIFIERS = {".js": minify_js, ".css": minify_css}
+
+
+def _write(path, data):
+    # Write then rename so concurrently starting workers never serve a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read_manifest(dist):
+    try:
+        with open(os.path.join(dist, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def prune(dist, *manifests):
+    """Delete fingerprinted files (and their compressed variants) not listed in any of ``manifests``"""
+    keep = {hashed + suffix for manifest in manifests for hashed in manifest.values()
+            for suffix in ("", *SUFFIXES.values())}
+    removed = 0
+    for filename in os.listdir(dist):
+        if filename in keep or not FINGERPRINTED_RE.match(filename):
+            continue
+        try:
+            os.remove(os.path.join(dist, filename))
+            removed += 1
+        except OSError as e:
+            logger.warning(f"Could not remove stale asset {filename}: {e}")
+    if removed:
+        logger.info(f"Removed {removed} stale asset file(s) from {dist}")
+    return removed
+
+
+def build(static_dir):
+    """Build every bundle into ``static_dir/dist``; returns the manifest"""
+    dist = os.path.join(static_dir, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    previous = _read_manifest(dist)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        stem, ext = os.path.splitext(name)
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_dir, source), "r", encoding="utf-8") as f:
+                parts.append(f.read())
+        minify = MINIFIERS.get(ext, lambda text: text)
+        data = minify("\n".join(parts)).encode("utf-8")
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        path = os.path.join(dist, hashed)
+        _write(path, data)
+        _write(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(path + ".br", brotli.compress(data, quality=11))
+        manifest[name] = hashed
+        logger.info(f"Built asset {hashed} ({sum(len(p) for p in parts)} -> {len(data)} bytes)")
+    _write(os.path.join(dist, MANIFEST_NAME), json.dumps(manifest, indent=2).encode("utf-8"))
+    prune(dist, manifest, previous)
+    return manifest
+
+
+def is_stale(static_dir):
+    """True when the manifest is missing or older than any bundle source"""
+    manifest_path = os.path.join(static_dir, DIST_DIR, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return True
+    built = os.path.getmtime(manifest_path)
+    return any(os.path.getmtime(os.path.join(static_dir, source)) > built
+               for sources in BUNDLES.values() for source in sources)
+
+
+class AssetManifest:
+    """Resolves logical asset names to fingerprinted files under ``dist``"""
+
+    def __init__(self, static_dir):
+        self.directory = os.path.join(static_dir, DIST_DIR)
+        self.files = _read_manifest(self.directory)
+        if not self.files:
+            logger.info("No asset manifest found; serving unbundled static files")
+
+    def resolve(self, filename):
+        """Static-folder-relative path for ``filename``, hashed when it was built"""
+        hashed = self.files.get(filename)
+        return f"{DIST_DIR}/{hashed}" if hashed else filename
+
+    @staticmethod
+    def encodings(accept_encoding):
+        """Precompressed variants the client accepts, best first: (suffix, Content-Encoding)"""
+        return [(SUFFIXES[coding], coding) for coding in accepted_encodings(accept_encoding)]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    static_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                    "static")
+    print(json.dumps(build(static_dir), indent=2))
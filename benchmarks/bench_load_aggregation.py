@@ -0,0 +1,43 @@
+"""Benchmark Monte Carlo mini-grid load aggregation.
+
+Usage: python benchmarks/bench_load_aggregation.py [--households 5000] [--trials 1000] [--workers 1 2 4]
+
+Simulates the default household mix plus 2% shops and kiosks, once per worker
+count, and checks that every worker count gives the same figures.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_aggregation import DEFAULT_HOUSEHOLD_MIX, aggregation_for_prompt, simulate  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--households", type=int, default=5000)
+    parser.add_argument("--trials", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    mix = {name: int(args.households * share) for name, share in DEFAULT_HOUSEHOLD_MIX.items()}
+    mix["business"] = args.households // 50
+    print(f"Mix: {mix}; {args.trials} trials, {os.cpu_count()} CPUs")
+
+    results = []
+    for workers in dict.fromkeys(args.workers):
+        start = time.perf_counter()
+        result = simulate(mix, trials=args.trials, workers=workers)
+        elapsed = time.perf_counter() - start
+        samples = sum(mix.values()) * args.trials * 24
+        print(f"workers={workers}: {elapsed:.2f} s ({samples / elapsed / 1e6:.0f}M household-hours/s)")
+        results.append(result)
+    assert all(r["peak_kw"] == results[0]["peak_kw"] for r in results), "results differ across worker counts"
+    print()
+    print(aggregation_for_prompt(results[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Benchmark near-duplicate prompt cache lookups at a large number of cached entries.
+
+Usage: python benchmarks/bench_prompt_cache.py [--entries 1000000] [--lookups 10000]
+
+Entries are inserted as random signatures (MinHashing a million distinct prompts
+would dominate the run time) under namespaces built from sample prompts, so
+they share LSH buckets with real lookups; lookups hash real prompts end to end.
+Expect roughly 1-2 GB of RAM at one million entries.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_cache import NUM_PERM, PromptCache  # noqa: E402
+
+REGIONS = ["Mombasa", "Nairobi", "Kisumu", "Nakuru", "Arusha", "Kampala", "Addis Ababa", "Seattle"]
+SITES = ["home", "clinic", "school", "shop", "farm", "borehole pump", "office"]
+
+
+def sample_prompt(rng):
+    return (f"size a {rng.randint(1, 40)} kWh/day solar system for a {rng.choice(SITES)} "
+            f"in {rng.choice(REGIONS)} with {rng.choice(['LiFePO4', 'AGM', 'gel'])} batteries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    cache = PromptCache(max_entries=args.entries)
+    # Same namespace shape (language, numbers, key terms, context) as real prompts
+    namespaces = list({cache.key(sample_prompt(rng), "en")[1] for _ in range(5000)})
+    start = time.perf_counter()
+    for i in range(args.entries):
+        signature = array('I', (rng.getrandbits(32) for _ in range(NUM_PERM)))
+        cache.put_signature(signature, namespaces[i % len(namespaces)], f"response {i}")
+    print(f"Inserted {len(cache):,} entries over {len(namespaces):,} namespaces in "
+          f"{time.perf_counter() - start:.1f}s")
+
+    prompts = [sample_prompt(rng) for _ in range(1000)]
+    for prompt in prompts:
+        cache.put(prompt, "cached report", "en")
+
+    timings = []
+    for i in range(args.lookups):
+        prompt = prompts[i % len(prompts)].replace("size a", "design a")
+        t0 = time.perf_counter()
+        cache.get(prompt, "en")
+        timings.append((time.perf_counter() - t0) * 1e6)
+
+    timings.sort()
+    print(f"Lookups: {args.lookups:,}  hits: {cache.hits:,}  misses: {cache.misses:,}")
+    print(f"Latency (us): p50={statistics.median(timings):.1f} "
+          f"p95={timings[int(len(timings) * 0.95)]:.1f} p99={timings[int(len(timings) * 0.99)]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
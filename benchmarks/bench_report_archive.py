@@ -0,0 +1,79 @@
+"""Benchmark report archive ingestion and full-text search at 100k+ reports.
+
+Usage: python benchmarks/bench_report_archive.py [--reports 100000] [--queries 500] [--owners 20]
+                                                 [--db /tmp/archive.db]
+
+Synthetic ~2 KB reports vary region, system size, site type and battery
+chemistry, spread over ``--owners`` browsers. Ingestion goes through ``submit``
+and the batched writer, as in the app; searches run as one of the owners.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_archive import ReportArchive  # noqa: E402
+
+REGIONS = ["Mombasa", "Nairobi", "Kisumu", "Nakuru", "Arusha", "Kampala", "Addis Ababa", "Dodoma", "Kigali"]
+SITES = ["home", "clinic", "school", "shop", "farm", "borehole pump", "office", "church"]
+CHEMISTRIES = ["LiFePO4", "AGM", "gel", "flooded lead-acid"]
+LANGUAGES = ["en", "en", "en", "sw", "fr", "ar"]
+
+
+def sample_report(rng):
+    region, site, chem = rng.choice(REGIONS), rng.choice(SITES), rng.choice(CHEMISTRIES)
+    kwh = rng.randint(1, 60)
+    kwp = round(kwh / 4.5 * 1.3, 1)
+    prompt = f"Size a {kwh} kWh/day solar system for a {site} in {region} with {chem} batteries"
+    body = (f"## Solar PV Design for a {site.title()}\n\nLocation: {region}\n\n"
+            f"Daily demand is {kwh} kWh/day. The PV array is {kwp} kWp with {chem} storage "
+            f"sized for two days of autonomy. " * 8 + f"\n\nProject ref {rng.getrandbits(48):x}")
+    return prompt, body, rng.choice(LANGUAGES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--owners", type=int, default=20)
+    parser.add_argument("--db", default="/tmp/bench_report_archive.db")
+    args = parser.parse_args()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    rng = random.Random(11)
+    archive = ReportArchive(args.db, batch_size=500, flush_interval=0.05)
+    owners = [f"owner-{i}" for i in range(args.owners)]
+
+    start = time.perf_counter()
+    submit_times = []
+    for _ in range(args.reports):
+        t = time.perf_counter()
+        archive.submit(*sample_report(rng), rng.choice(owners))
+        submit_times.append(time.perf_counter() - t)
+    archive.flush()
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(args.db) / 1e6
+    print(f"Ingested {len(archive):,} reports in {elapsed:.1f}s ({args.reports / elapsed:,.0f}/s), "
+          f"DB {size_mb:.0f} MB, submit p99 {sorted(submit_times)[int(len(submit_times) * 0.99)] * 1e6:.0f} us")
+
+    queries = [(f"{rng.choice(REGIONS)} {rng.choice(SITES)}", {}) for _ in range(args.queries)]
+    queries += [(rng.choice(CHEMISTRIES), {"language": "sw", "min_kw": 3.0, "max_kw": 8.0})
+                for _ in range(args.queries)]
+    latencies = []
+    for text, filters in queries:
+        t = time.perf_counter()
+        archive.search(owners[0], text, limit=20, **filters)
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+    print(f"Search over {len(archive):,} reports ({args.owners} owners): p50 {statistics.median(latencies):.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)]:.1f} ms, max {latencies[-1]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
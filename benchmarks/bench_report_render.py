@@ -0,0 +1,66 @@
+"""Benchmark Markdown rendering of long reports, cold and from the render cache.
+
+Usage: python benchmarks/bench_report_render.py [--pages 20] [--views 1000]
+
+A synthetic ProReport-style report is built with headings, paragraphs, bullet
+lists and sizing tables at roughly 3,000 characters per page.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_render import ReportRenderer  # noqa: E402
+
+PARAGRAPH = ("The PV array is sized for the worst month of irradiance with a 1.25 design margin, "
+             "and the battery bank for two days of autonomy at 80% depth of discharge. ")
+
+
+def sample_page(number):
+    rows = "\n".join(f"| Load {i} | {i * 40} W | {i % 6 + 2} h | {i * 40 * (i % 6 + 2)} Wh |" for i in range(1, 13))
+    bullets = "\n".join(f"- **Check {i}:** verify cable sizing against IEC 60364 for circuit {i}" for i in range(1, 6))
+    return (f"## {number}  Section {number}\n\n### {number}.1 Overview\n\n{PARAGRAPH * 6}\n\n"
+            f"### {number}.2 Load Table\n\n| Appliance | Power | Hours | Energy |\n|---|---|---|---|\n{rows}\n\n"
+            f"### {number}.3 Checks\n\n{bullets}\n\n{PARAGRAPH * 4}\n\n---\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--views", type=int, default=1000)
+    args = parser.parse_args()
+
+    report = "\n".join(sample_page(i) for i in range(1, args.pages + 1))
+    print(f"Report: {args.pages} pages, {len(report):,} characters")
+
+    cold = []
+    for i in range(20):
+        renderer = ReportRenderer()
+        start = time.perf_counter()
+        renderer.render(report + f"\n<!-- {i} -->")
+        cold.append((time.perf_counter() - start) * 1000)
+
+    renderer = ReportRenderer()
+    renderer.render(report)
+    warm = []
+    for _ in range(args.views):
+        start = time.perf_counter()
+        renderer.render(report)
+        warm.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for _ in range(args.views):
+        report.replace("\n", "<br>")
+    legacy = (time.perf_counter() - start) * 1000 / args.views
+
+    print(f"Cold render:   p50 {statistics.median(cold):.2f} ms, max {max(cold):.2f} ms")
+    print(f"Cached render: p50 {statistics.median(warm) * 1000:.1f} us, "
+          f"p99 {sorted(warm)[int(len(warm) * 0.99)] * 1000:.1f} us")
+    print(f"Old newline-to-<br> replacement: {legacy * 1000:.1f} us per view")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Local OpenAI-compatible stub server for exercising model routing and hedging.
+
+Usage:
+    python benchmarks/openai_stub.py --port 8090 --latency gpt-4=8 --latency gpt-4o-mini=0.5 \
+        --error-rate gpt-4=0.1
+    OPENAI_BASE_URL=http://localhost:8090/v1 OPENAI_API_KEY=stub python app.py
+
+Implements ``POST /v1/chat/completions`` and ``GET /v1/models`` with a fixed
+per-model latency (seconds, with +/-20% jitter) and optional error rate.
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_pairs(pairs):
+    result = {}
+    for pair in pairs or []:
+        model, _, value = pair.partition("=")
+        result[model] = float(value)
+    return result
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = {}
+    error_rate = {}
+    default_latency = 1.0
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            models = sorted(set(self.latency) | {"gpt-4"})
+            self._send_json(200, {"object": "list",
+                                  "data": [{"id": m, "object": "model", "owned_by": "stub"} for m in models]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "gpt-4")
+        time.sleep(self.latency.get(model, self.default_latency) * random.uniform(0.8, 1.2))
+        if random.random() < self.error_rate.get(model, 0.0):
+            self._send_json(500, {"error": {"message": f"stub failure for {model}", "type": "server_error"}})
+            return
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        content = f"[{model}] Stub solar report for: {prompt[:200]}"
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": sum(len(m.get("content", "")) // 4 for m in request.get("messages", [])),
+                      "completion_tokens": len(content) // 4,
+                      "total_tokens": 0},
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", action="append", help="model=seconds")
+    parser.add_argument("--error-rate", action="append", help="model=fraction")
+    parser.add_argument("--default-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    StubHandler.latency = parse_pairs(args.latency)
+    StubHandler.error_rate = parse_pairs(args.error_rate)
+    StubHandler.default_latency = args.default_latency
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"OpenAI stub listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""Bundled component catalog with a compact columnar store and secondary indexes.
+
+The catalog CSV (``data/component_catalog.csv``) is loaded once into column
+arrays, indexed by category, voltage class and chemistry, and cached as a
+binary snapshot so later processes start without re-parsing the CSV.
+``CatalogStore`` watches the CSV and swaps in a fresh catalog when it changes.
+"""
+import csv
+import json
+import logging
+import math
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+logger = logging.getLogger('solar_assistant')
+
+SNAPSHOT_MAGIC = b"SDCAT1"
+STRING_COLUMNS = ("id", "category", "name", "chemistry", "certifications")
+CAPACITY_UNITS = {"panel": "Wp", "battery": "kWh", "inverter": "W", "controller": "A"}
+
+
+class ComponentCatalog:
+    """Columnar in-memory catalog with filter-and-rank queries"""
+
+    def __init__(self, columns, voltages, capacity, price):
+        self.columns = columns
+        self.voltages = voltages
+        self.capacity = capacity
+        self.price = price
+        self._build_indexes()
+
+    def __len__(self):
+        return len(self.capacity)
+
+    def _build_indexes(self):
+        self.by_category = {}
+        self.by_voltage = {}
+        self.by_chemistry = {}
+        for row, category in enumerate(self.columns["category"]):
+            self.by_category.setdefault(category, set()).add(row)
+            for volts in self.voltages[row]:
+                self.by_voltage.setdefault(volts, set()).add(row)
+            chemistry = self.columns["chemistry"][row].lower()
+            self.by_chemistry.setdefault(chemistry, set()).add(row)
+
+        # Per-category capacity index: parallel sorted lists for bisect range scans
+        self.capacity_index = {}
+        for category, rows in self.by_category.items():
+            ordered = sorted(rows, key=lambda r: self.capacity[r])
+            self.capacity_index[category] = ([self.capacity[r] for r in ordered], ordered)
+
+    @classmethod
+    def from_csv(cls, path):
+        columns = {name: [] for name in STRING_COLUMNS}
+        voltages, capacity, price = [], array('d'), array('d')
+        with open(path, newline="", encoding="utf-8") as f:
+            for record in csv.DictReader(f):
+                for name in STRING_COLUMNS:
+                    columns[name].append((record.get(name) or "").strip())
+                volts = (record.get("voltage") or "").strip()
+                voltages.append(tuple(int(v) for v in volts.split("/") if v))
+                capacity.append(float(record["capacity"]))
+                price.append(float(record["price_usd"]))
+        return cls(columns, voltages, capacity, price)
+
+    def to_snapshot(self, path, source_stat=None):
+        """Write a binary snapshot: magic, JSON header, then raw float64 columns"""
+        header = {
+            "source": source_stat,
+            "rows": len(self),
+            "columns": self.columns,
+            "voltages": [list(v) for v in self.voltages],
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack("<I", len(header_bytes)))
+            f.write(header_bytes)
+            f.write(self.capacity.tobytes())
+            f.write(self.price.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_snapshot(cls, path, source_stat=None):
+        """Load a snapshot; returns None if it is missing, corrupt or stale"""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if not data.startswith(SNAPSHOT_MAGIC):
+            return None
+        offset = len(SNAPSHOT_MAGIC)
+        (header_len,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        header = json.loads(data[offset:offset + header_len].decode("utf-8"))
+        offset += header_len
+        if not isinstance(header, dict):
+            raise ValueError("snapshot header is not an object")
+        if source_stat is not None and header.get("source") != source_stat:
+            return None
+        try:
+            rows = header["rows"]
+            width = rows * 8
+            columns = {name: header["columns"][name] for name in STRING_COLUMNS}
+            voltages = [tuple(v) for v in header["voltages"]]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"snapshot header is missing or has a malformed {e}") from e
+        lengths = {len(values) for values in columns.values()} | {len(voltages)}
+        if len(data) != offset + 2 * width or lengths != {rows}:
+            raise ValueError("snapshot is truncated or its columns disagree in length")
+        capacity, price = array('d'), array('d')
+        capacity.frombytes(data[offset:offset + width])
+        price.frombytes(data[offset + width:offset + 2 * width])
+        return cls(columns, voltages, capacity, price)
+
+    def query(self, category, voltage=None, chemistry=None, min_capacity=None,
+              max_capacity=None, rank="price_per_unit", limit=3, target=None):
+        """Filter by indexed attributes and return the top ``limit`` rows as dicts.
+
+        ``rank`` is one of ``price_per_unit`` (price / capacity), ``price``,
+        ``capacity`` or ``target_cost`` (price of the fewest identical units that
+        reach ``target`` capacity, fewer units first on ties); all rank ascending.
+        """
+        caps, ordered = self.capacity_index.get(category, ([], []))
+        lo = bisect_left(caps, min_capacity) if min_capacity is not None else 0
+        hi = bisect_right(caps, max_capacity) if max_capacity is not None else len(caps)
+        candidates = ordered[lo:hi]
+
+        filters = []
+        if voltage is not None:
+            filters.append(self.by_voltage.get(int(voltage), set()))
+        if chemistry:
+            filters.append(self.by_chemistry.get(chemistry.lower(), set()))
+        if filters:
+            candidates = [r for r in candidates if all(r in f for f in filters)]
+
+        if rank == "target_cost" and target:
+            key = lambda r: (units_for(target, self.capacity[r]) * self.price[r], -self.capacity[r])  # noqa: E731
+        elif rank == "price_per_unit":
+            key = lambda r: self.price[r] / self.capacity[r]  # noqa: E731
+        elif rank == "price":
+            key = lambda r: self.price[r]  # noqa: E731
+        else:
+            key = lambda r: self.capacity[r]  # noqa: E731
+        return [self.row(r) for r in sorted(candidates, key=key)[:limit]]
+
+    def row(self, r):
+        item = {name: self.columns[name][r] for name in STRING_COLUMNS}
+        item["voltage"] = list(self.voltages[r])
+        item["capacity"] = self.capacity[r]
+        item["price_usd"] = self.price[r]
+        item["unit"] = CAPACITY_UNITS.get(item["category"], "")
+        return item
+
+
+def units_for(target, capacity):
+    """Identical units of ``capacity`` needed to reach ``target``"""
+    return max(1, math.ceil(target / capacity - 1e-9))
+
+
+def _source_stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_catalog(path, snapshot_path=None):
+    """Load the catalog from its snapshot when fresh, otherwise from CSV"""
+    source_stat = _source_stat(path)
+    if snapshot_path:
+        try:
+            catalog = ComponentCatalog.from_snapshot(snapshot_path, source_stat)
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable catalog snapshot {snapshot_path}: {e}")
+            catalog = None
+        if catalog is not None:
+            return catalog
+
+    catalog = ComponentCatalog.from_csv(path)
+    if snapshot_path:
+        try:
+            catalog.to_snapshot(snapshot_path, source_stat)
+        except OSError as e:
+            logger.warning(f"Could not write catalog snapshot {snapshot_path}: {e}")
+    logger.info(f"Loaded {len(catalog)} catalog components from {path}")
+    return catalog
+
+
+class CatalogStore:
+    """Holds the current catalog and hot-reloads it when the CSV changes"""
+
+    def __init__(self, path, snapshot_path=None, check_interval=2.0):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._stat = None
+        self._next_check = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if self._catalog is not None and now < self._next_check:
+            return self._catalog
+        with self._lock:
+            if self._catalog is not None and now < self._next_check:
+                return self._catalog
+            self._next_check = now + self.check_interval
+            try:
+                stat = _source_stat(self.path)
+            except OSError:
+                if self._catalog is None:
+                    logger.error(f"Component catalog not found: {self.path}")
+                return self._catalog
+            if stat != self._stat:
+                try:
+                    self._catalog = load_catalog(self.path, self.snapshot_path)
+                    self._stat = stat
+                except (OSError, ValueError, KeyError) as e:
+                    logger.error(f"Error loading component catalog: {e}")
+            return self._catalog
+
+
+def extract_requirements(prompt):
+    """Pull system voltage, daily energy and battery chemistry hints from a prompt"""
+    text = prompt.lower()
+    req = {"voltage": None, "daily_kwh": None, "chemistry": None}
+
+    volts = re.search(r"\b(12|24|48)\s*v(?:olts?)?\b", text)
+    if volts:
+        req["voltage"] = int(volts.group(1))
+
+    energy = re.search(r"(\d+(?:\.\d+)?)\s*(k?wh)", text)
+    if energy:
+        value = float(energy.group(1))
+        req["daily_kwh"] = value if energy.group(2) == "kwh" else value / 1000.0
+
+    if re.search(r"lifepo|lfp|lithium", text):
+        req["chemistry"] = "LiFePO4"
+    elif "agm" in text:
+        req["chemistry"] = "AGM"
+    elif re.search(r"\bgel\b", text):
+        req["chemistry"] = "Gel"
+    elif "flooded" in text or "lead acid" in text or "lead-acid" in text:
+        req["chemistry"] = "Flooded"
+    return req
+
+
+def suggested_voltage(daily_kwh):
+    """Rule-of-thumb system voltage for a given daily energy demand"""
+    if daily_kwh is None or daily_kwh >= 4:
+        return 48
+    return 24 if daily_kwh >= 1.5 else 12
+
+
+def _format_item(item, target=None):
+    unit = item["unit"]
+    if item["category"] == "battery":
+        unit_price = f"${item['price_usd'] / item['capacity']:.0f}/kWh"
+    else:
+        unit_price = f"${item['price_usd'] / item['capacity']:.2f}/{unit}"
+    line = (f"- {item['id']}: {item['name']} — {item['capacity']:g} {unit}, "
+            f"~${item['price_usd']:.0f} ({unit_price}); {item['certifications']}")
+    if target:
+        units = units_for(target, item["capacity"])
+        line += (f"; bank of {units} = {units * item['capacity']:g} {unit}, "
+                 f"~${units * item['price_usd']:,.0f}")
+    return line
+
+
+def candidates_for_prompt(catalog, prompt, autonomy_days=2, limit=3, daily_kwh=None):
+    """Build a system-prompt block of top catalog candidates for this request.
+
+    ``daily_kwh`` overrides the demand parsed from the prompt, e.g. when it was
+    calculated from an uploaded appliance list.
+    """
+    if catalog is None or not len(catalog):
+        return ""
+    req = extract_requirements(prompt)
+    if daily_kwh:
+        req["daily_kwh"] = daily_kwh
+    voltage = req["voltage"] or suggested_voltage(req["daily_kwh"])
+    chemistry = req["chemistry"]
+
+    lines = [
+        "COMPONENT CATALOG CANDIDATES",
+        "Recommend panels, batteries, inverters and charge controllers from this list "
+        "(cite the catalog ID) instead of inventing models. Prices are indicative USD.",
+        f"System voltage basis: {voltage} V",
+    ]
+    bank_kwh = None
+    if req["daily_kwh"]:
+        depth = 0.9 if chemistry in (None, "LiFePO4") else 0.5
+        bank_kwh = req["daily_kwh"] * autonomy_days / depth
+        lines.append(f"Battery bank target: {bank_kwh:.1f} kWh "
+                     f"({autonomy_days} days autonomy, {depth:.0%} DoD); batteries are ranked by the "
+                     "cost of reaching it")
+
+    sections = [
+        ("Panels", catalog.query("panel", limit=limit)),
+        ("Batteries", catalog.query("battery", voltage=voltage, chemistry=chemistry, target=bank_kwh,
+                                    rank="target_cost" if bank_kwh else "price_per_unit", limit=limit)),
+        ("Inverters", catalog.query("inverter", voltage=voltage, limit=limit)),
+        ("Charge controllers", catalog.query("controller", voltage=voltage, chemistry="MPPT",
+                                             limit=limit)),
+    ]
+    for title, items in sections:
+        if items:
+            lines.append(f"{title}:")
+            lines.extend(_format_item(item, bank_kwh if title == "Batteries" else None) for item in items)
+    return "\n".join(lines)
+
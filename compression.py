@@ -0,0 +1,126 @@
+"""Dynamic response compression and strong-ETag conditional GET.
+
+``compress_response`` gzip- or brotli-encodes text-like responses (HTML, JSON,
+NDJSON, CSS/JS) at or above a size threshold, chosen from the request's
+``Accept-Encoding``. Streamed responses are compressed chunk by chunk and
+flushed after every chunk, so clients still see output as it is produced.
+File responses (``send_file``) are left alone; fingerprinted assets are
+already precompressed by assets.py.
+
+``apply_etag`` gives a buffered response a strong ETag derived from its body
+and the encoding it will be sent with, and turns a matching
+``If-None-Match`` into a 304 before any compression work is done.
+"""
+import gzip
+import hashlib
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/plain", "text/css", "text/csv", "text/javascript", "application/javascript",
+    "application/json", "application/x-ndjson", "application/xml", "image/svg+xml",
+}
+
+
+def accepted_encodings(accept_encoding):
+    """Encodings we can produce that the client accepts, best first"""
+    accepted = set()
+    for token in (accept_encoding or "").split(","):
+        coding, _, params = token.partition(";")
+        if not re.match(r"^\s*q\s*=\s*0(\.0*)?\s*$", params):
+            accepted.add(coding.strip().lower())
+    return [coding for coding in ("br", "gzip") if coding in accepted]
+
+
+def _choose(response, accept_encoding):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return None
+    if "Content-Encoding" in response.headers or response.direct_passthrough:
+        return None
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return None
+    for coding in accepted_encodings(accept_encoding):
+        if coding == "br" and brotli is None:
+            continue
+        return coding
+    return None
+
+
+def _encoder(coding, level):
+    """Incremental encoder: returns (compress(chunk) -> bytes, finish() -> bytes)"""
+    if coding == "br":
+        compressor = brotli.Compressor(quality=level)
+        return (lambda chunk: compressor.process(chunk) + compressor.flush()), compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 writes a gzip container
+    return (lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)), compressor.flush
+
+
+def _stream(chunks, coding, level):
+    compress, finish = _encoder(coding, level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if chunk:
+                yield compress(chunk)
+        yield finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def compress_response(response, accept_encoding, min_size=1024, level=6, brotli_quality=5):
+    """Compress ``response`` in place when worthwhile; returns the response.
+
+    ``level`` is the gzip level (1-9) and ``brotli_quality`` the brotli quality (0-11);
+    higher values trade CPU for fewer bytes on the wire.
+    """
+    coding = _choose(response, accept_encoding)
+    response.vary.add("Accept-Encoding")
+    if coding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _stream(response.response, coding, brotli_quality if coding == "br" else level)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        if coding == "br":
+            response.set_data(brotli.compress(data, quality=brotli_quality))
+        else:
+            response.set_data(gzip.compress(data, compresslevel=level, mtime=0))
+    response.headers["Content-Encoding"] = coding
+    etag, _ = response.get_etag()
+    if etag and not etag.endswith(f"-{coding}"):
+        # The same body in another encoding is a different representation
+        response.set_etag(f"{etag}-{coding}")
+    return response
+
+
+def apply_etag(response, request, min_size=1024, private=False, compress=True):
+    """Set a strong ETag for the representation about to be sent; 304 if it matches.
+
+    ``private`` marks per-user (session) content so shared caches do not store it.
+    ``compress`` says whether ``compress_response`` will run afterwards; only then
+    does the ETag carry the content-coding suffix.
+    """
+    if request.method not in ("GET", "HEAD") or response.status_code != 200 or response.is_streamed:
+        return response
+    data = response.get_data()
+    etag = hashlib.sha256(data).hexdigest()[:32]
+    coding = _choose(response, request.headers.get("Accept-Encoding")) if compress else None
+    if coding is not None and len(data) >= min_size:
+        etag = f"{etag}-{coding}"
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    return response.make_conditional(request)
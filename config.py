@@ -9,12 +9,114 @@ class Config:
     PERMANENT_SESSION_LIFETIME = timedelta(hours=4)
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_MODEL = "gpt-4"
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # optional OpenAI-compatible endpoint (e.g. local stub)
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
     # Update path to use the existing file in the prompts folder
     PROMPT_PATH = "prompts/kbs_solar_prompt_final.txt"
     # Add a fallback prompt path for guardrails
     GUARDRAILS_PATH = "prompts/solar_pv_chatbot_guardrails.txt"
     TEMPLATE_PATH = "prompts/proreport_template.md"  # Path for ProReport Markdown template
+    # Bundled component catalog used for panel/battery/inverter/controller recommendations
+    CATALOG_PATH = "data/component_catalog.csv"
+    CATALOG_SNAPSHOT_PATH = "data/component_catalog.snapshot"
+    CATALOG_RELOAD_INTERVAL = 2.0  # seconds between checks for catalog file changes
+    LOAD_UPLOAD_MAX_ROWS = 50000  # appliance rows accepted per uploaded load list
+    # Near-duplicate prompt cache (MinHash/LSH); similarity is estimated Jaccard over normalised tokens
+    PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+    PROMPT_CACHE_THRESHOLD = float(os.getenv("PROMPT_CACHE_THRESHOLD", "0.9"))
+    PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "5000"))
+    # Local pre-classifier that refuses out-of-scope prompts before any LLM call
+    SCOPE_CLASSIFIER_ENABLED = os.getenv("SCOPE_CLASSIFIER_ENABLED", "true").lower() == "true"
+    SCOPE_MODEL_PATH = "data/scope_model.json"
+    SCOPE_EXAMPLES_PATH = "data/scope_examples.csv"
+    SCOPE_IN_THRESHOLD = 0.65  # probability at or above which a prompt is in scope
+    SCOPE_OUT_THRESHOLD = 0.05  # probability at or below which a prompt without domain terms is refused locally
+    # Single-flight coalescing of identical concurrent model calls; the SQLite table is shared by workers
+    SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    SINGLE_FLIGHT_DB = os.getenv("SINGLE_FLIGHT_DB", "data/single_flight.db")
+    SINGLE_FLIGHT_TIMEOUT = 90.0  # seconds a follower waits for the leader before calling itself
+    SINGLE_FLIGHT_RESULT_TTL = 30.0  # seconds a finished result is reused by late retries
+    # Latency-aware model routing: short definitional questions go to the fast tier,
+    # full reports to OPENAI_MODEL; slow calls are hedged to OPENAI_HEDGE_MODEL
+    MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+    OPENAI_FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", "gpt-4o-mini")
+    OPENAI_HEDGE_MODEL = os.getenv("OPENAI_HEDGE_MODEL", "gpt-4o")
+    ROUTER_FAST_MAX_CHARS = 400  # longest prompt eligible for the fast tier
+    # Hedge delay per tier in seconds until a model has enough latency samples
+    ROUTER_HEDGE_AFTER = {"fast": 15.0, "report": 120.0}
+    ROUTER_MIN_SAMPLES = 20  # successful calls before the rolling p95 replaces ROUTER_HEDGE_AFTER
+    # Relative price per token; slow calls are only hedged to a model that costs no more
+    MODEL_COSTS = {"gpt-4o-mini": 0.15, "gpt-3.5-turbo": 0.5, "gpt-4o": 2.5, "gpt-4-turbo": 10.0, "gpt-4": 30.0}
+    ROUTING_LOG_PATH = "logs/routing_decisions.jsonl"
+    # Sectioned report mode: shared fact sheet, then ProReport sections generated concurrently
+    SECTIONED_REPORTS_ENABLED = os.getenv("SECTIONED_REPORTS_ENABLED", "false").lower() == "true"
+    SECTION_PARALLELISM = int(os.getenv("SECTION_PARALLELISM", "4"))
+    SECTION_RETRIES = 1  # extra attempts per section before a placeholder is used
+    SECTION_CACHE_ENTRIES = 500
+    # Generate the canonical report once in English, then translate it section by section
+    TRANSLATION_PIPELINE_ENABLED = os.getenv("TRANSLATION_PIPELINE_ENABLED", "true").lower() == "true"
+    TRANSLATION_MODEL = os.getenv("TRANSLATION_MODEL", "gpt-4o")
+    TRANSLATION_PARALLELISM = 4
+    TRANSLATION_MEMORY_ENTRIES = 20000  # translated paragraphs kept for reuse
+    # Dynamic gzip/brotli compression of text responses; higher levels trade CPU for bandwidth
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE = 1024  # bytes; smaller responses are sent as-is
+    COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))  # gzip, 1-9
+    BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))  # 0-11
+    # Readiness probes (model upstream, prompt files, storage) refreshed in the background for /readyz
+    READINESS_BACKGROUND = True
+    READINESS_INTERVAL = float(os.getenv("READINESS_INTERVAL", "30"))
+    READINESS_TIMEOUT = 5.0  # seconds before a slow probe counts as failed
+    # Sampling profiler: requests carrying X-Profile-Token (or a random PROFILE_SAMPLE_RATE share)
+    # are profiled into PROFILE_DIR; /admin/profiles lists them for token holders
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL = 0.005  # seconds between stack samples
+    PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "speedscope")  # or "collapsed" for flamegraph.pl
+    PROFILE_DIR = "logs/profiles"
+    PROFILE_MAX_FILES = 50
+    # Rebuild static/dist bundles at startup when a source is newer than the manifest
+    ASSET_BUILD_ON_START = os.getenv("ASSET_BUILD_ON_START", "true").lower() == "true"
+    RENDER_CACHE_ENTRIES = 256  # rendered report HTML kept per worker, keyed by content hash
+    # Local archive of generated reports with full-text search (SQLite FTS5); opt-in because it stores
+    # prompts and reports on disk. Each browser only sees the reports it generated, identified by a signed
+    # owner cookie that outlives the session; clearing cookies (or a new browser) loses access to them.
+    ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+    ARCHIVE_OWNER_COOKIE = "archive_owner"
+    ARCHIVE_OWNER_MAX_AGE = int(timedelta(days=365).total_seconds())
+    ARCHIVE_DB = os.getenv("ARCHIVE_DB", "data/report_archive.db")
+    ARCHIVE_BATCH_SIZE = 100  # reports written per transaction
+    ARCHIVE_FLUSH_INTERVAL = 1.0  # seconds the writer waits to fill a batch
+    ARCHIVE_SEARCH_LIMIT = 50
+    # Local NumPy financial analysis (LCOE, NPV, payback) over a scenario grid, injected into design prompts
+    FINANCE_ENABLED = os.getenv("FINANCE_ENABLED", "true").lower() == "true"
+    FINANCE_TARIFFS = (0.10, 0.15, 0.20, 0.25)  # avoided grid cost, USD/kWh
+    FINANCE_DISCOUNT_RATES = (0.06, 0.10, 0.14)
+    FINANCE_DEGRADATIONS = (0.004, 0.007)  # PV output lost per year
+    FINANCE_PRICE_FACTORS = (0.8, 1.0, 1.2)  # component prices relative to the catalog
+    FINANCE_DIESEL_PRICE = float(os.getenv("FINANCE_DIESEL_PRICE", "1.40"))  # USD/L; 0 to skip the genset case
+    FINANCE_LIFETIME_YEARS = 25
+    FINANCE_BATTERY_LIFE_YEARS = 10
+    FINANCE_MAX_SCENARIOS = 100000  # largest grid accepted by /finance
+    # Monte Carlo load aggregation for mini-grid prompts ("a mini-grid for 800 households")
+    MINIGRID_ENABLED = os.getenv("MINIGRID_ENABLED", "true").lower() == "true"
+    MINIGRID_MIN_CONNECTIONS = 20  # smaller sites are sized from per-household demand as before
+    MINIGRID_MAX_CONNECTIONS = 10000  # at most MINIGRID_SAMPLE_BUDGET / 100, so every site gets 100+ trials
+    MINIGRID_TRIALS = 1000
+    MINIGRID_SAMPLE_BUDGET = 1000000  # connection-days per request; larger sites get fewer trials
+    MINIGRID_WORKERS = int(os.getenv("MINIGRID_WORKERS", "1"))  # >1 runs trial blocks in a process pool
+    MINIGRID_SEED = 2024  # fixed so identical prompts get identical figures (and cache hits)
+    # Cost-aware admission: token buckets per client IP and globally, persisted in a SQLite ledger
+    ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_DB = os.getenv("ADMISSION_DB", "data/usage_ledger.db")
+    CLIENT_TOKEN_BUDGET = int(os.getenv("CLIENT_TOKEN_BUDGET", "60000"))  # burst size per client
+    CLIENT_TOKENS_PER_HOUR = int(os.getenv("CLIENT_TOKENS_PER_HOUR", "30000"))
+    GLOBAL_TOKEN_BUDGET = int(os.getenv("GLOBAL_TOKEN_BUDGET", "1000000"))
+    GLOBAL_TOKENS_PER_HOUR = int(os.getenv("GLOBAL_TOKENS_PER_HOUR", "500000"))
+    MAX_CONCURRENT_UPSTREAM = 8  # model-backed requests in flight per worker before queueing
+    ADMISSION_MAX_WAIT = 30.0  # seconds a queued request waits before it is turned away
+    EXPECTED_COMPLETION_TOKENS = {"definition": 800, "design": 3000}
+    ADMISSION_PRIORITY_TOKENS = 4000  # requests estimated at or below this are served first
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -28,6 +130,15 @@ class TestingConfig(Config):
     SESSION_COOKIE_SECURE = False
     # Use a predictable key for testing
     SECRET_KEY = "testing-key-not-for-production"
+    # Coalesce within the test process only so results never leak between runs
+    SINGLE_FLIGHT_DB = None
+    ADMISSION_DB = None
+    ARCHIVE_ENABLED = True
+    ARCHIVE_DB = None
+    ARCHIVE_FLUSH_INTERVAL = 0.05
+    ROUTING_LOG_PATH = None
+    ASSET_BUILD_ON_START = False
+    READINESS_BACKGROUND = False
 
 class ProductionConfig(Config):
     """Production configuration"""
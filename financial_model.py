@@ -0,0 +1,231 @@
+"""Vectorised project economics: cash flows, LCOE, NPV and payback.
+
+``evaluate`` broadcasts its scenario arguments (tariff, discount rate, panel
+degradation, component price factor) against each other and evaluates all
+scenarios at once with NumPy, so a grid of ten thousand scenarios costs a
+few milliseconds. ``analyse`` sizes a
+system from daily demand, prices it from the component catalog and returns a
+JSON-ready summary; ``facts_for_prompt`` turns that into a system-prompt block
+so reports quote these figures instead of doing the arithmetic themselves.
+
+Savings are the energy delivered times the avoided cost per kWh: a grid
+tariff, or the fuel cost of a diesel genset the system displaces.
+"""
+import logging
+import time
+
+import numpy as np
+
+from component_catalog import extract_requirements
+
+logger = logging.getLogger('solar_assistant')
+
+# Fallback unit costs (USD) when the catalog has no priced panels or batteries
+DEFAULT_PV_COST_PER_WP = 0.30
+DEFAULT_BATTERY_COST_PER_KWH = 250.0
+
+
+def evaluate(capex, battery_capex, annual_kwh, tariff, discount_rate, degradation, price_factor=1.0,
+             lifetime=25, battery_life=10, opex_rate=0.015, escalation=0.0):
+    """Cash-flow metrics for every scenario; scenario arguments broadcast together.
+
+    ``capex`` is the upfront cost (battery included), ``battery_capex`` the cost of
+    each battery replacement every ``battery_life`` years, both scaled by
+    ``price_factor``. Returns a dict of arrays in the broadcast shape: ``npv``,
+    ``lcoe``, ``payback`` and ``discounted_payback`` (years, NaN if never repaid).
+    """
+    tariff, rate, degradation, factor = np.broadcast_arrays(
+        *(np.asarray(v, dtype=float) for v in (tariff, discount_rate, degradation, price_factor)))
+    shape = tariff.shape
+    tariff, rate, degradation, factor = (a.ravel() for a in (tariff, rate, degradation, factor))
+
+    # Cash flows are linear in tariff and price factor, so the per-year work is done
+    # once per distinct degradation and discount rate rather than once per scenario.
+    rates, rate_index = np.unique(rate, return_inverse=True)
+    degradations, degradation_index = np.unique(degradation, return_inverse=True)
+    years = np.arange(1, lifetime + 1)
+    energy = annual_kwh * (1.0 - degradations[:, None]) ** (years - 1)  # (degradations, years)
+    savings_per_tariff = energy * (1.0 + escalation) ** (years - 1)
+    discount = (1.0 + rates[:, None]) ** -years  # (rates, years)
+    replacements = (years % battery_life == 0) & (years < lifetime) if battery_life else np.zeros(lifetime, bool)
+    costs = capex * opex_rate + battery_capex * replacements  # per unit price factor
+
+    pv_energy = (energy @ discount.T)[degradation_index, rate_index]
+    pv_savings = (savings_per_tariff @ discount.T)[degradation_index, rate_index]
+    pv_costs = capex + (discount @ costs)[rate_index]
+    npv = tariff * pv_savings - factor * pv_costs
+    lcoe = factor * pv_costs / pv_energy
+
+    upfront = capex * factor
+    cumulative = (tariff[:, None] * np.cumsum(savings_per_tariff, axis=1)[degradation_index] -
+                  factor[:, None] * (capex + np.cumsum(costs)))
+    discounted = np.cumsum(savings_per_tariff[:, None, :] * discount[None, :, :], axis=2)
+    cumulative_discounted = (tariff[:, None] * discounted[degradation_index, rate_index] -
+                             factor[:, None] * (capex + np.cumsum(discount * costs, axis=1)[rate_index]))
+    return {
+        "npv": npv.reshape(shape),
+        "lcoe": lcoe.reshape(shape),
+        "payback": _payback(upfront, cumulative).reshape(shape),
+        "discounted_payback": _payback(upfront, cumulative_discounted).reshape(shape),
+    }
+
+
+def _payback(upfront, cumulative):
+    """Years until the cumulative net position first turns non-negative (interpolated within the year)"""
+    repaid = cumulative >= 0
+    year = repaid.argmax(axis=1)
+    rows = np.arange(len(year))
+    before = np.where(year > 0, cumulative[rows, year - 1], -upfront)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payback = year - before / (cumulative[rows, year] - before)
+    return np.where(repaid.any(axis=1), payback, np.nan)
+
+
+def scenario_grid(**axes):
+    """Full factorial grid: each keyword's values become a flat array of len(product)"""
+    names = list(axes)
+    mesh = np.meshgrid(*(np.asarray(axes[n], dtype=float) for n in names), indexing="ij")
+    return {name: m.ravel() for name, m in zip(names, mesh)}
+
+
+def unit_costs(catalog):
+    """Cheapest catalog panel price per Wp and battery price per kWh (USD)"""
+    pv, battery = DEFAULT_PV_COST_PER_WP, DEFAULT_BATTERY_COST_PER_KWH
+    if catalog is not None and len(catalog):
+        panels = catalog.query("panel", limit=1)
+        batteries = catalog.query("battery", chemistry="LiFePO4", limit=1)
+        if panels:
+            pv = panels[0]["price_usd"] / panels[0]["capacity"]
+        if batteries:
+            battery = batteries[0]["price_usd"] / batteries[0]["capacity"]
+    return pv, battery
+
+
+def size_system(daily_kwh, catalog=None, peak_sun_hours=5.0, performance_ratio=0.75, autonomy_days=1.0,
+                depth_of_discharge=0.9, balance_of_system=0.35):
+    """PV and battery sizes and their indicative costs for a daily demand"""
+    pv_cost, battery_cost = unit_costs(catalog)
+    pv_kw = daily_kwh / (peak_sun_hours * performance_ratio)
+    battery_kwh = daily_kwh * autonomy_days / depth_of_discharge
+    pv_capex = pv_kw * 1000 * pv_cost
+    battery_capex = battery_kwh * battery_cost
+    # Inverter, charge controller, mounting, cabling and installation
+    bos_capex = (pv_capex + battery_capex) * balance_of_system
+    return {
+        "daily_kwh": daily_kwh, "pv_kw": pv_kw, "battery_kwh": battery_kwh,
+        "pv_capex": pv_capex, "battery_capex": battery_capex, "bos_capex": bos_capex,
+        "capex": pv_capex + battery_capex + bos_capex,
+    }
+
+
+def _stats(values):
+    finite = values[np.isfinite(values)]
+    if not finite.size:
+        return None
+    low, p50, high = np.percentile(finite, [0, 50, 100])
+    return {"min": round(float(low), 2), "p50": round(float(p50), 2), "max": round(float(high), 2)}
+
+
+def _rounded(value, digits=2):
+    return None if not np.isfinite(value) else round(float(value), digits)
+
+
+def _usd(value):
+    return f"-${-value:,.0f}" if value < 0 else f"${value:,.0f}"
+
+
+def analyse(daily_kwh, catalog=None, tariffs=(0.10, 0.15, 0.20, 0.25), discount_rates=(0.06, 0.10, 0.14),
+            degradations=(0.004, 0.007), price_factors=(0.8, 1.0, 1.2), diesel_price=None,
+            diesel_kwh_per_litre=3.0, lifetime=25, battery_life=10, opex_rate=0.015, **sizing):
+    """Size, price and evaluate a system across the full scenario grid; returns a JSON-ready dict.
+
+    ``diesel_price`` (USD per litre) adds the genset fuel cost per kWh as an extra
+    avoided-cost "tariff", for sites where the system displaces a generator.
+    """
+    start = time.perf_counter()
+    system = size_system(daily_kwh, catalog, **sizing)
+    labels = [f"${t:.2f}/kWh" for t in tariffs]
+    avoided = list(tariffs)
+    if diesel_price:
+        avoided.append(diesel_price / diesel_kwh_per_litre)
+        labels.append(f"diesel ${diesel_price:.2f}/L (${avoided[-1]:.2f}/kWh)")
+
+    grid = scenario_grid(tariff=np.arange(len(avoided)), discount_rate=discount_rates,
+                         degradation=degradations, price_factor=price_factors)
+    tariff = np.asarray(avoided)[grid["tariff"].astype(int)]
+    metrics = evaluate(system["capex"], system["battery_capex"], daily_kwh * 365, tariff,
+                       grid["discount_rate"], grid["degradation"], grid["price_factor"],
+                       lifetime=lifetime, battery_life=battery_life, opex_rate=opex_rate)
+
+    # Base case: middle discount rate, degradation and price factor at each tariff
+    middle = {"discount_rate": discount_rates[len(discount_rates) // 2],
+              "degradation": degradations[len(degradations) // 2],
+              "price_factor": price_factors[len(price_factors) // 2]}
+    base = np.all([grid[k] == v for k, v in middle.items()], axis=0)
+    by_tariff = []
+    for index, label in enumerate(labels):
+        row = base & (grid["tariff"] == index)
+        subset = grid["tariff"] == index
+        by_tariff.append({
+            "tariff": label,
+            "avoided_cost_per_kwh": round(avoided[index], 4),
+            "npv": _rounded(metrics["npv"][row][0]),
+            "lcoe": _rounded(metrics["lcoe"][row][0], 4),
+            "payback_years": _rounded(metrics["payback"][row][0]),
+            "discounted_payback_years": _rounded(metrics["discounted_payback"][row][0]),
+            "positive_npv_share": round(float((metrics["npv"][subset] > 0).mean()), 3),
+        })
+
+    result = {
+        "system": {k: round(v, 2) for k, v in system.items()},
+        "assumptions": {"lifetime_years": lifetime, "battery_life_years": battery_life, "opex_rate": opex_rate,
+                        "base_case": middle, "discount_rates": list(discount_rates),
+                        "degradations": list(degradations), "price_factors": list(price_factors)},
+        "scenarios": int(metrics["npv"].size),
+        "by_tariff": by_tariff,
+        "npv": _stats(metrics["npv"]),
+        "lcoe": _stats(metrics["lcoe"]),
+        "payback_years": _stats(metrics["payback"]),
+        "positive_npv_share": round(float((metrics["npv"] > 0).mean()), 3),
+    }
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    logger.info(f"Evaluated {result['scenarios']} financial scenarios in {result['elapsed_ms']} ms")
+    return result
+
+
+def analyse_prompt(prompt, catalog=None, daily_kwh=None, **options):
+    """``analyse`` for the demand in an uploaded summary or the prompt; None if unknown"""
+    daily_kwh = daily_kwh or extract_requirements(prompt)["daily_kwh"]
+    if not daily_kwh:
+        return None
+    return analyse(daily_kwh, catalog, **options)
+
+
+def facts_for_prompt(result):
+    """Compact system-prompt block with the locally computed financial figures"""
+    if not result:
+        return ""
+    system, assumptions = result["system"], result["assumptions"]
+    base = assumptions["base_case"]
+
+    def years(value):
+        return f"{value:.1f} years" if value is not None else f"not within {assumptions['lifetime_years']} years"
+
+    lines = [
+        f"FINANCIAL ANALYSIS (calculated locally across {result['scenarios']} scenarios; use these figures)",
+        f"- Basis: {system['pv_kw']:.2f} kWp PV, {system['battery_kwh']:.1f} kWh battery, "
+        f"capex ~${system['capex']:,.0f} (PV ${system['pv_capex']:,.0f}, battery ${system['battery_capex']:,.0f}, "
+        f"balance of system ${system['bos_capex']:,.0f}); {assumptions['lifetime_years']}-year life, "
+        f"battery replaced every {assumptions['battery_life_years']} years",
+        f"- Base case: {base['discount_rate']:.0%} discount rate, {base['degradation']:.1%}/yr degradation, "
+        f"{base['price_factor']:.0%} of current component prices",
+    ]
+    for row in result["by_tariff"]:
+        lcoe = f"${row['lcoe']:.3f}/kWh" if row["lcoe"] is not None else "n/a"
+        lines.append(f"- Avoided cost {row['tariff']}: LCOE {lcoe}, NPV {_usd(row['npv'])}, "
+                     f"payback {years(row['payback_years'])}, positive NPV in "
+                     f"{row['positive_npv_share']:.0%} of scenarios")
+    if result["npv"]:
+        lines.append(f"- All scenarios: NPV {_usd(result['npv']['min'])} to {_usd(result['npv']['max'])} "
+                     f"(median {_usd(result['npv']['p50'])}); positive in {result['positive_npv_share']:.0%}")
+    return "\n".join(lines)
@@ -1,6 +1,16 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField, TextAreaField, SelectField
-from wtforms.validators import DataRequired, Length
+from flask_wtf.file import FileField, FileAllowed, FileRequired
+from wtforms import StringField, SubmitField, TextAreaField, SelectField, FloatField, IntegerField
+from wtforms.validators import DataRequired, Length, NumberRange, Optional, ValidationError
+
+LANGUAGE_CHOICES = [
+    ('en', 'English'),
+    ('sw', 'Kiswahili'),
+    ('ar', 'Arabic'),
+    ('am', 'Amharic'),
+    ('es', 'Spanish'),
+    ('fr', 'French')
+]
 
 class PromptForm(FlaskForm):
     """Form for solar assistant prompts with validation"""
@@ -9,12 +19,64 @@ class PromptForm(FlaskForm):
                              DataRequired(message="Please enter a prompt."),
                              Length(min=10, max=2000, message="Prompt must be between 10 and 2000 characters.")
                          ])
-    language = SelectField('Language', choices=[
-        ('en', 'English'),
-        ('sw', 'Kiswahili'),
-        ('ar', 'Arabic'),
-        ('am', 'Amharic'),
-        ('es', 'Spanish'),
-        ('fr', 'French')
-    ], default='en')
-    submit = SubmitField('Generate Report')
\ No newline at end of file
+    language = SelectField('Language', choices=LANGUAGE_CHOICES, default='en')
+    submit = SubmitField('Generate Report')
+
+class LoadUploadForm(FlaskForm):
+    """Form for uploading a CSV/XLSX appliance schedule"""
+    loads_file = FileField('Upload appliance list (CSV or XLSX)',
+                           validators=[
+                               FileRequired(message="Please choose a file."),
+                               FileAllowed(['csv', 'xlsx'], message="Only CSV or XLSX files are supported.")
+                           ])
+    upload = SubmitField('Calculate Load')
+
+class ReportSearchForm(FlaskForm):
+    """Search form for the report archive (GET, so no CSRF token)"""
+    class Meta:
+        csrf = False
+
+    q = StringField('Search past reports', validators=[Optional(), Length(max=200)])
+    language = SelectField('Language', choices=[('', 'Any language')] + LANGUAGE_CHOICES,
+                           default='')
+    min_kw = FloatField('Min kWp', validators=[Optional(), NumberRange(min=0)])
+    max_kw = FloatField('Max kWp', validators=[Optional(), NumberRange(min=0)])
+    search = SubmitField('Search')
+
+class NumberListField(StringField):
+    """Comma-separated numbers such as ``0.10,0.15,0.20``, each within [minimum, maximum]"""
+    def __init__(self, label=None, validators=None, minimum=0.0, maximum=float('inf'), max_items=50, **kwargs):
+        super().__init__(label, validators, **kwargs)
+        self.minimum, self.maximum, self.max_items = minimum, maximum, max_items
+
+    def process_formdata(self, valuelist):
+        self.data = None
+        if valuelist and valuelist[0].strip():
+            try:
+                self.data = [float(v) for v in valuelist[0].split(',') if v.strip()]
+            except ValueError:
+                raise ValueError('Enter comma-separated numbers.')
+
+    def _value(self):
+        return ','.join(f'{v:g}' for v in self.data) if self.data else ''
+
+    def pre_validate(self, form):
+        if not self.data:
+            return
+        if len(self.data) > self.max_items:
+            raise ValidationError(f'At most {self.max_items} values.')
+        if any(not self.minimum <= v <= self.maximum for v in self.data):
+            raise ValidationError(f'Values must be between {self.minimum:g} and {self.maximum:g}.')
+
+class FinanceForm(FlaskForm):
+    """Scenario grid for the financial analysis endpoint (GET, so no CSRF token)"""
+    class Meta:
+        csrf = False
+
+    daily_kwh = FloatField('Daily energy (kWh)', validators=[Optional(), NumberRange(min=0.01, max=5000)])
+    tariffs = NumberListField('Tariffs (USD/kWh)', validators=[Optional()], maximum=5)
+    discount_rates = NumberListField('Discount rates', validators=[Optional()], maximum=1)
+    degradations = NumberListField('Degradation per year', validators=[Optional()], maximum=0.1)
+    price_factors = NumberListField('Component price factors', validators=[Optional()], minimum=0.1, maximum=10)
+    diesel_price = FloatField('Diesel price (USD/L)', validators=[Optional(), NumberRange(min=0, max=20)])
+    lifetime = IntegerField('Project lifetime (years)', validators=[Optional(), NumberRange(min=1, max=50)])
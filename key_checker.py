@@ -89,5 +89,36 @@ def check_keys():
         
     print("\nFinished checking keys.")
 
+def check_readiness():
+    """Run the same probes as the app's /readyz once; returns a process exit code"""
+    load_dotenv()
+    sys.path.append(os.getcwd())
+    from config import get_config
+    from readiness import NOT_READY, ReadinessChecker, default_probes
+
+    config = get_config()
+    settings = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    api_key = os.getenv("OPENAI_API_KEY") or settings.get("OPENAI_API_KEY")
+    client = None
+    if api_key:
+        if hasattr(openai, 'OpenAI'):
+            base_url = settings.get("OPENAI_BASE_URL")
+            client = openai.OpenAI(api_key=api_key, **({'base_url': base_url} if base_url else {}))
+        else:
+            openai.api_key = api_key
+            client = openai
+
+    result = ReadinessChecker(default_probes(settings, client),
+                              timeout=settings.get("READINESS_TIMEOUT", 5.0)).run_once()
+    print("Readiness Check")
+    print("=" * 50)
+    for name, check in result["checks"].items():
+        mark = "✅" if check["ok"] else ("❌" if check["critical"] else "⚠️")
+        print(f"{name}: {mark} {check['detail']}")
+    print(f"\nStatus: {result['status']}")
+    return 1 if result["status"] == NOT_READY else 0
+
 if __name__ == "__main__":
+    if "--ready" in sys.argv[1:]:
+        sys.exit(check_readiness())
     check_keys()
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""Streaming appliance-schedule parser and daily load calculation.
+
+Uploaded CSV/XLSX appliance lists are read row by row (never fully in memory)
+and folded into a compact summary: daily energy, coincident peak, surge load and
+a 24-hour load profile. Only that summary is passed on to the model.
+"""
+import csv
+import io
+import logging
+import math
+import re
+import zipfile
+
+logger = logging.getLogger('solar_assistant')
+
+# Accepted header spellings for each field, compared after normalisation
+COLUMN_ALIASES = {
+    "name": ("appliance", "name", "device", "load", "description", "item"),
+    "quantity": ("quantity", "qty", "count", "units", "number"),
+    "watts": ("watts", "watt", "w", "power", "power_w", "rating", "rated_power", "power_rating"),
+    "hours": ("hours", "hours_per_day", "hrs", "hours_day", "usage_hours", "daily_hours", "h_day"),
+    "surge": ("surge", "surge_w", "surge_watts", "starting_watts", "start_watts"),
+    "start": ("start", "start_hour", "from", "on_hour"),
+}
+
+# Inductive loads that draw a starting surge of roughly 3x running power
+MOTOR_KEYWORDS = re.compile(r"(?i)pump|motor|fridge|refrigerator|freezer|compressor|air ?con|a/?c\b|"
+                            r"washing|drill|grinder|welder|borehole|fan")
+MOTOR_SURGE_FACTOR = 3.0
+
+# Default usage windows when no start hour is given
+EVENING_START_HOUR = 18
+DAYTIME_START_HOUR = 7
+
+MAX_ROWS = 50000
+
+
+class LoadFileError(ValueError):
+    """Raised when an uploaded appliance list cannot be parsed"""
+
+
+def _normalise(header):
+    return re.sub(r"[^a-z0-9]+", "_", str(header or "").strip().lower()).strip("_")
+
+
+def _map_columns(headers):
+    """Return a field -> column index mapping from a header row"""
+    normalised = [_normalise(h) for h in headers]
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for i, header in enumerate(normalised):
+            if header in aliases and i not in mapping.values():
+                mapping[field] = i
+                break
+    missing = [f for f in ("watts", "hours") if f not in mapping]
+    if missing:
+        raise LoadFileError(f"Missing required column(s): {', '.join(missing)}")
+    return mapping
+
+
+# Unit suffixes accepted after a number in a cell, with their multiplier
+UNIT_FACTORS = {"": 1.0, "w": 1.0, "watt": 1.0, "watts": 1.0, "kw": 1000.0, "h": 1.0, "hr": 1.0, "hrs": 1.0,
+                "hour": 1.0, "hours": 1.0, "min": 1 / 60.0, "mins": 1 / 60.0, "minutes": 1 / 60.0,
+                "x": 1.0, "pcs": 1.0}
+NUMBER_CELL = re.compile(r"^([-+]?\d[\d,.\s]*?)\s*([a-z]*)\.?$")
+
+
+def _parse_decimal(text):
+    """Plain, thousands-separated or decimal-comma number text as a float"""
+    text = text.replace(" ", "")
+    if "," in text and "." in text:
+        # Whichever separator comes last is the decimal point
+        decimal = "," if text.rfind(",") > text.rfind(".") else "."
+        text = text.replace("." if decimal == "," else ",", "").replace(",", ".")
+    elif "," in text:
+        whole, _, fraction = text.rpartition(",")
+        if re.fullmatch(r"\d{1,3}(,\d{3})+", text):
+            text = text.replace(",", "")  # 1,500 thousands separator
+        elif text.count(",") == 1:
+            text = f"{whole}.{fraction}"  # 1,5 decimal comma
+        else:
+            raise ValueError(text)
+    elif text.count(".") > 1:
+        if not re.fullmatch(r"\d{1,3}(\.\d{3})+", text):
+            raise ValueError(text)
+        text = text.replace(".", "")  # 1.500.000 thousands separator
+    return float(text)
+
+
+def _number(value, default=None):
+    """Read a numeric cell; blanks give ``default``, anything unreadable raises ``LoadFileError``"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return default
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        match = NUMBER_CELL.match(str(value).strip().lower())
+        if not match or match.group(2) not in UNIT_FACTORS:
+            raise LoadFileError(f"'{value}' is not a number")
+        try:
+            number = _parse_decimal(match.group(1)) * UNIT_FACTORS[match.group(2)]
+        except ValueError:
+            raise LoadFileError(f"'{value}' is not a number")
+    if not math.isfinite(number):
+        raise LoadFileError(f"'{value}' is not a finite number")
+    return number
+
+
+def _add_to_profile(energy_wh, demand_w, power, hours, start):
+    """Spread ``hours`` of use at ``power`` watts over the 24 hourly buckets"""
+    remaining = min(hours, 24.0)
+    hour = start
+    while remaining > 0:
+        used = min(1.0, remaining)
+        energy_wh[int(hour) % 24] += power * used
+        demand_w[int(hour) % 24] += power
+        remaining -= used
+        hour += 1
+
+
+class LoadSummary:
+    """Running aggregate of an appliance list, updated one row at a time"""
+
+    def __init__(self):
+        self.appliance_count = 0
+        self.rows = 0
+        self.daily_wh = 0.0
+        self.connected_w = 0.0
+        self.max_surge_extra_w = 0.0
+        self.hourly_wh = [0.0] * 24
+        self.hourly_w = [0.0] * 24  # coincident demand of loads running in each hour
+        self.top_loads = []  # (daily_wh, name) kept to a handful of entries
+
+    def add(self, name, quantity, watts, hours, surge=None, start=None):
+        if watts <= 0 or quantity <= 0 or hours <= 0:
+            return
+        power = watts * quantity
+        energy = power * min(hours, 24.0)
+        self.rows += 1
+        self.appliance_count += int(quantity)
+        self.daily_wh += energy
+        self.connected_w += power
+
+        if surge is None:
+            surge = watts * MOTOR_SURGE_FACTOR if MOTOR_KEYWORDS.search(name or "") else watts
+        self.max_surge_extra_w = max(self.max_surge_extra_w, surge - watts)
+
+        if start is None:
+            start = EVENING_START_HOUR if hours <= 6 else DAYTIME_START_HOUR
+        _add_to_profile(self.hourly_wh, self.hourly_w, power, hours, start)
+
+        self.top_loads.append((energy, (name or "Unnamed load")[:60]))
+        if len(self.top_loads) > 20:
+            self.top_loads = sorted(self.top_loads, reverse=True)[:5]
+
+    @property
+    def peak_w(self):
+        return max(self.hourly_w)
+
+    @property
+    def surge_w(self):
+        return self.peak_w + self.max_surge_extra_w
+
+    def to_dict(self):
+        return {
+            "appliances": self.appliance_count,
+            "rows": self.rows,
+            "daily_wh": round(self.daily_wh, 1),
+            "daily_kwh": round(self.daily_wh / 1000.0, 3),
+            "connected_w": round(self.connected_w, 1),
+            "peak_w": round(self.peak_w, 1),
+            "surge_w": round(self.surge_w, 1),
+            "hourly_wh": [round(v, 1) for v in self.hourly_wh],
+            "top_loads": [{"name": n, "daily_wh": round(e, 1)}
+                          for e, n in sorted(self.top_loads, reverse=True)[:5]],
+        }
+
+
+def _summarise_rows(rows, max_rows=MAX_ROWS):
+    """Fold an iterator of row sequences (header first) into a summary dict"""
+    summary = LoadSummary()
+    mapping = None
+    for line, row in enumerate(rows, 1):
+        if mapping is None:
+            if not any(cell not in (None, "") for cell in row):
+                continue
+            mapping = _map_columns(row)
+            continue
+        if summary.rows >= max_rows:
+            raise LoadFileError(f"Appliance list exceeds {max_rows} rows")
+
+        def cell(field):
+            i = mapping.get(field)
+            return row[i] if i is not None and i < len(row) else None
+
+        try:
+            watts = _number(cell("watts"))
+            hours = _number(cell("hours"))
+            if watts is None or hours is None:
+                continue
+            start = _number(cell("start"))
+            quantity = _number(cell("quantity"), 1.0)
+            surge = _number(cell("surge"))
+        except LoadFileError as e:
+            raise LoadFileError(f"Row {line}: {e}")
+        summary.add(
+            name=str(cell("name") or "").strip(),
+            quantity=quantity,
+            watts=watts,
+            hours=hours,
+            surge=surge,
+            start=int(start) % 24 if start is not None else None,
+        )
+    if mapping is None:
+        raise LoadFileError("The uploaded file has no header row")
+    if summary.rows == 0:
+        raise LoadFileError("No appliance rows with power and hours were found")
+    return summary.to_dict()
+
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _xlsx_rows(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise LoadFileError("XLSX support requires openpyxl; upload a CSV instead")
+    from openpyxl.utils.exceptions import InvalidFileException
+    # read_only mode streams worksheet XML instead of building the full workbook
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError, OSError) as e:
+        raise LoadFileError(f"The file is not a readable XLSX workbook ({e.__class__.__name__})")
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def summarise_upload(file_storage, max_rows=MAX_ROWS):
+    """Parse an uploaded CSV/XLSX appliance schedule into a load summary dict"""
+    filename = (file_storage.filename or "").lower()
+    if filename.endswith(".csv"):
+        rows = _csv_rows(file_storage.stream)
+    elif filename.endswith(".xlsx"):
+        rows = _xlsx_rows(file_storage.stream)
+    else:
+        raise LoadFileError("Upload a .csv or .xlsx appliance list")
+    summary = _summarise_rows(rows, max_rows=max_rows)
+    logger.info(f"Summarised appliance list of {summary['rows']} rows: "
+                f"{summary['daily_wh']} Wh/day, peak {summary['peak_w']} W")
+    return summary
+
+
+def summary_for_prompt(summary):
+    """Compact system-prompt block describing an uploaded appliance list"""
+    if not summary:
+        return ""
+    profile = " ".join(f"{v:.0f}" for v in summary["hourly_wh"])
+    top = "; ".join(f"{t['name']} {t['daily_wh']:.0f} Wh" for t in summary["top_loads"])
+    return "\n".join([
+        "UPLOADED APPLIANCE LOAD SUMMARY (calculated locally; use these figures)",
+        f"- Appliances: {summary['appliances']} across {summary['rows']} line items",
+        f"- Daily energy demand: {summary['daily_wh']:.0f} Wh ({summary['daily_kwh']:.2f} kWh/day)",
+        f"- Peak coincident load: {summary['peak_w']:.0f} W; surge load: {summary['surge_w']:.0f} W",
+        f"- Hourly profile 00-23h (Wh): {profile}",
+        f"- Largest loads: {top}",
+    ])
@@ -0,0 +1,217 @@
+"""Latency-aware model routing with cheaper tiers and hedged requests.
+
+``ModelRouter`` picks a model tier from simple request features (prompt length,
+detected intent, whether locally computed sizing facts are available), keeps a
+rolling window of latency and errors per model, and hedges: if the primary
+model has not answered within its observed p95 latency (or a per-tier
+cold-start delay until enough calls have been timed), the same request is
+sent to an alternate model and whichever succeeds first wins. Slow calls are
+only hedged to an alternate that costs no more than the primary; a failed
+primary is always retried on the alternate. Every decision is
+appended as a JSON line to the routing log for later analysis.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging.handlers import RotatingFileHandler
+
+logger = logging.getLogger('solar_assistant')
+
+FAST_TIER = "fast"
+REPORT_TIER = "report"
+
+DEFINITION_RE = re.compile(r"(?i)^\s*(what\s+(is|are|does)|define|explain|describe|why\s+(is|are|do|does)|"
+                           r"how\s+does|difference\s+between|meaning\s+of)\b")
+DESIGN_RE = re.compile(r"(?i)\b(size|sizing|design|calculate|recommend|quote|report|kwh|kwp|appliances?|"
+                       r"load\s+list|autonomy|how\s+many)\b")
+
+
+def detect_intent(prompt):
+    """Classify a prompt as a ``definition`` question or a ``design`` request"""
+    if DESIGN_RE.search(prompt) and not DEFINITION_RE.search(prompt):
+        return "design"
+    if DEFINITION_RE.search(prompt):
+        return "definition"
+    return "design"
+
+
+class ModelStats:
+    """Rolling latency and error window for one model"""
+
+    def __init__(self, window=100):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            if ok:
+                self.latencies.append(latency)
+            self.outcomes.append(ok)
+
+    def p95(self):
+        with self._lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def error_rate(self):
+        with self._lock:
+            if not self.outcomes:
+                return 0.0
+            return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+    def samples(self):
+        return len(self.latencies)
+
+
+class DecisionLog:
+    """Rotating JSON-lines file of routing decisions, separate from the app log"""
+
+    def __init__(self, path, max_bytes=1024 * 1024, backup_count=5):
+        self.handler = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+            self.handler.setFormatter(logging.Formatter('%(message)s'))
+
+    def write(self, record):
+        if self.handler is not None:
+            self.handler.handle(logging.makeLogRecord({"msg": json.dumps(record), "levelno": logging.INFO}))
+
+    def flush(self):
+        if self.handler is not None:
+            self.handler.flush()
+
+
+class ModelRouter:
+    """Chooses a model per request and hedges slow calls to an alternate model"""
+
+    def __init__(self, call, tiers, fast_max_chars=400, hedge_after=None, min_samples=20,
+                 max_error_rate=0.5, log_path=None, max_workers=8, model_costs=None):
+        """``call(model, system_prompt, prompt)`` performs one completion.
+
+        ``tiers`` maps a tier name to ``(primary_model, alternate_model)``.
+        ``hedge_after`` maps a tier to its hedge delay in seconds until a model has
+        ``min_samples`` successful calls, after which its p95 latency is used; tiers
+        not listed are not hedged for slowness until then. ``model_costs`` gives a
+        relative price per model; models without one are never hedged to for slowness.
+        """
+        self.call = call
+        self.tiers = tiers
+        self.fast_max_chars = fast_max_chars
+        self.hedge_after = hedge_after or {}
+        self.model_costs = model_costs or {}
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-router")
+        self.decisions = DecisionLog(log_path)
+
+    def stats_for(self, model):
+        with self._stats_lock:
+            return self.stats.setdefault(model, ModelStats())
+
+    def choose_tier(self, prompt, has_local_facts=False):
+        intent = detect_intent(prompt)
+        short = len(prompt) <= self.fast_max_chars
+        if intent == "definition" and short:
+            return FAST_TIER, intent
+        # Locally computed sizing facts leave the model mostly formatting work
+        if intent == "design" and has_local_facts and short:
+            return FAST_TIER, intent
+        return REPORT_TIER, intent
+
+    def choose_models(self, tier):
+        primary, alternate = self.tiers[tier]
+        # Swap in the alternate while the primary is failing too often
+        if alternate and self.stats_for(primary).error_rate() > self.max_error_rate \
+                and self.stats_for(alternate).error_rate() <= self.max_error_rate:
+            primary, alternate = alternate, primary
+        return primary, alternate
+
+    def hedge_delay(self, model, tier=None):
+        """Seconds to wait before hedging a slow call; None to wait for the primary"""
+        stats = self.stats_for(model)
+        if stats.samples() >= self.min_samples:
+            return stats.p95()
+        return self.hedge_after.get(tier)
+
+    def may_hedge(self, primary, alternate):
+        """Slow calls are duplicated only onto an alternate that costs no more than the primary"""
+        primary_cost, alternate_cost = self.model_costs.get(primary), self.model_costs.get(alternate)
+        return primary_cost is not None and alternate_cost is not None and alternate_cost <= primary_cost
+
+    def _timed_call(self, model, system_prompt, prompt):
+        start = time.perf_counter()
+        try:
+            result = self.call(model, system_prompt, prompt)
+        except Exception:
+            self.stats_for(model).record(time.perf_counter() - start, False)
+            raise
+        self.stats_for(model).record(time.perf_counter() - start, True)
+        return result
+
+    def complete(self, system_prompt, prompt, has_local_facts=False):
+        """Route, call (hedging if slow) and return the response text"""
+        tier, intent = self.choose_tier(prompt, has_local_facts)
+        primary, alternate = self.choose_models(tier)
+        record = {
+            "ts": round(time.time(), 3),
+            "tier": tier,
+            "intent": intent,
+            "prompt_chars": len(prompt),
+            "local_facts": bool(has_local_facts),
+            "primary": primary,
+            "alternate": alternate,
+            "hedged": False,
+        }
+        start = time.perf_counter()
+        try:
+            winner, result = self._complete_hedged(tier, primary, alternate, system_prompt, prompt, record)
+        except Exception as e:
+            record.update(winner=None, error=str(e)[:200],
+                          latency_ms=round((time.perf_counter() - start) * 1000, 1))
+            self.decisions.write(record)
+            raise
+        record.update(winner=winner, latency_ms=round((time.perf_counter() - start) * 1000, 1))
+        self.decisions.write(record)
+        return result
+
+    def _submit(self, fn, *args):
+        # Run in a copy of the caller's context so per-request state (usage charges) follows the call
+        return self._executor.submit(contextvars.copy_context().run, fn, *args)
+
+    def _complete_hedged(self, tier, primary, alternate, system_prompt, prompt, record):
+        futures = {self._submit(self._timed_call, primary, system_prompt, prompt): primary}
+        delay = self.hedge_delay(primary, tier) if alternate and self.may_hedge(primary, alternate) else None
+        done, _ = wait(futures, timeout=delay, return_when=FIRST_COMPLETED)
+
+        primary_failed = done and next(iter(done)).exception() is not None
+        if alternate and (not done or primary_failed):
+            record["hedged"] = True
+            record["hedge_reason"] = "error" if primary_failed else "slow"
+            logger.info(f"Hedging {primary} request to {alternate} ({record['hedge_reason']})")
+            futures[self._submit(self._timed_call, alternate, system_prompt, prompt)] = alternate
+
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()  # a hedge still queued is never sent
+                    return futures[future], future.result()
+                last_error = future.exception()
+        raise last_error
@@ -0,0 +1,201 @@
+"""Opt-in sampling profiler for individual requests.
+
+``ProfilingMiddleware`` wraps the WSGI app so a profile covers everything a
+request touches: Talisman, ``before_request`` checks, the view, template
+rendering and ``after_request`` hooks. A request is profiled when it carries
+the admin token in ``X-Profile-Token`` or is picked by ``sample_rate``. Other
+requests pass straight through, so the cost when profiling is off is one
+header lookup and one random number.
+
+While a request is profiled, a helper thread samples that request thread's
+stack through ``sys._current_frames()`` every ``interval`` seconds. The
+aggregated stacks are written as a speedscope JSON file or a collapsed-stack
+file (for flamegraph.pl), keeping only the newest ``max_files``.
+"""
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+from werkzeug.wsgi import ClosingIterator
+
+logger = logging.getLogger('solar_assistant')
+
+TOKEN_HEADER = "X-Profile-Token"
+FORMATS = {"speedscope": ".speedscope.json", "collapsed": ".collapsed"}
+
+
+class StackSampler:
+    """Samples one thread's stack on a background thread until stopped"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+
+def _frame_label(frame):
+    name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed(stacks):
+    """Brendan Gregg's collapsed-stack format: ``root;child;leaf count`` per line"""
+    return "".join(f"{';'.join(_frame_label(f) for f in stack)} {count}\n"
+                   for stack, count in stacks.most_common())
+
+
+def speedscope(stacks, name, interval, duration):
+    """speedscope's sampled-profile JSON document"""
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in stacks.items():
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            ids.append(index[frame])
+        samples.append(ids)
+        weights.append(round(count * interval * 1000, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled", "name": name, "unit": "milliseconds",
+            "startValue": 0, "endValue": round(duration * 1000, 3),
+            "samples": samples, "weights": weights,
+        }],
+        "name": name,
+        "exporter": "solar_assistant profiler",
+    }
+
+
+class ProfileStore:
+    """Directory of profile files, rotated to the newest ``max_files``"""
+
+    def __init__(self, directory, fmt="speedscope", max_files=50):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown profile format: {fmt}")
+        self.directory = directory
+        self.format = fmt
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def _files(self):
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(tuple(FORMATS.values()))]
+        except FileNotFoundError:
+            return []
+        return sorted(names, reverse=True)  # names start with a sortable timestamp
+
+    def save(self, sampler, method, path, status):
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+        stamp = time.strftime("%Y%m%dT%H%M%S") + f"{time.time() % 1:.3f}"[1:]
+        name = f"{stamp}-{method}-{slug[:40]}-{status}-{sampler.duration * 1000:.0f}ms{FORMATS[self.format]}"
+        if self.format == "speedscope":
+            body = json.dumps(speedscope(sampler.stacks, f"{method} {path}", sampler.interval, sampler.duration))
+        else:
+            body = collapsed(sampler.stacks)
+        with open(os.path.join(self.directory, name), "w", encoding="utf-8") as f:
+            f.write(body)
+        with self._lock:
+            for old in self._files()[self.max_files:]:
+                try:
+                    os.remove(os.path.join(self.directory, old))
+                except OSError:
+                    pass
+        return name
+
+    def recent(self, limit=50):
+        entries = []
+        for name in self._files()[:limit]:
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append({"name": name, "bytes": stat.st_size,
+                            "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(stat.st_mtime))})
+        return entries
+
+
+class ProfilingMiddleware:
+    """WSGI middleware that profiles token-tagged or randomly sampled requests"""
+
+    def __init__(self, wsgi_app, store, token=None, sample_rate=0.0, interval=0.005):
+        self.wsgi_app = wsgi_app
+        self.store = store
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+    def authorised(self, supplied):
+        if not self.token or not supplied:
+            return False
+        # compare_digest rejects non-ASCII str, so compare bytes: any header value is then just a mismatch
+        return secrets.compare_digest(supplied.encode("utf-8", "surrogateescape"),
+                                      self.token.encode("utf-8", "surrogateescape"))
+
+    def _wanted(self, environ):
+        if self.token and self.authorised(environ.get("HTTP_X_PROFILE_TOKEN")):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self._wanted(environ):
+            return self.wsgi_app(environ, start_response)
+
+        sampler = StackSampler(threading.get_ident(), self.interval).start()
+        status = []
+
+        def capture_status(status_line, headers, exc_info=None):
+            status.append(status_line.split(" ", 1)[0])
+            return start_response(status_line, headers, exc_info)
+
+        def finish():
+            sampler.stop()
+            try:
+                name = self.store.save(sampler, environ.get("REQUEST_METHOD", "GET"),
+                                       environ.get("PATH_INFO", "/"), status[0] if status else "000")
+                logger.info(f"Wrote request profile {name} ({sum(sampler.stacks.values())} samples)")
+            except OSError as e:
+                logger.error(f"Could not write request profile: {e}")
+
+        try:
+            result = self.wsgi_app(environ, capture_status)
+        except Exception:
+            finish()
+            raise
+        # Stop once the body has been sent, so streamed responses are covered too
+        return ClosingIterator(result, finish)
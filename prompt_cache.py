@@ -0,0 +1,193 @@
+"""Near-duplicate prompt cache using MinHash signatures and LSH banding.
+
+Technicians often send the same design request in different words. Prompts are
+normalised (units, synonyms, stopwords) into token sets, MinHashed, and indexed
+in LSH buckets so a lookup only compares a handful of candidates. A stored
+response is returned when the estimated Jaccard similarity reaches the
+configured threshold for the same language, the same numeric values, the same
+key terms (named place, battery chemistry, grid topology) and the same
+system-prompt context. Key terms are part of the namespace rather than the
+similarity because swapping a single one changes the answer however similar
+the rest of the prompt is.
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+
+logger = logging.getLogger('solar_assistant')
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed so signatures are stable across processes and restarts
+_rng = random.Random(20250418)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERM)]
+
+SYNONYMS = {
+    "size": "design", "sizing": "design", "designing": "design", "calculate": "design",
+    "calculation": "design", "plan": "design", "planning": "design",
+    "panels": "panel", "pv": "panel", "module": "panel", "modules": "panel",
+    "batteries": "battery", "inverters": "inverter", "controllers": "controller",
+    "kilowatt": "kw", "kilowatts": "kw", "watts": "w", "watt": "w",
+    "house": "home", "household": "home", "residential": "home",
+    "ongrid": "gridtied", "gridconnected": "gridtied", "standalone": "offgrid",
+}
+
+# Battery chemistries and grid topologies, after normalisation
+CHEMISTRY_TERMS = frozenset(["lithium", "lifepo", "lfp", "nmc", "ion", "lead", "acid", "agm", "gel", "flooded",
+                             "nickel", "nicd", "sodium", "saltwater"])
+TOPOLOGY_TERMS = frozenset(["offgrid", "gridtied", "hybrid", "microgrid", "minigrid"])
+PLACE_RE = re.compile(r"\b(?:in|at|near|around|for)\s+((?:[A-Z][\w'-]+)(?:[ ,]+[A-Z][\w'-]+)*)")
+
+STOPWORDS = frozenset("""
+a an the in for of to my me please i we need want would like system solar with and on at
+per day daily what is how can you do does should be it this that from help give
+""".split())
+
+
+def normalise(prompt):
+    """Reduce a prompt to (token set, numeric signature)"""
+    text = prompt.lower()
+    text = re.sub(r"kwh\s*(?:/|per)\s*day", "kwh", text)
+    text = re.sub(r"\b(off|on|mini|micro)[\s-]grid\b", r"\1grid", text)
+    text = re.sub(r"\bgrid[\s-](tied|connected)\b", r"grid\1", text)
+    text = re.sub(r"(\d)([a-z])", r"\1 \2", text)
+    tokens = set()
+    numbers = []
+    for token in re.findall(r"[a-z]+|\d+(?:\.\d+)?", text):
+        if token[0].isdigit():
+            token = f"{float(token):g}"
+            numbers.append(token)
+        else:
+            token = SYNONYMS.get(token, token)
+            if token in STOPWORDS:
+                continue
+        tokens.add(token)
+    return tokens, tuple(sorted(numbers))
+
+
+def place_words(prompt):
+    """Lower-cased words of every named place ("in Mombasa, Kenya" -> {"mombasa", "kenya"})"""
+    return {w.lower() for m in PLACE_RE.finditer(prompt) for w in re.findall(r"[\w'-]+", m.group(1))}
+
+
+def key_terms(prompt, tokens):
+    """Primary place, battery chemistries and grid topologies a cached answer must share.
+
+    The primary place is the first named place up to any comma, so "Mombasa" and
+    "Mombasa, Kenya" share it while "Nairobi" and "New Delhi" do not.
+    """
+    terms = tokens & (CHEMISTRY_TERMS | TOPOLOGY_TERMS)
+    match = PLACE_RE.search(prompt)
+    if match:
+        terms.add("place:" + " ".join(re.findall(r"[\w'-]+", match.group(1).split(",")[0])).lower())
+    return tuple(sorted(terms))
+
+
+def minhash(tokens):
+    """MinHash signature (NUM_PERM 32-bit values) of a token set"""
+    hashes = [zlib.crc32(t.encode("utf-8")) for t in tokens] or [0]
+    return array('I', (min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+                       for a, b in _PERMUTATIONS))
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class PromptCache:
+    """Bounded LRU cache of responses, looked up by near-duplicate prompt"""
+
+    def __init__(self, threshold=0.9, max_entries=10000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # entry id -> (signature, namespace, response)
+        self._buckets = {}  # bucket key -> set of entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _namespace(language, numbers, terms, context):
+        context_hash = hashlib.sha1((context or "").encode("utf-8")).hexdigest()[:16]
+        return (language, numbers, terms, context_hash)
+
+    @staticmethod
+    def _bucket_keys(namespace, signature):
+        return [hash((namespace, band, tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])))
+                for band in range(BANDS)]
+
+    def key(self, prompt, language="en", context=None):
+        """(signature, namespace) of a prompt.
+
+        The primary place is matched exactly through the namespace, so place words
+        are left out of the similarity: qualifiers such as ", Kenya" do not dilute it.
+        """
+        tokens, numbers = normalise(prompt)
+        namespace = self._namespace(language, numbers, key_terms(prompt, tokens), context)
+        return minhash(tokens - place_words(prompt) or tokens), namespace
+
+    def get(self, prompt, language="en", context=None):
+        return self.get_signature(*self.key(prompt, language, context))
+
+    def put(self, prompt, response, language="en", context=None):
+        self.put_signature(*self.key(prompt, language, context), response)
+
+    def get_signature(self, signature, namespace):
+        keys = self._bucket_keys(namespace, signature)
+        with self._lock:
+            best_id, best_score = None, 0.0
+            seen = set()
+            for key in keys:
+                for entry_id in self._buckets.get(key, ()):
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    score = similarity(signature, self._entries[entry_id][0])
+                    if score > best_score:
+                        best_id, best_score = entry_id, score
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def put_signature(self, signature, namespace, response):
+        keys = self._bucket_keys(namespace, signature)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (signature, namespace, response)
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        entry_id, (signature, namespace, _) = self._entries.popitem(last=False)
+        for key in self._bucket_keys(namespace, signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
@@ -0,0 +1,275 @@
+"""Local scope pre-classifier that answers off-topic prompts without an LLM call.
+
+Prompts are routed to ``in_scope``, ``out_of_scope`` or ``ambiguous`` using
+regex rules for the guardrail refusal categories (utility-scale, wind/hydro,
+safety bypass) plus a small logistic-regression model over bag-of-words and
+keyword features. Only ``out_of_scope`` prompts are answered locally; ambiguous
+ones still go to the model. Outside the explicit rules a prompt is refused only
+when the model is nearly certain and the prompt uses no solar, electrical or
+scientific vocabulary, since the assistant also answers general electrical and
+science questions.
+
+Retrain the bundled weights after editing ``data/scope_examples.csv`` with:
+    python prompt_classifier.py --train
+"""
+import csv
+import json
+import logging
+import math
+import random
+import re
+import sys
+import threading
+from collections import Counter, namedtuple
+
+logger = logging.getLogger('solar_assistant')
+
+IN_SCOPE = "in_scope"
+OUT_OF_SCOPE = "out_of_scope"
+AMBIGUOUS = "ambiguous"
+
+ScopeDecision = namedtuple("ScopeDecision", ["label", "probability", "reason", "refusal"])
+
+# Used when the prompt is simply unrelated to solar; mirrors kbs_solar_prompt_final.txt
+GENERAL_REFUSAL = ("Is there anything else I can assist you with regarding solar systems "
+                   "or scientific topics?")
+
+# Fallbacks for the guardrail templates if the guardrails file cannot be read
+DEFAULT_TEMPLATES = {
+    "utility_scale": "Apologies, scoped to PV systems ≤ 1 MW. Consult utility‑scale specialist.",
+    "wind_hydro": "I focus exclusively on solar PV and can’t assist with wind‑energy design.",
+    "safety_bypass": "I’m sorry, can’t help. Disabling protection violates code and is hazardous.",
+}
+TEMPLATE_LABELS = {"mw": "utility_scale", "wind": "wind_hydro", "safety": "safety_bypass"}
+
+# Canned translations of the refusals, by language code and reason ("general" for GENERAL_REFUSAL),
+# so refusing a non-English prompt needs no translation call
+REFUSAL_TRANSLATIONS = {
+    "sw": {
+        "general": "Je, kuna jambo lingine ninaloweza kukusaidia kuhusu mifumo ya nishati ya jua au mada za "
+                   "kisayansi?",
+        "utility_scale": "Samahani, huduma hii inahusu mifumo ya PV isiyozidi MW 1. Wasiliana na mtaalamu wa "
+                         "miradi mikubwa ya umeme.",
+        "wind_hydro": "Ninashughulikia nishati ya jua (PV) pekee na siwezi kusaidia katika usanifu wa mifumo ya "
+                      "nishati ya upepo.",
+        "safety_bypass": "Samahani, siwezi kusaidia. Kuzima vifaa vya ulinzi kunakiuka kanuni na ni hatari.",
+    },
+    "ar": {
+        "general": "هل هناك أي شيء آخر يمكنني مساعدتك به بخصوص أنظمة الطاقة الشمسية أو المواضيع العلمية؟",
+        "utility_scale": "عذرًا، يقتصر نطاقي على أنظمة الطاقة الكهروضوئية حتى 1 ميغاواط. يُرجى استشارة متخصص "
+                         "في مشاريع المرافق الكبرى.",
+        "wind_hydro": "أركّز حصريًا على الطاقة الشمسية الكهروضوئية ولا يمكنني المساعدة في تصميم أنظمة طاقة الرياح.",
+        "safety_bypass": "عذرًا، لا يمكنني المساعدة. تعطيل وسائل الحماية يخالف اللوائح وهو أمر خطير.",
+    },
+    "am": {
+        "general": "ስለ ፀሐይ ኃይል ሥርዓቶች ወይም ሳይንሳዊ ርዕሶች ሌላ ልረዳዎት የምችለው ነገር አለ?",
+        "utility_scale": "ይቅርታ፣ አገልግሎቴ እስከ 1 MW ለሆኑ የPV ሥርዓቶች ብቻ ነው። የትላልቅ የኃይል ፕሮጀክቶች ባለሙያን ያማክሩ።",
+        "wind_hydro": "የማተኩረው በፀሐይ PV ላይ ብቻ ስለሆነ በነፋስ ኃይል ንድፍ ላይ መርዳት አልችልም።",
+        "safety_bypass": "ይቅርታ፣ መርዳት አልችልም። የመከላከያ መሣሪያዎችን ማሰናከል ደንቡን ይጥሳል፤ አደገኛም ነው።",
+    },
+    "es": {
+        "general": "¿Hay algo más en lo que pueda ayudarle sobre sistemas solares o temas científicos?",
+        "utility_scale": "Lo siento, mi alcance se limita a sistemas FV de hasta 1 MW. Consulte a un especialista "
+                         "en proyectos a escala de servicios públicos.",
+        "wind_hydro": "Me dedico exclusivamente a la energía solar fotovoltaica y no puedo ayudar con el diseño "
+                      "de sistemas eólicos.",
+        "safety_bypass": "Lo siento, no puedo ayudar. Desactivar las protecciones infringe la normativa y es "
+                         "peligroso.",
+    },
+    "fr": {
+        "general": "Puis-je vous aider pour autre chose concernant les systèmes solaires ou des sujets "
+                   "scientifiques ?",
+        "utility_scale": "Désolé, mon champ d'action se limite aux systèmes PV de 1 MW au maximum. Consultez un "
+                         "spécialiste des projets à l'échelle des services publics.",
+        "wind_hydro": "Je me consacre exclusivement au solaire photovoltaïque et ne peux pas aider à la "
+                      "conception de systèmes éoliens.",
+        "safety_bypass": "Désolé, je ne peux pas vous aider. Désactiver les protections enfreint les normes et "
+                         "est dangereux.",
+    },
+}
+
+SOLAR_TERMS = re.compile(
+    r"(?i)\b(solar|pv|photovoltaic|panels?|modules?|inverters?|batter(?:y|ies)|lifepo4?|agm|"
+    r"mppt|pwm|charge controller|kwh|kwp|wp|array|string|off-?grid|on-?grid|hybrid|mini-?grid|"
+    r"autonomy|depth of discharge|irradiance|sun hours|tilt|net metering|rooftop)\b")
+# Electrical and scientific questions, and the sites and upkeep of installations, that the assistant also
+# answers; prompts using them are never refused by the model alone
+DOMAIN_TERMS = re.compile(
+    r"(?i)\b(electric\w*|electron\w*|volt(?:s|age)?|amps?|amperes?|amperage|current|resistance|ohms?|watts?|"
+    r"kw|power|energy|circuits?|cables?|wires?|wiring|gauge|awg|mm2|breakers?|fuses?|rcds?|earthing|grounding|"
+    r"generators?|gensets?|backup|appliances?|fridges?|refrigerators?|loads?|sockets?|transformers?|motors?|"
+    r"pumps?|physics|photons?|photoelectric|semiconductors?|diodes?|capacitors?|resistors?|magnet\w*|"
+    r"thermodynamics?|efficiency|radiation|light|"
+    # Sites, facilities and installation upkeep: "plan a clinic in Kisumu", "clean dust off my roof"
+    r"clinics?|hospitals?|health cent(?:re|er)s?|schools?|farms?|boreholes?|irrigation|villages?|homes?|houses?|"
+    r"cabins?|facilit(?:y|ies)|sites?|roofs?|rooftops?|dust|dirt|soiling|shading|shade|install(?:ation|er)?s?|"
+    r"maintenance|maintain)\b")
+MEGAWATTS = re.compile(r"(?i)(\d+(?:\.\d+)?)\s*(?:mw|mwp|megawatts?)\b")
+UTILITY_SCALE = re.compile(r"(?i)\butility[\s-]*scale\b|\bgigawatt|\bgw\b")
+WIND_HYDRO = re.compile(r"(?i)\b(wind[\s-]*(?:turbine|energy|farm|power|generator)s?|hydro(?:power|electric)?|"
+                        r"micro[\s-]*hydro|diesel[\s-]*only)\b")
+# A bypass verb directly followed by the protection it defeats ("bypass the main breaker")
+SAFETY_BYPASS = re.compile(
+    r"(?i)\b(bypass|disable|defeat|jump(?:er)?|short out|override)\s+(?:(?:the|a|an|my|our|its|their|all|any)\s+)?"
+    r"(?:(?:main|battery|inverter|dc|ac|earth|ground|overcurrent|circuit|safety)\s+)?"
+    r"(fuses?|breakers?|rcds?|gfci|afci|bms|protection|earthing|grounding|rapid shutdown|isolators?|"
+    r"safety|surge protect\w*|anti-?islanding)\b")
+
+TOKEN_RE = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append("<num>" if token[0].isdigit() else token)
+    return tokens
+
+
+def features(text):
+    """Sparse feature map: bag of words plus keyword indicator features"""
+    feats = Counter(f"w:{t}" for t in tokenize(text) if len(t) > 1)
+    solar_hits = len(SOLAR_TERMS.findall(text))
+    if solar_hits:
+        feats["__solar_terms__"] = min(solar_hits, 3)
+    domain_hits = len(DOMAIN_TERMS.findall(text))
+    if domain_hits:
+        feats["__domain_terms__"] = min(domain_hits, 3)
+    if re.search(r"(?i)\d\s*(k?wh?p?|v|ah|a)\b", text):
+        feats["__electrical_units__"] = 1
+    return feats
+
+
+def _sigmoid(z):
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+def train(examples, epochs=60, learning_rate=0.3, l2=1e-3, seed=13):
+    """Fit logistic-regression weights on (text, is_in_scope) pairs with SGD"""
+    rng = random.Random(seed)
+    data = [(features(text), 1.0 if label else 0.0) for text, label in examples]
+    weights = {}
+    for _ in range(epochs):
+        rng.shuffle(data)
+        for feats, target in data:
+            z = sum(weights.get(k, 0.0) * v for k, v in feats.items())
+            error = _sigmoid(z) - target
+            for k, v in feats.items():
+                w = weights.get(k, 0.0)
+                weights[k] = w - learning_rate * (error * v + l2 * w)
+    return {k: round(w, 5) for k, w in weights.items() if abs(w) > 1e-4}
+
+
+def load_examples(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["text"], row["label"].strip() == "in") for row in csv.DictReader(f)]
+
+
+def load_refusal_templates(guardrails_path):
+    """Parse the STANDARD REFUSAL TEMPLATES section of the guardrails file"""
+    templates = dict(DEFAULT_TEMPLATES)
+    try:
+        with open(guardrails_path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        logger.warning(f"Guardrails file not found, using default refusals: {guardrails_path}")
+        return templates
+    section = text.split("STANDARD REFUSAL TEMPLATES", 2)[-1]
+    for line in section.strip().splitlines():
+        if not line.strip():
+            break
+        match = re.match(r"^(.+?)\s*:\s*“(.+)”\s*$", line.strip())
+        if not match:
+            continue
+        label = match.group(1).lower()
+        for key, name in TEMPLATE_LABELS.items():
+            if key in label:
+                templates[name] = match.group(2)
+    return templates
+
+
+class ScopeClassifier:
+    """Routes prompts by scope and keeps per-decision counts"""
+
+    def __init__(self, weights, templates=None, in_threshold=0.65, out_threshold=0.05):
+        self.weights = weights
+        self.templates = templates or dict(DEFAULT_TEMPLATES)
+        self.in_threshold = in_threshold
+        self.out_threshold = out_threshold
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_files(cls, model_path, examples_path=None, guardrails_path=None, **kwargs):
+        """Load bundled weights, training from the examples if the model file is missing"""
+        try:
+            with open(model_path, "r", encoding="utf-8") as f:
+                weights = json.load(f)
+        except FileNotFoundError:
+            if not examples_path:
+                raise
+            logger.warning(f"Scope model {model_path} not found; training from {examples_path}")
+            weights = train(load_examples(examples_path))
+        templates = load_refusal_templates(guardrails_path) if guardrails_path else None
+        return cls(weights, templates, **kwargs)
+
+    def probability(self, text):
+        """Probability that a prompt is within the solar PV scope"""
+        z = sum(self.weights.get(k, 0.0) * v for k, v in features(text).items())
+        return _sigmoid(z)
+
+    def _rule(self, text):
+        for match in MEGAWATTS.finditer(text):
+            if float(match.group(1)) > 1:
+                return "utility_scale"
+        if UTILITY_SCALE.search(text):
+            return "utility_scale"
+        if SAFETY_BYPASS.search(text):
+            return "safety_bypass"
+        if WIND_HYDRO.search(text) and not re.search(r"(?i)\b(solar|pv|photovoltaic)\b", text):
+            return "wind_hydro"
+        return None
+
+    def localised_refusal(self, decision, language):
+        """``decision``'s refusal in ``language`` (a code such as "sw"), or None if there is no canned one"""
+        if language == "en":
+            return decision.refusal
+        reason = decision.reason if decision.reason in self.templates else "general"
+        return REFUSAL_TRANSLATIONS.get(language, {}).get(reason)
+
+    def classify(self, text):
+        rule = self._rule(text)
+        if rule:
+            decision = ScopeDecision(OUT_OF_SCOPE, 0.0, rule, self.templates[rule])
+        else:
+            p = self.probability(text)
+            if p >= self.in_threshold:
+                decision = ScopeDecision(IN_SCOPE, p, "model", None)
+            elif p <= self.out_threshold and not SOLAR_TERMS.search(text) and not DOMAIN_TERMS.search(text):
+                decision = ScopeDecision(OUT_OF_SCOPE, p, "model", GENERAL_REFUSAL)
+            else:
+                decision = ScopeDecision(AMBIGUOUS, p, "model", None)
+
+        with self._lock:
+            self.counts[decision.label] += 1
+            counts = dict(self.counts)
+        logger.info(f"Scope decision: {decision.label} (reason={decision.reason}, "
+                    f"p={decision.probability:.2f}); totals={counts}, "
+                    f"model calls saved={counts.get(OUT_OF_SCOPE, 0)}")
+        return decision
+
+
+if __name__ == "__main__":
+    if "--train" in sys.argv:
+        examples = load_examples("data/scope_examples.csv")
+        trained = train(examples)
+        with open("data/scope_model.json", "w", encoding="utf-8") as f:
+            json.dump(trained, f, indent=0, sort_keys=True)
+        classifier = ScopeClassifier(trained)
+        correct = sum((classifier.probability(t) >= 0.5) == label for t, label in examples)
+        print(f"Trained {len(trained)} weights; training accuracy {correct}/{len(examples)}")
+    else:
+        print(__doc__)
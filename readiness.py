@@ -0,0 +1,228 @@
+"""Cached readiness checks for the model upstream, prompt files and storage.
+
+``ReadinessChecker`` runs a set of named probes on a background thread every
+``interval`` seconds and keeps the latest result as a pre-serialised JSON body.
+The thread belongs to the process that called ``start``; after a fork, the
+next ``start`` (the middleware calls it on every probe) starts a new one.
+``ReadinessMiddleware`` answers ``/readyz`` from that cache before the request
+reaches Flask (no Talisman, CORS hook, ``security_checks`` or rate limiter),
+so load balancer probes cost microseconds and never call the upstream API.
+``key_checker.py --ready`` runs the same probes once from the command line.
+
+A probe returns a short detail string on success and raises on failure. Only
+``critical`` probes decide readiness; others report the service as degraded.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from component_catalog import CatalogStore
+
+logger = logging.getLogger('solar_assistant')
+
+Probe = namedtuple("Probe", ["name", "check", "critical"])
+
+READY = "ready"
+DEGRADED = "degraded"
+NOT_READY = "not_ready"
+STARTING = "starting"
+
+
+def model_upstream_probe(client, model):
+    """The API answers a model listing and offers the configured model"""
+    def check():
+        if client is None:
+            raise RuntimeError("OpenAI client is not initialised")
+        if hasattr(client, "chat") and hasattr(client.chat, "completions"):
+            listing = client.models.list()
+        else:
+            listing = client.Model.list()
+        ids = {m.id for m in listing.data}
+        if model and ids and model not in ids:
+            raise RuntimeError(f"configured model {model} is not available")
+        return f"{len(ids)} models"
+    return check
+
+
+def file_probe(path):
+    def check():
+        with open(path, "rb") as f:
+            size = len(f.read(1))
+        if not size:
+            raise RuntimeError(f"{path} is empty")
+        return f"{os.path.getsize(path)} bytes"
+    return check
+
+
+def sqlite_probe(path):
+    def check():
+        conn = sqlite3.connect(path, timeout=2.0)
+        try:
+            conn.execute("SELECT 1").fetchone()
+        finally:
+            conn.close()
+        return "ok"
+    return check
+
+
+def catalog_probe(store):
+    def check():
+        catalog = store.get()
+        if catalog is None or not len(catalog):
+            raise RuntimeError("component catalog is empty or unreadable")
+        return f"{len(catalog)} components"
+    return check
+
+
+def writable_dir_probe(path):
+    def check():
+        os.makedirs(path, exist_ok=True)
+        if not os.access(path, os.W_OK):
+            raise RuntimeError(f"{path} is not writable")
+        return "writable"
+    return check
+
+
+def default_probes(config, client, catalog_store=None):
+    """Probes for this app; ``config`` is a mapping such as ``app.config``"""
+    probes = [Probe("openai", model_upstream_probe(client, config.get("OPENAI_MODEL")), True)]
+    for key in ("PROMPT_PATH", "TEMPLATE_PATH", "GUARDRAILS_PATH"):
+        if config.get(key):
+            probes.append(Probe(key.lower().replace("_path", "_file"), file_probe(config[key]),
+                                key == "PROMPT_PATH"))
+    if catalog_store is None and config.get("CATALOG_PATH"):
+        catalog_store = CatalogStore(config["CATALOG_PATH"], config.get("CATALOG_SNAPSHOT_PATH"))
+    if catalog_store is not None:
+        probes.append(Probe("component_catalog", catalog_probe(catalog_store), False))
+    for key, name in (("SINGLE_FLIGHT_DB", "single_flight_db"), ("ADMISSION_DB", "usage_ledger_db")):
+        if config.get(key):
+            probes.append(Probe(name, sqlite_probe(config[key]), False))
+    probes.append(Probe("logs_dir", writable_dir_probe("logs"), False))
+    return probes
+
+
+class ReadinessChecker:
+    """Runs probes periodically and caches the latest result"""
+
+    def __init__(self, probes, interval=30.0, timeout=5.0):
+        self.probes = probes
+        self.interval = interval
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(probes)), thread_name_prefix="readiness")
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+        self._start_lock = threading.Lock()
+        self._checked = 0.0
+        self._result = {"status": STARTING, "checks": {}}
+        self._cached = self._encode(self._result)
+
+    @staticmethod
+    def _encode(result):
+        code = "503 Service Unavailable" if result["status"] in (NOT_READY, STARTING) else "200 OK"
+        return code, json.dumps(result).encode("utf-8")
+
+    def _run_probe(self, probe):
+        start = time.perf_counter()
+        try:
+            detail, ok = probe.check(), True
+        except Exception as e:
+            detail, ok = str(e) or e.__class__.__name__, False
+        return {"ok": ok, "critical": probe.critical, "detail": detail[:200],
+                "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    def run_once(self):
+        """Run every probe concurrently (bounded by ``timeout``) and cache the result"""
+        futures = {probe.name: self._executor.submit(self._run_probe, probe) for probe in self.probes}
+        critical = {probe.name: probe.critical for probe in self.probes}
+        checks = {}
+        deadline = time.monotonic() + self.timeout
+        for name, future in futures.items():
+            try:
+                checks[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                checks[name] = {"ok": False, "critical": critical[name],
+                                "detail": f"timed out after {self.timeout}s", "latency_ms": None}
+        if any(not c["ok"] and c["critical"] for c in checks.values()):
+            status = NOT_READY
+        elif any(not c["ok"] for c in checks.values()):
+            status = DEGRADED
+        else:
+            status = READY
+        result = {"status": status, "checked_at": round(time.time(), 3), "checks": checks}
+        if status != self._result["status"]:
+            logger.info(f"Readiness changed from {self._result['status']} to {status}")
+        self._result, self._cached, self._checked = result, self._encode(result), time.monotonic()
+        return result
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Readiness check failed to run: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        """Start the background thread in this process if it is not running yet"""
+        if self._thread is not None and self._pid == os.getpid():
+            return self
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's threads (probe workers included) do not exist here
+                self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.probes)),
+                                                    thread_name_prefix="readiness")
+                self._stop = threading.Event()
+                self._thread = None
+                self._checked = 0.0
+                self._pid = os.getpid()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="readiness-checker", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def cached(self):
+        """(status line, JSON body) of the latest result; stale results count as not ready"""
+        if self._checked and time.monotonic() - self._checked > 3 * self.interval + self.timeout:
+            return "503 Service Unavailable", json.dumps(
+                {"status": NOT_READY, "checks": {}, "detail": "readiness checker stalled"}).encode("utf-8")
+        return self._cached
+
+    @property
+    def result(self):
+        return self._result
+
+
+class ReadinessMiddleware:
+    """Answers ``path`` from the checker's cache without entering the Flask app.
+
+    With ``background`` set, the checker is started on the first probe in each
+    process, so a pre-forking server's workers each run their own checks.
+    """
+
+    def __init__(self, wsgi_app, checker, path="/readyz", background=False):
+        self.wsgi_app = wsgi_app
+        self.checker = checker
+        self.path = path
+        self.background = background
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") != self.path:
+            return self.wsgi_app(environ, start_response)
+        if self.background:
+            self.checker.start()
+        status, body = self.checker.cached()
+        headers = [("Content-Type", "application/json"), ("Content-Length", str(len(body))),
+                   ("Cache-Control", "no-store")]
+        start_response(status, headers)
+        return [] if environ.get("REQUEST_METHOD") == "HEAD" else [body]
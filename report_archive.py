@@ -0,0 +1,243 @@
+"""Searchable local archive of generated reports.
+
+Reports are stored zlib-compressed in SQLite, de-duplicated by content hash,
+and indexed in a contentless FTS5 table over the prompt, report text, region,
+system size and language. Only the index is kept there; the text itself lives
+once, compressed, in ``reports``. ``submit`` only enqueues; a background
+writer thread inserts queued reports in batched transactions, so archiving
+never adds a disk write to the request path. The writer (and the SQLite
+connection) is set up lazily in each process, so an archive created before a
+pre-forking server forks still works in every worker.
+
+Every report belongs to an ``owner`` (the session that generated it);
+``search`` and ``get`` only return the caller's own reports.
+"""
+import hashlib
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+logger = logging.getLogger('solar_assistant')
+
+ArchivedReport = namedtuple("ArchivedReport", ["id", "created", "title", "region", "system_kw", "daily_kwh",
+                                               "language", "prompt"])
+
+LOCATION_RE = re.compile(r"(?im)^[\W_]*(?:client\s+|project\s+|site\s+)?(?:location|site)[\W_]*:\s*\**\s*(.+?)\s*$")
+PLACE_RE = re.compile(r"\b(?:in|at|near)\s+([A-Z][\w'-]+(?:[ ,]+[A-Z][\w'-]+)*)")
+KWP_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*kWp\b", re.I)
+WP_RE = re.compile(r"(\d{1,3}(?:,\d{3})+|\d{3,6})\s*Wp\b")
+KWH_RE = re.compile(r"(\d+(?:\.\d+)?)\s*kWh\s*(?:/|per\s+)\s*day", re.I)
+TITLE_RE = re.compile(r"(?m)^#{1,3}\s+(.+?)\s*$")
+
+
+def extract_metadata(prompt, report):
+    """Best-effort region, PV array size (kWp), daily energy and title from a report"""
+    region = None
+    match = LOCATION_RE.search(report)
+    if match and "{" not in match.group(1):
+        region = match.group(1).strip("* ")
+    else:
+        match = PLACE_RE.search(prompt)
+        if match:
+            region = match.group(1).strip(" ,")
+
+    system_kw = None
+    match = KWP_RE.search(report) or KWP_RE.search(prompt)
+    if match:
+        system_kw = float(match.group(1).replace(",", "."))
+    else:
+        match = WP_RE.search(report)
+        if match:
+            system_kw = float(match.group(1).replace(",", "")) / 1000.0
+
+    match = KWH_RE.search(prompt) or KWH_RE.search(report)
+    daily_kwh = float(match.group(1)) if match else None
+
+    match = TITLE_RE.search(report)
+    title = match.group(1).strip("*# ") if match else prompt[:80]
+    return {"region": region, "system_kw": system_kw, "daily_kwh": daily_kwh, "title": title[:200]}
+
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 query: every word must match, as a prefix"""
+    words = re.findall(r"\w+", text or "")
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in words)
+
+
+class ReportArchive:
+    """Compressed report store with a full-text index and a batched background writer"""
+
+    def __init__(self, db_path=None, batch_size=100, flush_interval=1.0, rank_window=2000):
+        self.db_path = db_path or ":memory:"
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rank_window = rank_window
+        self._pid = None
+        self._writer = None
+        self._process_lock = threading.Lock()
+        # Connect once here so a bad path or schema fails at startup rather than on a request
+        self._connect()
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._pid = os.getpid()
+        with self._lock:
+            if self.db_path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    id INTEGER PRIMARY KEY,
+                    digest TEXT NOT NULL UNIQUE,
+                    owner TEXT NOT NULL DEFAULT '',
+                    created REAL NOT NULL,
+                    language TEXT,
+                    region TEXT,
+                    system_kw REAL,
+                    daily_kwh REAL,
+                    title TEXT,
+                    prompt TEXT NOT NULL,
+                    body BLOB NOT NULL
+                )""")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(reports)")}
+            if "owner" not in columns:
+                # Archives created before reports had owners: nobody can see the old rows
+                self._conn.execute("ALTER TABLE reports ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reports_owner ON reports (owner, created)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reports_created ON reports (created)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reports_system_kw ON reports (system_kw)")
+            self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5("
+                               "prompt, body, region, system_size, language, content='')")
+
+    def _ensure_process(self):
+        """Reconnect after a fork and start this process's writer thread on first use"""
+        with self._process_lock:
+            if self._pid != os.getpid():
+                self._connect()
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="report-archive", daemon=True)
+                self._writer.start()
+
+    def submit(self, prompt, report, language, owner):
+        """Queue ``owner``'s report for archiving; returns immediately"""
+        self._ensure_process()
+        self._queue.put((time.time(), owner, prompt, report, language))
+
+    def flush(self):
+        """Block until every queued report has been written"""
+        self._ensure_process()
+        self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except sqlite3.Error as e:
+                logger.error(f"Could not archive {len(batch)} report(s): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                written = 0
+                for created, owner, prompt, report, language in batch:
+                    digest = hashlib.sha256(f"{owner}\x1f{language}\x1f{report}".encode("utf-8")).hexdigest()
+                    meta = extract_metadata(prompt, report)
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO reports (digest, owner, created, language, region, system_kw, "
+                        "daily_kwh, title, prompt, body) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (digest, owner, created, language, meta["region"], meta["system_kw"], meta["daily_kwh"],
+                         meta["title"], prompt, zlib.compress(report.encode("utf-8"), 6)))
+                    if not cursor.rowcount:
+                        continue  # identical report already archived
+                    size = f"{meta['system_kw']:g} kWp" if meta["system_kw"] is not None else ""
+                    self._conn.execute(
+                        "INSERT INTO reports_fts (rowid, prompt, body, region, system_size, language) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (cursor.lastrowid, prompt, report, meta["region"] or "", size, language or ""))
+                    written += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if written:
+            logger.info(f"Archived {written} report(s)")
+
+    def search(self, owner, text="", language=None, min_kw=None, max_kw=None, limit=20):
+        """``owner``'s best-matching reports for ``text`` (most recent first when empty).
+
+        Relevance (bm25) is computed over the owner's newest ``rank_window`` matches
+        only, which bounds the cost of broad queries as the archive grows.
+        """
+        self._ensure_process()
+        columns = "r.id, r.created, r.title, r.region, r.system_kw, r.daily_kwh, r.language, r.prompt"
+        where, params = ["r.owner = ?"], [owner]
+        query = fts_query(text)
+        if query and language:
+            # Filter on the indexed language column inside FTS rather than after the join
+            query += ' AND language : "' + language.replace('"', '""') + '"'
+        if query:
+            sql = f"SELECT {columns} FROM reports_fts f JOIN reports r ON r.id = f.rowid"
+            where.append("reports_fts MATCH ?")
+            # The rank window is the owner's newest matches, not everyone's
+            where.append("f.rowid >= coalesce((SELECT min(rowid) FROM (SELECT w.rowid FROM reports_fts w "
+                         "JOIN reports o ON o.id = w.rowid WHERE reports_fts MATCH ? AND o.owner = ? "
+                         "ORDER BY w.rowid DESC LIMIT ?)), 0)")
+            params += [query, query, owner, self.rank_window]
+            order = "f.rank"  # bm25 relevance
+        else:
+            sql = f"SELECT {columns} FROM reports r"
+            order = "r.created DESC"
+            if language:
+                where.append("r.language = ?")
+                params.append(language)
+        if min_kw is not None:
+            where.append("r.system_kw >= ?")
+            params.append(min_kw)
+        if max_kw is not None:
+            where.append("r.system_kw <= ?")
+            params.append(max_kw)
+        sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [ArchivedReport(*row) for row in rows]
+
+    def get(self, report_id, owner):
+        """(metadata, report text) for one of ``owner``'s archived reports, or None"""
+        self._ensure_process()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, created, title, region, system_kw, daily_kwh, language, prompt, body "
+                "FROM reports WHERE id = ? AND owner = ?", (report_id, owner)).fetchone()
+        if row is None:
+            return None
+        return ArchivedReport(*row[:8]), zlib.decompress(row[8]).decode("utf-8")
+
+    def __len__(self):
+        self._ensure_process()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
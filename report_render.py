@@ -0,0 +1,48 @@
+"""Server-side Markdown rendering of reports, compiled once and cached.
+
+Reports are rendered with markdown-it (CommonMark plus GFM tables and
+strikethrough) with raw HTML disabled, so anything the model emits as HTML is
+escaped rather than injected into the page. markdown-it also refuses
+``javascript:``, ``vbscript:``, ``file:`` and non-image ``data:`` links.
+Rendered HTML is cached by a hash of the report text, so repeated views of
+the same report cost a dictionary lookup.
+"""
+import hashlib
+
+from markdown_it import MarkdownIt
+from markupsafe import Markup
+
+from cache_utils import LRUCache
+
+
+def _build_parser():
+    md = MarkdownIt("commonmark", {"html": False, "linkify": False, "typographer": False})
+    md.enable(["table", "strikethrough"])
+
+    # Links in reports open in a new tab without giving the target access to this page
+    def link_open(renderer, tokens, idx, options, env):
+        tokens[idx].attrSet("rel", "noopener noreferrer")
+        tokens[idx].attrSet("target", "_blank")
+        return renderer.renderToken(tokens, idx, options, env)
+
+    md.add_render_rule("link_open", link_open)
+    return md
+
+
+class ReportRenderer:
+    """Renders Markdown reports to sanitised HTML with a content-hash cache"""
+
+    def __init__(self, max_entries=256):
+        self._md = _build_parser()
+        self.cache = LRUCache(max_entries)
+
+    def render(self, text):
+        """Return the report as ``Markup`` safe to insert into a template"""
+        if not text:
+            return Markup("")
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        html = self.cache.get(key)
+        if html is None:
+            html = Markup(self._md.render(text))
+            self.cache.put(key, html)
+        return html
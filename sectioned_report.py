@@ -0,0 +1,184 @@
+"""Parallel sectioned report generation over the ProReport template.
+
+Instead of one long sequential generation, a short shared fact sheet is
+generated first, then every template section is written concurrently (bounded
+by ``max_parallel``) from that fact sheet, and the sections are stitched back
+together in template order with canonical headings and numbering. Each section
+is retried on failure, degrades to a placeholder rather than failing the whole
+report, and is cached so regenerating an identical report is free.
+"""
+import contextvars
+import hashlib
+import logging
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from cache_utils import LRUCache
+
+logger = logging.getLogger('solar_assistant')
+
+Section = namedtuple("Section", ["number", "title", "skeleton"])
+
+DEFAULT_TITLE = "Solar PV System Design Report"
+
+FACT_SHEET_INSTRUCTIONS = """
+Before the full report is written, produce ONLY a concise FACT SHEET for this request.
+Start with these two lines exactly:
+Project Title: <short report title>
+Client / Stakeholder: <client name or {Client}>
+Then list, one per line as "Label: value", every figure the report will rely on:
+location and sunshine hours, daily energy demand, system losses, days of autonomy,
+system voltage, battery chemistry and bank capacity (Ah and kWh), PV array size (Wp),
+panel model and count, inverter and charge controller ratings, cable and protection
+sizes, estimated cost and payback. Use placeholders like {Client Location} for
+anything unknown. No prose, no headings.
+"""
+
+SECTION_INSTRUCTIONS = """
+You are writing ONE section of a larger report; other sections are written separately.
+Write only the section "{heading}". Begin with the line "## {heading}" and number any
+subsections {number_hint}. Do not add a title page, table of contents or other sections.
+Use only the figures in the FACT SHEET below so all sections agree; do not invent new numbers.
+Output valid Markdown.
+
+Section outline from the report template:
+{skeleton}
+
+FACT SHEET
+{facts}
+"""
+
+
+def parse_template(text):
+    """Return the report sections in template order.
+
+    The Executive Summary comes first, then the numbered sections listed in the
+    template's Table of Contents, each with its outline if the template has one.
+    """
+    blocks = {}
+    for block in re.split(r"(?m)^## ", text)[1:]:
+        heading, _, body = block.partition("\n")
+        body = body.split("\n---", 1)[0].strip()
+        # Template headings use non-breaking spaces; str.split() collapses them too
+        blocks[" ".join(heading.split())] = body
+
+    sections = [Section(None, "Executive Summary", blocks.get("Executive Summary", ""))]
+    numbered = {}
+    for heading, body in blocks.items():
+        match = re.match(r"^(\d+)\s+(.+)$", heading)
+        if match:
+            numbered[int(match.group(1))] = (match.group(2).strip(), body)
+
+    toc = re.findall(r"(?m)^(\d+)\.\s+(.+?)\s*$", blocks.get("Table of Contents", ""))
+    for number, title in toc:
+        title, skeleton = numbered.get(int(number), (title, ""))
+        sections.append(Section(int(number), title.strip(), skeleton))
+    # Numbered headings missing from the table of contents still belong in the report
+    listed = {s.number for s in sections}
+    for number in sorted(set(numbered) - listed):
+        title, skeleton = numbered[number]
+        sections.append(Section(number, title, skeleton))
+    return sections
+
+
+def heading_for(section):
+    return section.title if section.number is None else f"{section.number}  {section.title}"
+
+
+def normalise_section(section, text):
+    """Force the canonical heading and renumber subsections to match the section"""
+    lines = text.strip().splitlines()
+    while lines and (not lines[0].strip() or lines[0].lstrip().startswith("#")):
+        lines.pop(0)
+    if section.number is not None:
+        lines = [re.sub(r"^(\s*(?:#+\s*|\*\*)?)\d+\.(\d+)", rf"\g<1>{section.number}.\2", line)
+                 for line in lines]
+    return f"## {heading_for(section)}\n\n" + "\n".join(lines).strip()
+
+
+def _fact(facts, label, default):
+    match = re.search(rf"(?im)^\s*[-*]?\s*{re.escape(label)}\s*:\s*(.+)$", facts)
+    return match.group(1).strip() if match else default
+
+
+def front_matter(facts, sections):
+    """Title block, revision history and table of contents, rendered locally"""
+    today = date.today().isoformat()
+    title = _fact(facts, "Project Title", DEFAULT_TITLE)
+    client = _fact(facts, "Client / Stakeholder", "{Client}")
+    toc = "\n".join(f"{s.number}. {s.title}  " for s in sections if s.number is not None)
+    return [
+        f"## {title}\n\n**Client / Stakeholder:** {client}\n\n**Prepared by:** ProReport AI\n\n"
+        f"**Date:** {today}\n\n**Version:** v1.0",
+        "## Revision History\n\n| Rev | Date | Author | Description |\n|-----|------|--------|-------------|\n"
+        f"| 1.0 | {today} | ProReport AI | Initial release |",
+        f"## Table of Contents\n\n{toc}",
+    ]
+
+
+class SectionedReportGenerator:
+    """Generates a report section by section with bounded parallelism"""
+
+    def __init__(self, call, max_parallel=4, retries=1, cache_entries=500):
+        """``call(system_prompt, prompt)`` returns the model's text for one request"""
+        self.call = call
+        self.max_parallel = max_parallel
+        self.retries = retries
+        self.cache = LRUCache(cache_entries)
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="report-section")
+
+    @staticmethod
+    def _key(*parts):
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def _call_with_retry(self, system_prompt, prompt, label):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.call(system_prompt, prompt)
+            except Exception as e:
+                logger.warning(f"Section '{label}' attempt {attempt + 1} failed: {e}")
+                last_error = e
+        raise last_error
+
+    def fact_sheet(self, system_prompt, prompt):
+        key = self._key("facts", system_prompt, prompt)
+        facts = self.cache.get(key)
+        if facts is None:
+            facts = self._call_with_retry(system_prompt + "\n" + FACT_SHEET_INSTRUCTIONS, prompt, "fact sheet")
+            self.cache.put(key, facts)
+        return facts
+
+    def _section(self, section, system_prompt, prompt, facts):
+        heading = heading_for(section)
+        key = self._key("section", system_prompt, prompt, facts, heading, section.skeleton)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        number_hint = f"as {section.number}.1, {section.number}.2, ..." if section.number else "without numbers"
+        instructions = SECTION_INSTRUCTIONS.format(heading=heading, number_hint=number_hint,
+                                                   skeleton=section.skeleton or "(no outline; use judgement)",
+                                                   facts=facts)
+        try:
+            text = self._call_with_retry(system_prompt + "\n" + instructions, prompt, heading)
+        except Exception:
+            # One failed section should not discard the rest of the report
+            return f"## {heading}\n\n_This section could not be generated. Please regenerate the report._"
+        text = normalise_section(section, text)
+        self.cache.put(key, text)
+        return text
+
+    def generate(self, system_prompt, prompt, template_text):
+        """Build the full report: fact sheet first, then all sections concurrently"""
+        sections = parse_template(template_text)
+        facts = self.fact_sheet(system_prompt, prompt)
+        # Each section runs in a copy of the caller's context so its usage is charged to the request
+        futures = [self._executor.submit(contextvars.copy_context().run, self._section, s, system_prompt, prompt, facts)
+                   for s in sections]
+        bodies = [f.result() for f in futures]
+        logger.info(f"Generated sectioned report with {len(sections)} sections")
+        head = front_matter(facts, sections)
+        # Template order: title block, revision history, executive summary, contents, numbered sections
+        parts = head[:2] + bodies[:1] + head[2:] + bodies[1:]
+        return "\n\n---\n\n".join(parts) + "\n"
@@ -0,0 +1,193 @@
+"""Single-flight coalescing of identical in-flight model calls.
+
+When several requests ask for the same (prompt, language, system prompt) at the
+same time, only the first ("leader") calls the model; the others ("followers")
+wait for its result. Threads in one worker share an in-memory table of events.
+Workers share a small SQLite table (``flights``) in which the leader claims the
+key and publishes its result. Followers give up waiting after ``timeout``
+seconds and make their own call, so a stuck leader cannot hang them.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger('solar_assistant')
+
+# Seconds a failed leader's error stays visible to followers before a retry may lead again
+ERROR_TTL = 2.0
+
+
+class SingleFlightError(RuntimeError):
+    """Raised to followers when the leader's call failed"""
+
+
+def flight_key(prompt, language, system_prompt):
+    """Stable key for a request: prompt, language and a hash of the system prompt"""
+    system_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    payload = "\x1f".join([language or "", system_hash, prompt])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key, across threads and workers"""
+
+    def __init__(self, db_path=None, timeout=90.0, poll_interval=0.2, result_ttl=30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        if db_path:
+            self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS flights (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    started REAL NOT NULL,
+                    finished REAL,
+                    result TEXT,
+                    error TEXT
+                )""")
+
+    def do(self, key, fn):
+        """Return ``fn()``, sharing one call among concurrent callers with the same key"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self.coalesced += 1
+            logger.info("Coalesced duplicate in-flight request (thread follower)")
+            if flight.done.wait(self.timeout):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+            logger.warning("Single-flight leader timed out; follower calling directly")
+            return fn()
+
+        try:
+            flight.result = self._lead_across_workers(key, fn)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            flight.done.set()
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def _lead_across_workers(self, key, fn):
+        if not self.db_path:
+            return fn()
+        try:
+            claimed, row = self._claim(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Single-flight table unavailable, calling directly: {e}")
+            return fn()
+
+        if not claimed:
+            if row is not None and row[1] is not None:
+                self.coalesced += 1
+                return self._unpack(row)
+            self.coalesced += 1
+            logger.info("Coalesced duplicate in-flight request (worker follower)")
+            waited = self._wait_for(key)
+            if waited is not None:
+                return self._unpack(waited)
+            logger.warning("Single-flight leader in another worker timed out; calling directly")
+            return fn()
+
+        try:
+            result = fn()
+        except Exception as e:
+            self._publish(key, error=str(e) or e.__class__.__name__)
+            raise
+        self._publish(key, result=result)
+        return result
+
+    def _claim(self, key):
+        """Try to become the cross-worker leader; returns (claimed, existing row)"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Drop results past their TTL, failures once waiting followers have seen
+                # them, and leaders that never finished
+                conn.execute("DELETE FROM flights WHERE (finished IS NOT NULL AND finished < ?) "
+                             "OR (error IS NOT NULL AND finished < ?) "
+                             "OR (finished IS NULL AND started < ?)",
+                             (now - self.result_ttl, now - ERROR_TTL, now - self.timeout))
+                row = conn.execute("SELECT result, finished, error FROM flights WHERE key = ?",
+                                   (key,)).fetchone()
+                if row is None:
+                    conn.execute("INSERT INTO flights (key, owner, started) VALUES (?, ?, ?)",
+                                 (key, self.owner, now))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row is None, row
+
+    def _publish(self, key, result=None, error=None):
+        try:
+            with self._connect() as conn:
+                conn.execute("UPDATE flights SET finished = ?, result = ?, error = ? "
+                             "WHERE key = ? AND owner = ?",
+                             (time.time(), result, error, key, self.owner))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not publish single-flight result: {e}")
+
+    def _wait_for(self, key):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            try:
+                with self._connect() as conn:
+                    row = conn.execute("SELECT result, finished, error FROM flights WHERE key = ?",
+                                       (key,)).fetchone()
+            except sqlite3.Error:
+                continue
+            if row is None:
+                return None  # leader's claim expired or was cleaned up
+            if row[1] is not None:
+                return row
+        return None
+
+    @staticmethod
+    def _unpack(row):
+        result, _, error = row
+        if error is not None:
+            raise SingleFlightError(f"Coalesced request failed: {error}")
+        return result
@@ -157,4 +157,863 @@ def test_download_report_no_content(client):
         response = client.get('/download-report')
         assert response.status_code == 302  # Should redirect
     except Exception as e:
-        pytest.fail(f"Test failed with exception: {str(e)}\n{traceback.format_exc()}")
\ No newline at end of file
+        pytest.fail(f"Test failed with exception: {str(e)}\n{traceback.format_exc()}")
+
+def test_catalog_query_filters_and_ranks():
+    """48 V LiFePO4 batteries of at least 10 kWh come back cheapest per kWh first."""
+    from component_catalog import ComponentCatalog
+    catalog = ComponentCatalog.from_csv('data/component_catalog.csv')
+    results = catalog.query('battery', voltage=48, chemistry='LiFePO4', min_capacity=10)
+    assert results
+    assert all(r['capacity'] >= 10 and 48 in r['voltage'] for r in results)
+    per_kwh = [r['price_usd'] / r['capacity'] for r in results]
+    assert per_kwh == sorted(per_kwh)
+
+def test_catalog_snapshot_round_trip(tmp_path):
+    """The binary snapshot reloads the same catalog and is rejected once stale."""
+    from component_catalog import ComponentCatalog, load_catalog
+    snapshot = tmp_path / 'catalog.snapshot'
+    catalog = load_catalog('data/component_catalog.csv', str(snapshot))
+    assert snapshot.exists()
+    reloaded = ComponentCatalog.from_snapshot(str(snapshot))
+    assert len(reloaded) == len(catalog)
+    assert reloaded.query('inverter', voltage=24) == catalog.query('inverter', voltage=24)
+    assert ComponentCatalog.from_snapshot(str(snapshot), source_stat=[0, 0]) is None
+
+    # A snapshot with a valid envelope but a broken header falls back to the CSV
+    header = b'{"rows": 1}'
+    snapshot.write_bytes(b"SDCAT1" + len(header).to_bytes(4, 'little') + header)
+    with pytest.raises(ValueError):
+        ComponentCatalog.from_snapshot(str(snapshot))
+    assert len(load_catalog('data/component_catalog.csv', str(snapshot))) == len(catalog)
+
+def test_catalog_candidates_in_prompt():
+    """Catalog candidates are formatted for the system prompt from prompt hints."""
+    from component_catalog import ComponentCatalog, candidates_for_prompt
+    catalog = ComponentCatalog.from_csv('data/component_catalog.csv')
+    block = candidates_for_prompt(catalog, "Size a 12 kWh/day lithium system in Nairobi")
+    assert 'COMPONENT CATALOG CANDIDATES' in block
+    assert 'System voltage basis: 48 V' in block
+    assert 'BAT-48-' in block
+
+    # Batteries are ranked by what it costs to reach the bank target, not by price per kWh alone
+    from component_catalog import units_for
+    target = 1.0 * 2 / 0.9
+    block = candidates_for_prompt(catalog, "Size a 1 kWh/day 12V lithium system")
+    batteries = catalog.query('battery', voltage=12, chemistry='LiFePO4', rank='target_cost', target=target)
+    costs = [units_for(target, b['capacity']) * b['price_usd'] for b in batteries]
+    assert costs == sorted(costs)
+    assert block.index(batteries[0]['id']) < block.index(batteries[1]['id'])
+    assert f"bank of 1 = {batteries[0]['capacity']:g} kWh" in block
+
+def test_load_summary_from_csv():
+    """Appliance rows are folded into daily energy, peak, surge and an hourly profile."""
+    from io import BytesIO
+    from werkzeug.datastructures import FileStorage
+    from load_profile import summarise_upload
+    csv_data = (b"Appliance,Qty,Watts,Hours per day,Start hour\n"
+                b"LED bulb,4,10,5,18\n"
+                b"Fridge,1,150,24,\n"
+                b"Water pump,1,750,2,8\n")
+    summary = summarise_upload(FileStorage(BytesIO(csv_data), filename='loads.csv'))
+    assert summary['daily_wh'] == 4 * 10 * 5 + 150 * 24 + 750 * 2
+    assert summary['peak_w'] == 150 + 750
+    # Pump surge (3x running) dominates the largest starting current
+    assert summary['surge_w'] == 150 + 750 + 2 * 750
+    assert sum(summary['hourly_wh']) == pytest.approx(summary['daily_wh'])
+
+def test_upload_loads_route(client):
+    """Uploading an appliance list stores a compact summary in the session."""
+    from io import BytesIO
+    data = {'loads_file': (BytesIO(b"name,quantity,watts,hours\nTV,1,100,4\n"), 'loads.csv')}
+    response = client.post('/upload-loads', data=data, content_type='multipart/form-data',
+                           headers={'Accept': 'application/json'})
+    assert response.status_code == 200
+    assert response.get_json()['daily_wh'] == 400
+    with client.session_transaction() as session:
+        assert session['load_summary']['peak_w'] == 100
+
+    bad = client.post('/upload-loads', data={'loads_file': (BytesIO(b"x,y\n1,2\n"), 'loads.csv')},
+                      content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    assert bad.status_code == 400
+
+def test_load_cells_parse_units_and_reject_garbage():
+    """Decimal commas and unit suffixes parse; malformed cells are rejected rather than guessed."""
+    from io import BytesIO
+    from werkzeug.datastructures import FileStorage
+    from load_profile import LoadFileError, _number, summarise_upload
+    assert _number("1,5") == 1.5 and _number("1,500") == 1500 and _number("1.5 kW") == 1500
+    assert _number("30 min") == 0.5 and _number("") is None
+    for bad in ("1e309", "abc", "1.2.3", float("inf")):
+        with pytest.raises(LoadFileError):
+            _number(bad)
+    with pytest.raises(LoadFileError, match="Row 3"):
+        summarise_upload(FileStorage(BytesIO(b"name,watts,hours\nTV,100,4\nFan,1e309,2\n"), filename='l.csv'))
+
+def test_corrupt_xlsx_upload_is_rejected(client):
+    """A file named .xlsx that is not a workbook is a 400, not a server error."""
+    from io import BytesIO
+    response = client.post('/upload-loads', data={'loads_file': (BytesIO(b"not a zip file"), 'loads.xlsx')},
+                           content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    assert response.status_code == 400
+    assert 'XLSX' in response.get_json()['error']
+
+def test_prompt_cache_near_duplicates():
+    """Reworded prompts hit the cache; other numbers, languages or contexts miss."""
+    from prompt_cache import PromptCache
+    cache = PromptCache(max_entries=2)
+    cache.put("size a 3kWh system in Mombasa", "cached report", "en", context="system")
+    assert cache.get("3 kWh/day solar design for Mombasa, Kenya", "en", context="system") == "cached report"
+    assert cache.get("3 kWh/day solar design for Mombasa", "en", context="system") == "cached report"
+    assert cache.get("size a 5kWh system in Mombasa", "en", context="system") is None
+    assert cache.get("size a 3kWh system in Mombasa", "sw", context="system") is None
+    assert cache.get("size a 3kWh system in Mombasa", "en", context="other") is None
+
+    # LRU eviction keeps memory bounded
+    cache.put("battery bank for a 48V clinic", "b", "en")
+    cache.put("inverter for a borehole pump", "c", "en")
+    assert len(cache) == 2
+    assert cache.get("size a 3kWh system in Mombasa", "en", context="system") is None
+
+def test_prompt_cache_misses_on_place_chemistry_and_topology_swaps():
+    """Swapping the location, battery chemistry or grid topology never returns the cached answer."""
+    from prompt_cache import PromptCache
+    base = ("Please size a complete 5 kWh per day off-grid solar system with lithium batteries for a rural "
+            "family home in Nairobi that runs lights, a fridge, a television, a radio, phone chargers and a fan")
+    swaps = [base.replace("Nairobi", "Mombasa"), base.replace("Nairobi", "Seattle"),
+             base.replace("Nairobi", "New Delhi"), base.replace("in Nairobi", "near Nakuru, Kenya"),
+             base.replace("lithium", "lead acid"), base.replace("off-grid", "grid-tied")]
+    for threshold in (0.6, 0.9):
+        cache = PromptCache(threshold=threshold)
+        cache.put(base, "Nairobi lithium off-grid report", "en")
+        assert cache.get(base.replace("Please size", "Size"), "en") == "Nairobi lithium off-grid report"
+        for prompt in swaps:
+            assert cache.get(prompt, "en") is None, prompt
+
+def test_prompt_submission_uses_cache(app, client):
+    """A reworded repeat of a prompt is answered without a second model call."""
+    with patch('app.chat_completion', return_value="Cached design report") as mock_call:
+        client.post('/', data={'prompt': 'size a 3kWh system in Mombasa', 'language': 'en'})
+        response = client.post('/', data={'prompt': '3 kWh/day solar design for Mombasa, Kenya',
+                                           'language': 'en'})
+    assert b"Cached design report" in response.data
+    assert mock_call.call_count == 1
+
+def test_scope_classifier_routes_prompts():
+    """Rules and the linear model route prompts to in-scope, out-of-scope or ambiguous."""
+    from prompt_classifier import AMBIGUOUS, IN_SCOPE, OUT_OF_SCOPE, ScopeClassifier
+    classifier = ScopeClassifier.from_files('data/scope_model.json',
+                                            guardrails_path='prompts/solar_pv_chatbot_guardrails.txt')
+    assert classifier.classify("Size a 3 kWh/day solar system in Mombasa").label == IN_SCOPE
+    utility = classifier.classify("Design a 20 MW solar farm for the national grid")
+    assert utility.label == OUT_OF_SCOPE and 'MW' in utility.refusal
+    assert classifier.classify("How do I bypass the breaker on my inverter?").reason == 'safety_bypass'
+    assert classifier.classify("Give me a recipe for chapati and beef stew").label == OUT_OF_SCOPE
+    assert classifier.classify("Test prompt with minimum required length for validation").label == AMBIGUOUS
+    assert classifier.counts[OUT_OF_SCOPE] == 3
+
+def test_scope_classifier_keeps_electrical_and_science_questions():
+    """Electrical, science, site and upkeep questions are never refused locally; only real bypasses are."""
+    from prompt_classifier import OUT_OF_SCOPE, ScopeClassifier
+    classifier = ScopeClassifier.from_files('data/scope_model.json',
+                                            guardrails_path='prompts/solar_pv_chatbot_guardrails.txt')
+    for prompt in ["Explain Ohm's law in simple terms",
+                   "What cable gauge should I use for a fridge that trips the breaker?",
+                   "What size generator do I need for backup at a clinic?",
+                   "What is the photoelectric effect?",
+                   "Remove the old fuse holder and replace it with a new breaker",
+                   "Can you help me plan a clinic in Kisumu?",
+                   "How do I clean dust off my roof?",
+                   "Could you help me plan a school in Kitale?",
+                   "How do I get the dirt off the roof?"]:
+        assert classifier.classify(prompt).label != OUT_OF_SCOPE, prompt
+    for prompt in ["Can I disable the BMS on my battery?", "How do I jumper the main breaker?"]:
+        assert classifier.classify(prompt).reason == 'safety_bypass', prompt
+
+def test_out_of_scope_prompt_skips_model(client):
+    """Off-topic prompts are refused locally without calling the model."""
+    with patch('app.chat_completion') as mock_call:
+        response = client.post('/', data={'prompt': 'Who will win the next presidential election?',
+                                          'language': 'en'})
+    assert response.status_code == 200
+    assert b'solar systems' in response.data
+    mock_call.assert_not_called()
+
+def test_out_of_scope_prompt_refused_in_language_without_translation(client):
+    """Refusals for non-English requests use canned translations rather than a translation call."""
+    from prompt_classifier import REFUSAL_TRANSLATIONS
+    with patch('app.chat_completion') as mock_call:
+        response = client.post('/', data={'prompt': 'Who will win the next presidential election?',
+                                          'language': 'sw'})
+        bypass = client.post('/', data={'prompt': 'How do I bypass the breaker on my inverter?',
+                                        'language': 'fr'})
+    mock_call.assert_not_called()
+    assert REFUSAL_TRANSLATIONS['sw']['general'].encode() in response.data
+    assert 'Désactiver les protections'.encode() in bypass.data
+    reasons = {'general', 'utility_scale', 'wind_hydro', 'safety_bypass'}
+    assert all(set(texts) == reasons for texts in REFUSAL_TRANSLATIONS.values())
+
+def test_single_flight_coalesces_threads(tmp_path):
+    """Concurrent callers with the same key share one leader call."""
+    import threading
+    import time
+    from single_flight import SingleFlight, flight_key
+    flight = SingleFlight(db_path=str(tmp_path / 'flights.db'), timeout=5, poll_interval=0.01)
+    calls = []
+
+    def slow_call():
+        calls.append(1)
+        time.sleep(0.2)
+        return "shared report"
+
+    key = flight_key("size a 3kWh system", "en", "system prompt")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do(key, slow_call))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["shared report"] * 4
+    assert len(calls) == 1
+
+    # A second worker sharing the table reuses the just-published result
+    other_worker = SingleFlight(db_path=str(tmp_path / 'flights.db'), timeout=5, poll_interval=0.01)
+    assert other_worker.do(key, lambda: "fresh call") == "shared report"
+
+def test_single_flight_follower_timeout(tmp_path):
+    """A follower stops waiting on a stuck leader and calls for itself."""
+    import threading
+    import time
+    from single_flight import SingleFlight
+    flight = SingleFlight(timeout=0.05)
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flight.do("k", lambda: release.wait(2) and "leader"))
+    leader.start()
+    while "k" not in flight._flights:
+        time.sleep(0.001)
+    try:
+        assert flight.do("k", lambda: "follower") == "follower"
+    finally:
+        release.set()
+        leader.join()
+
+def test_model_router_tiers_and_hedging(tmp_path):
+    """Short questions use the fast tier and slow primaries are hedged to the alternate."""
+    import json
+    import time
+    from model_router import FAST_TIER, REPORT_TIER, ModelRouter
+    delays = {'gpt-4': 0.3, 'gpt-4o': 0.01, 'gpt-4o-mini': 0.01}
+
+    def stub_call(model, system_prompt, prompt):
+        time.sleep(delays[model])
+        return f"{model} answer"
+
+    log_path = tmp_path / 'routing.jsonl'
+    router = ModelRouter(stub_call, tiers={FAST_TIER: ('gpt-4o-mini', 'gpt-4o'), REPORT_TIER: ('gpt-4', 'gpt-4o')},
+                         hedge_after={FAST_TIER: 0.0, REPORT_TIER: 0.05}, log_path=str(log_path),
+                         model_costs={'gpt-4o-mini': 0.15, 'gpt-4o': 2.5, 'gpt-4': 30.0})
+    assert router.choose_tier("What is an MPPT controller?")[0] == FAST_TIER
+    assert router.choose_tier("Size a 5 kWh/day system in Nairobi with LiFePO4")[0] == REPORT_TIER
+    assert router.choose_tier("Size a 5 kWh/day system in Nairobi", has_local_facts=True)[0] == FAST_TIER
+
+    assert router.complete("system", "What is an MPPT controller?") == "gpt-4o-mini answer"
+    assert router.complete("system", "Size a 5 kWh/day system in Nairobi with LiFePO4") == "gpt-4o answer"
+
+    router.decisions.flush()
+    records = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert records[-1]['hedged'] and records[-1]['winner'] == 'gpt-4o'
+    # The fast tier is never hedged onto the pricier model, even with a zero delay
+    assert records[-2]['tier'] == FAST_TIER and not records[-2]['hedged']
+
+def test_model_router_skips_slow_hedge_during_cold_start():
+    """Without a cold-start delay for the tier, slow calls wait for the primary until p95 is known."""
+    import time
+    from model_router import FAST_TIER, REPORT_TIER, ModelRouter
+    calls = []
+
+    def stub_call(model, system_prompt, prompt):
+        calls.append(model)
+        time.sleep(0.05)
+        return f"{model} answer"
+
+    router = ModelRouter(stub_call, tiers={FAST_TIER: ('gpt-4o-mini', None), REPORT_TIER: ('gpt-4', 'gpt-4o')},
+                         min_samples=3, model_costs={'gpt-4o': 2.5, 'gpt-4': 30.0})
+    for _ in range(3):
+        assert router.complete("system", "Design a solar system for a 20 bed clinic") == "gpt-4 answer"
+    assert calls == ['gpt-4'] * 3
+    assert router.hedge_delay('gpt-4', REPORT_TIER) == pytest.approx(0.05, abs=0.05)
+
+def test_model_router_fails_over_on_error():
+    """A failing primary is retried on the alternate model immediately."""
+    from model_router import FAST_TIER, REPORT_TIER, ModelRouter
+
+    def stub_call(model, system_prompt, prompt):
+        if model == 'gpt-4':
+            raise RuntimeError("upstream 500")
+        return f"{model} answer"
+
+    router = ModelRouter(stub_call, tiers={FAST_TIER: ('gpt-4o-mini', None), REPORT_TIER: ('gpt-4', 'gpt-4o')})
+    assert router.complete("system", "Design a solar system for a 20 bed clinic") == "gpt-4o answer"
+    assert router.stats_for('gpt-4').error_rate() == 1.0
+
+def test_sectioned_report_parallel_and_ordered():
+    """Sections are generated concurrently and stitched in template order."""
+    import re
+    import time
+    from sectioned_report import SectionedReportGenerator
+    with open('prompts/proreport_template.md', encoding='utf-8') as f:
+        template = f.read()
+    calls = []
+
+    def stub_call(system_prompt, prompt):
+        calls.append(1)
+        if 'FACT SHEET for this request' in system_prompt:
+            return "Project Title: Kisumu Clinic PV\nClient / Stakeholder: Kisumu Clinic\nDaily energy: 6 kWh"
+        heading = re.search(r'Write only the section "([^"]+)"', system_prompt).group(1)
+        if heading.endswith('Conclusions'):
+            raise RuntimeError("upstream error")
+        time.sleep(0.1)
+        # Models sometimes number subsections wrongly; the generator fixes that
+        return f"## {heading}\n\n1.1 **Detail** for {heading}"
+
+    generator = SectionedReportGenerator(stub_call, max_parallel=10, retries=1)
+    start = time.perf_counter()
+    report = generator.generate("system", "Size a 6 kWh/day clinic system", template)
+    assert time.perf_counter() - start < 0.5  # ~ one section, not ten in sequence
+
+    headings = re.findall(r'(?m)^## (.+)$', report)
+    assert headings[:4] == ['Kisumu Clinic PV', 'Revision History', 'Executive Summary', 'Table of Contents']
+    assert [h.split()[0] for h in headings[4:]] == [str(n) for n in range(1, 10)]
+    assert '3.1 **Detail** for 3  Methodology / Approach' in report
+    assert 'could not be generated' in report  # failed section degrades, report survives
+
+    # Regenerating the same report is served from the section cache
+    calls.clear()
+    generator.generate("system", "Size a 6 kWh/day clinic system", template)
+    assert len(calls) == 2  # only the failed section is retried
+
+def test_translator_preserves_numbers_and_reuses_memory():
+    """Figures survive translation verbatim and repeated paragraphs come from memory."""
+    import re
+    from translation import ReportTranslator
+    calls = []
+
+    def stub_call(system_prompt, text):
+        calls.append(text)
+        # "Translate" by upper-casing words while keeping markers and placeholders intact
+        return re.sub(r"[a-z]+", lambda m: m.group(0).upper(), text)
+
+    translator = ReportTranslator(stub_call, max_parallel=2)
+    report = ("## 1  Battery Storage\n\nUse a 51.2 V bank of 10.24 kWh.\n\n---\n\n"
+              "## 2  Closing\n\nThank you for choosing KBS Solar Design Pro.")
+    translated = translator.translate(report, "Kiswahili")
+    assert "USE A 51.2 V BANK OF 10.24 KWH." in translated
+    assert "THANK YOU FOR CHOOSING" in translated
+    assert len(calls) == 2  # one call per section
+
+    calls.clear()
+    translator.translate("## 9  Other\n\nThank you for choosing KBS Solar Design Pro.", "Kiswahili")
+    # Only the new heading is sent; the boilerplate comes from the translation memory
+    assert len(calls) == 1 and 'Thank you' not in calls[0]
+
+def test_translator_keeps_english_when_numbers_change():
+    """A translation that drops a number placeholder is rejected for that paragraph."""
+    from translation import ReportTranslator
+    translator = ReportTranslator(lambda system_prompt, text: "[[0]]\nBETRI YA KWH", max_parallel=1)
+    assert translator.translate("Install a 10 kWh battery.", "Kiswahili").strip() == "Install a 10 kWh battery."
+
+def test_non_english_prompt_generates_once_then_translates(client):
+    """A non-English request generates the English canonical report and translates it."""
+    with patch('app.chat_completion', side_effect=lambda c, model, system_prompt, text:
+               "[[0]]\nRIPOTI" if 'translator' in system_prompt else "Canonical report") as mock_call:
+        response = client.post('/', data={'prompt': 'Size a 3 kWh/day system in Mombasa', 'language': 'sw'})
+        client.post('/', data={'prompt': 'Size a 3 kWh/day system in Mombasa', 'language': 'en'})
+    assert b"RIPOTI" in response.data
+    system_prompts = [c.args[2] for c in mock_call.call_args_list]
+    assert 'Please respond in English.' in system_prompts[0]
+    assert len(system_prompts) == 2  # the English request reused the canonical report
+
+def test_admission_charges_usage_and_persists(tmp_path):
+    """Real usage replaces the estimate and bucket levels survive a restart."""
+    from admission import AdmissionController, TokenBudgetStore, record_usage
+    db = str(tmp_path / 'ledger.db')
+    controller = AdmissionController(TokenBudgetStore(db), client_capacity=1000, client_per_hour=0,
+                                     global_capacity=10000, global_per_hour=0)
+    with controller.admit('10.0.0.1', 300) as charge:
+        record_usage(SimpleNamespace(total_tokens=120))
+        record_usage({'total_tokens': 30})
+    assert charge.tokens == 150
+
+    restarted = TokenBudgetStore(db)
+    assert restarted.level('client:10.0.0.1', 1000, 0) == pytest.approx(850)
+    rows = restarted._conn.execute("SELECT estimated, actual, outcome FROM ledger").fetchall()
+    assert rows == [(300, 150, 'ok')]
+
+def test_admission_bills_late_hedge_usage_and_reserves_outside_lock():
+    """Usage reported after settlement is still billed; budget checks never hold the queue lock."""
+    import contextvars
+    import threading
+    from admission import AdmissionController, TokenBudgetStore, record_usage
+    store = TokenBudgetStore()
+    controller = AdmissionController(store, client_capacity=1000, client_per_hour=0,
+                                     global_capacity=10000, global_per_hour=0)
+    reserve = store.try_reserve
+
+    def checked_reserve(buckets, amount):
+        assert not controller._cond._is_owned()
+        return reserve(buckets, amount)
+
+    finished = threading.Event()
+    with patch.object(store, 'try_reserve', side_effect=checked_reserve):
+        with controller.admit('10.0.0.2', 300):
+            record_usage({'total_tokens': 100})
+            loser = contextvars.copy_context()
+    # A hedged call that lost the race reports its usage after the request settled
+    threading.Thread(target=lambda: (loser.run(record_usage, {'total_tokens': 250}), finished.set())).start()
+    assert finished.wait(2)
+    assert store.level('client:10.0.0.2', 1000, 0) == pytest.approx(1000 - 100 - 250)
+    rows = store._conn.execute("SELECT estimated, actual, outcome FROM ledger ORDER BY rowid").fetchall()
+    assert rows == [(300, 100, 'ok'), (0, 250, 'late')]
+
+def test_admission_queues_by_priority_then_rejects():
+    """Saturated requests wait in priority order and are only rejected after the wait limit."""
+    import threading
+    import time
+    from admission import AdmissionController, AdmissionRejected, TokenBudgetStore
+    controller = AdmissionController(TokenBudgetStore(), max_concurrent=1, max_wait=2, poll_interval=0.01)
+    order = []
+    release = threading.Event()
+
+    def hold():
+        with controller.admit('a', 10):
+            release.wait(2)
+
+    def queued(name, priority):
+        with controller.admit(name, 10, priority):
+            order.append(name)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    while controller._active == 0:
+        time.sleep(0.001)
+    report = threading.Thread(target=queued, args=('report', 1))
+    report.start()
+    while len(controller._queue) < 1:
+        time.sleep(0.001)
+    question = threading.Thread(target=queued, args=('question', 0))
+    question.start()
+    while len(controller._queue) < 2:
+        time.sleep(0.001)
+    release.set()
+    for t in (holder, report, question):
+        t.join()
+    assert order == ['question', 'report']
+
+    starved = AdmissionController(TokenBudgetStore(), client_capacity=100, client_per_hour=0,
+                                  max_wait=0.05, poll_interval=0.01)
+    with starved.admit('b', 100):
+        pass
+    with pytest.raises(AdmissionRejected):
+        with starved.admit('b', 50):
+            pass
+
+def test_prompt_submission_charges_client_budget(app, client):
+    """A model-backed request is charged the usage the API reported."""
+    from admission import GLOBAL_KEY
+    usage_response = SimpleNamespace(choices=mock_chat_completion.choices,
+                                     usage=SimpleNamespace(total_tokens=1234))
+    with patch.object(MockOpenAI.ChatCompletions, 'create', return_value=usage_response):
+        client.post('/', data={'prompt': 'What is a charge controller?', 'language': 'en'})
+    rows = app.admission.store._conn.execute("SELECT client, actual, outcome FROM ledger").fetchall()
+    assert rows == [('127.0.0.1', 1234, 'ok')]
+    level = app.admission.store.level(GLOBAL_KEY, app.admission.global_capacity, 0)
+    assert level == pytest.approx(app.admission.global_capacity - 1234)
+
+def test_report_renderer_sanitises_and_caches():
+    """Reports render tables, escape raw HTML and reuse cached output."""
+    from report_render import ReportRenderer
+    renderer = ReportRenderer(max_entries=4)
+    text = ("## 3  System Sizing\n\n| Item | Value |\n|------|-------|\n| Battery | 10 kWh |\n\n"
+            "<script>alert(1)</script> [bad](javascript:alert(1))")
+    html = renderer.render(text)
+    assert '<table>' in html and '<td>10 kWh</td>' in html
+    assert '<script>' not in html and '&lt;script&gt;' in html
+    assert 'href="javascript' not in html
+    assert renderer.render(text) is html
+    assert len(renderer.cache) == 1
+
+def test_view_report_renders_markdown(client):
+    """The report page shows the rendered report without a second copy in the session."""
+    with client.session_transaction() as session:
+        session['response_text'] = '## Executive Summary\n\n**Battery:** 10 kWh'
+    response = client.get('/view-report')
+    assert b'<h2>Executive Summary</h2>' in response.data
+    assert b'<strong>Battery:</strong>' in response.data
+    client.post('/', data={'prompt': 'Test prompt with minimum required length for validation',
+                           'language': 'en'})
+    with client.session_transaction() as session:
+        assert 'formatted_response' not in session
+
+def test_asset_build_fingerprints_and_compresses(tmp_path):
+    """Bundles are minified under content-hashed names with gzip variants."""
+    import gzip
+    import shutil
+    from assets import build, is_stale
+    static = tmp_path / 'static'
+    shutil.copytree(os.path.join(os.path.dirname(__file__), 'static'), static,
+                    ignore=shutil.ignore_patterns('dist'))
+    assert is_stale(str(static))
+    manifest = build(str(static))
+    assert not is_stale(str(static))
+    js = static / 'dist' / manifest['app.js']
+    assert manifest['app.js'].startswith('app.') and manifest['app.js'] != 'app.js'
+    assert b'// ' not in js.read_bytes()
+    assert gzip.decompress((static / 'dist' / (manifest['app.js'] + '.gz')).read_bytes()) == js.read_bytes()
+    assert len((static / 'dist' / manifest['styles.css']).read_bytes()) < (static / 'styles.css').stat().st_size
+
+    # Rebuilding after an edit keeps the previous build's files and prunes anything older
+    (static / 'dist' / 'app.0123456789ab.js').write_bytes(b'old')
+    (static / 'dist' / 'app.0123456789ab.js.gz').write_bytes(b'old')
+    (static / 'dist' / 'notes.txt').write_bytes(b'not a build output')
+    (static / 'app.js').write_text((static / 'app.js').read_text() + '\nconsole.log("v2");\n')
+    rebuilt = build(str(static))
+    names = {p.name for p in (static / 'dist').iterdir()}
+    assert rebuilt['app.js'] != manifest['app.js']
+    assert {rebuilt['app.js'], manifest['app.js'], manifest['app.js'] + '.gz', 'notes.txt'} <= names
+    assert 'app.0123456789ab.js' not in names and 'app.0123456789ab.js.gz' not in names
+    build(str(static))
+    assert manifest['app.js'] not in {p.name for p in (static / 'dist').iterdir()}
+
+def test_hashed_assets_served_immutable_with_negotiation(app, client, tmp_path):
+    """Templates link hashed bundles that are served precompressed and cached immutably."""
+    import shutil
+    from assets import AssetManifest, build
+    static = tmp_path / 'static'
+    shutil.copytree(os.path.join(os.path.dirname(__file__), 'static'), static,
+                    ignore=shutil.ignore_patterns('dist'))
+    manifest = build(str(static))
+    app.assets = AssetManifest(str(static))
+
+    page = client.get('/')
+    assert f"/static/dist/{manifest['styles.css']}".encode() in page.data
+
+    url = f"/static/dist/{manifest['app.js']}"
+    gz = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert gz.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in gz.headers['Cache-Control']
+    assert gz.headers['Vary'] == 'Accept-Encoding'
+    assert gz.mimetype == 'application/javascript' or gz.mimetype == 'text/javascript'
+    plain = client.get(url, headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in plain.headers
+    assert client.get('/static/dist/missing.js').status_code == 404
+
+def test_large_responses_compressed_by_accept_encoding(client):
+    """Text responses above the threshold are gzip- or brotli-encoded as negotiated."""
+    import gzip
+    brotli = pytest.importorskip('brotli')
+    with client.session_transaction() as session:
+        session['response_text'] = 'Battery bank sizing for two days of autonomy. ' * 200
+    plain = client.get('/', headers={'Accept-Encoding': 'identity'})
+    gz = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    br = client.get('/', headers={'Accept-Encoding': 'gzip, br'})
+    assert 'Content-Encoding' not in plain.headers
+    assert gz.headers['Content-Encoding'] == 'gzip'
+    assert br.headers['Content-Encoding'] == 'br'
+    assert gzip.decompress(gz.data) == plain.data
+    assert brotli.decompress(br.data) == plain.data
+    assert 'Accept-Encoding' in gz.headers['Vary']
+    assert 'Content-Encoding' not in client.get('/healthz', headers={'Accept-Encoding': 'gzip'}).headers
+
+def test_streamed_response_compressed_per_chunk():
+    """Streaming responses are compressed incrementally and stay decodable."""
+    import zlib
+    from flask import Response
+    from compression import compress_response
+    chunks = [f'{{"section": {i}, "text": "{"x" * 50}"}}\n' for i in range(5)]
+    response = Response((c for c in chunks), mimetype='application/x-ndjson')
+    compress_response(response, 'gzip', level=6)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    decoder = zlib.decompressobj(31)
+    parts = [decoder.decompress(part) for part in response.response]
+    assert parts[0] == chunks[0].encode()  # each chunk is flushed as it is produced
+    assert b''.join(parts) == ''.join(chunks).encode()
+
+def test_view_report_and_health_conditional_get(client):
+    """Cacheable endpoints carry strong ETags and answer 304 when unchanged."""
+    with client.session_transaction() as session:
+        session['response_text'] = 'Test report content'
+    first = client.get('/view-report')
+    etag = first.headers['ETag']
+    assert not etag.startswith('W/')
+    assert 'private' in first.headers['Cache-Control']
+    assert client.get('/view-report', headers={'If-None-Match': etag}).status_code == 304
+    with client.session_transaction() as session:
+        session['response_text'] = 'Edited report content'
+    assert client.get('/view-report', headers={'If-None-Match': etag}).status_code == 200
+
+    health = client.get('/healthz')
+    assert client.get('/healthz', headers={'If-None-Match': health.headers['ETag']}).status_code == 304
+    compressed = client.get('/view-report', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['ETag'] != client.get('/view-report').headers['ETag']
+
+def test_etag_has_no_coding_suffix_when_compression_is_off():
+    """Without compression the body is sent as-is, so its ETag names no content coding."""
+    from flask import Flask
+    from compression import apply_etag
+    flask_app = Flask(__name__)
+    with flask_app.test_request_context('/view-report', headers={'Accept-Encoding': 'gzip'}) as ctx:
+        body = 'x' * 2048
+        plain = apply_etag(flask_app.make_response(body), ctx.request, min_size=1024, compress=False)
+        assert not plain.get_etag()[0].endswith('-gzip')
+        encoded = apply_etag(flask_app.make_response(body), ctx.request, min_size=1024)
+        assert encoded.get_etag()[0] == plain.get_etag()[0] + '-gzip'
+
+def test_profiler_samples_tagged_requests(tmp_path):
+    """Token-tagged requests are profiled, rotated and listed on the admin route."""
+    import json
+    from app import create_app
+    from config import TestingConfig
+    with patch.multiple(TestingConfig, PROFILE_TOKEN='s3cret', PROFILE_DIR=str(tmp_path),
+                        PROFILE_MAX_FILES=2, PROFILE_INTERVAL=0.001, create=True):
+        profiled_app = create_app('testing')
+    client = profiled_app.test_client()
+
+    client.get('/healthz')
+    assert list(tmp_path.iterdir()) == []
+    for _ in range(3):
+        client.get('/view-report', headers={'X-Profile-Token': 's3cret'}, buffered=True)
+    files = sorted(tmp_path.iterdir())
+    assert len(files) == 2
+    profile = json.loads(files[-1].read_text())
+    assert profile['profiles'][0]['type'] == 'sampled'
+    assert profile['profiles'][0]['name'] == 'GET /view-report'
+
+    assert client.get('/admin/profiles').status_code == 404
+    assert client.get('/admin/profiles?token=s3cret').status_code == 404  # never from the URL (logs, referrers)
+    # A non-ASCII token header is just a wrong token, not a crash in the middleware
+    assert client.get('/healthz', headers={'X-Profile-Token': 's3crét'}).status_code == 200
+    assert client.get('/admin/profiles', headers={'X-Profile-Token': 'jalapeño'}).status_code == 404
+    listing = client.get('/admin/profiles', headers={'X-Profile-Token': 's3cret'}).get_json()
+    assert {p['name'] for p in listing['profiles']} == {f.name for f in files}
+
+def test_collapsed_stack_format():
+    """Collapsed output lists root-to-leaf frames with sample counts."""
+    from collections import Counter
+    from profiler import collapsed
+    stacks = Counter({(('index', '/app/app.py', 10), ('render', '/app/r.py', 3)): 4})
+    assert collapsed(stacks) == "index (app.py:10);render (r.py:3) 4\n"
+
+def test_readyz_served_from_cached_checks(app, client):
+    """/readyz reflects the last background check and bypasses the Flask middleware."""
+    assert client.get('/readyz').status_code == 503  # no check has run yet
+    result = app.readiness.run_once()
+    assert result['checks']['openai']['ok']
+    assert result['checks']['prompt_file']['ok']
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.get_json()['status'] in ('ready', 'degraded')
+    assert 'Access-Control-Allow-Origin' not in response.headers
+
+    with patch.object(MockOpenAI.Models, 'list', side_effect=RuntimeError('upstream down')):
+        app.readiness.run_once()
+    body = client.get('/readyz')
+    assert body.status_code == 503
+    assert body.get_json()['checks']['openai']['detail'] == 'upstream down'
+
+def test_readiness_non_critical_failure_degrades():
+    """A failing non-critical probe degrades readiness; a hung probe times out."""
+    import time
+    from readiness import Probe, ReadinessChecker
+    checker = ReadinessChecker([Probe('ok', lambda: 'fine', True),
+                                Probe('catalog', lambda: 1 / 0, False),
+                                Probe('slow', lambda: time.sleep(1) or 'late', False)], timeout=0.1)
+    result = checker.run_once()
+    assert result['status'] == 'degraded'
+    assert result['checks']['slow']['detail'].startswith('timed out')
+    assert checker.cached()[0] == '200 OK'
+
+def test_readiness_checker_starts_on_first_probe_per_process():
+    """The background checker starts on the first /readyz in each process, including after a fork."""
+    import time
+    from readiness import Probe, ReadinessChecker, ReadinessMiddleware
+    checker = ReadinessChecker([Probe('ok', lambda: 'fine', True)], interval=60)
+    middleware = ReadinessMiddleware(lambda environ, start_response: [], checker, background=True)
+    assert checker._thread is None
+
+    def probe():
+        statuses = []
+        body = middleware({'PATH_INFO': '/readyz', 'REQUEST_METHOD': 'GET'}, lambda s, h: statuses.append(s))
+        return statuses[0], body
+
+    probe()
+    parent_thread = checker._thread
+    deadline = time.monotonic() + 5
+    while probe()[0] != '200 OK' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert probe()[0] == '200 OK' and checker._thread is parent_thread
+
+    with patch('readiness.os.getpid', return_value=-1):
+        probe()
+        assert checker._thread is not parent_thread and checker._thread.is_alive()
+    checker.stop()
+
+def test_report_archive_indexes_and_dedupes():
+    """Archived reports are compressed, de-duplicated and searchable by text, region and size."""
+    from report_archive import ReportArchive, extract_metadata
+    archive = ReportArchive(batch_size=10, flush_interval=0.01)
+    assert archive._writer is None  # started on first use, in the process that uses it
+    mombasa = "## Mombasa Home System\n\nLocation: Mombasa, Kenya\n\nPV array: 1.2 kWp, LiFePO4 battery bank"
+    archive.submit("Size a 3 kWh/day system in Mombasa", mombasa, "en", "alice")
+    archive.submit("Size a 3 kWh/day system in Mombasa", mombasa, "en", "alice")
+    clinic = "# Clinic\n\nArray of 3,600 Wp with AGM batteries"
+    archive.submit("Design a clinic system in Kisumu", clinic, "sw", "alice")
+    archive.flush()
+    assert len(archive) == 2
+
+    found = archive.search("alice", "mombasa lifepo")
+    assert [r.region for r in found] == ["Mombasa, Kenya"]
+    assert found[0].system_kw == 1.2 and found[0].daily_kwh == 3.0
+    assert [r.region for r in archive.search("alice", "", min_kw=2)] == ["Kisumu"]
+    assert archive.search("alice", "clinic", language="en") == []
+    assert archive.search("alice", 'AND OR "( NEAR') == []  # FTS syntax in user input is harmless
+    assert archive.get(found[0].id, "alice")[1] == mombasa
+    assert extract_metadata("size a system", "Location: {Client Location}")["region"] is None
+
+    # Other owners neither find nor open alice's reports, but can archive the same text themselves
+    assert archive.search("bob", "mombasa") == [] and archive.search("bob") == []
+    assert archive.get(found[0].id, "bob") is None
+    archive.submit("Size a 3 kWh/day system in Mombasa", mombasa, "en", "bob")
+    archive.flush()
+    assert len(archive.search("bob", "mombasa")) == 1
+
+def test_report_archive_rank_window_is_per_owner():
+    """Other owners' newer matches never push an owner's own reports out of the ranking window."""
+    from report_archive import ReportArchive
+    archive = ReportArchive(batch_size=50, flush_interval=0.01, rank_window=5)
+    archive.submit("Size a clinic system in Nairobi", "# Alice clinic\n\nLocation: Nairobi", "en", "alice")
+    for i in range(10):
+        archive.submit(f"Size home {i} in Nairobi", f"# Bob home {i}\n\nLocation: Nairobi", "en", "bob")
+    archive.flush()
+    assert [r.title for r in archive.search("alice", "nairobi")] == ["Alice clinic"]
+    assert len(archive.search("bob", "nairobi")) == 5
+
+def test_report_archive_restarts_writer_after_fork():
+    """An archive created before a fork starts a fresh writer and connection in the child."""
+    from report_archive import ReportArchive
+    archive = ReportArchive(batch_size=10, flush_interval=0.01)
+    archive.submit("Size a 1 kWh/day system in Kitui", "# Kitui\n\n0.4 kWp array", "en", "alice")
+    archive.flush()
+    parent_writer = archive._writer
+    with patch('report_archive.os.getpid', return_value=-1):
+        archive.submit("Size a 2 kWh/day system in Embu", "# Embu\n\n0.8 kWp array", "en", "alice")
+        archive.flush()
+        assert archive._writer is not parent_writer and archive._writer.is_alive()
+        assert [r.title for r in archive.search("alice", "embu")] == ["Embu"]
+
+def test_generated_report_can_be_reopened_and_exported(app, client):
+    """Generated reports land in the archive and reopen without a model call."""
+    client.post('/', data={'prompt': 'Size a 2 kWp system in Nakuru for a shop', 'language': 'en'})
+    app.report_archive.flush()
+    listing = client.get('/reports?q=nakuru', headers={'Accept': 'application/json'}).get_json()
+    assert len(listing['reports']) == 1
+    report_id = listing['reports'][0]['id']
+    assert b'Nakuru' in client.get('/reports?q=nakuru').data
+
+    with client.session_transaction() as session:
+        session.pop('response_text', None)
+    with patch('app.chat_completion') as mock_call:
+        reopened = client.get(f'/reports/{report_id}', follow_redirects=True)
+    mock_call.assert_not_called()
+    assert b'Test AI response' in reopened.data
+    markdown = client.get(f'/reports/{report_id}/export?format=md')
+    assert markdown.data == b'Test AI response'
+    assert client.get(f'/reports/{report_id}/export').mimetype.endswith('wordprocessingml.document')
+    assert client.get('/reports/999999').status_code == 404
+
+    # Reports outlive the (short) session: ownership is a separate signed cookie
+    with client.session_transaction() as session:
+        session.clear()
+    assert len(client.get('/reports?q=nakuru', headers={'Accept': 'application/json'}).get_json()['reports']) == 1
+
+    # Another browser, or a forged owner cookie, sees none of it
+    forged = app.test_client()
+    forged.set_cookie('localhost', 'archive_owner', 'not-a-signed-owner-id')
+    assert forged.get(f'/reports/{report_id}').status_code == 404
+    other = app.test_client()
+    assert other.get('/reports?q=nakuru', headers={'Accept': 'application/json'}).get_json()['reports'] == []
+    assert other.get(f'/reports/{report_id}').status_code == 404
+    assert other.get(f'/reports/{report_id}/export?format=md').status_code == 404
+
+def test_financial_model_matches_cash_flow_arithmetic():
+    """Vectorised NPV, LCOE and payback agree with a year-by-year calculation."""
+    import numpy as np
+    from financial_model import evaluate, scenario_grid
+    # $1,000 upfront, 1,000 kWh/yr at $0.20 with no costs: $200/yr, repaid after exactly 5 years
+    single = evaluate(1000, 0, 1000, 0.20, 0.10, 0.0, lifetime=10, battery_life=0, opex_rate=0)
+    assert single['payback'] == pytest.approx(5.0)
+    assert single['npv'] == pytest.approx(sum(200 / 1.1 ** y for y in range(1, 11)) - 1000)
+    assert single['lcoe'] == pytest.approx(1000 / sum(1000 / 1.1 ** y for y in range(1, 11)))
+
+    grid = scenario_grid(tariff=[0.05, 0.25], discount_rate=[0.05, 0.12], degradation=[0.0, 0.01],
+                         price_factor=[0.8, 1.2])
+    metrics = evaluate(4000, 1500, 3650, grid['tariff'], grid['discount_rate'], grid['degradation'],
+                       grid['price_factor'])
+    for i in range(len(grid['tariff'])):
+        factor, rate = grid['price_factor'][i], grid['discount_rate'][i]
+        cash = [3650 * (1 - grid['degradation'][i]) ** (y - 1) * grid['tariff'][i] -
+                factor * (4000 * 0.015 + (1500 if y in (10, 20) else 0)) for y in range(1, 26)]
+        npv = sum(c / (1 + rate) ** y for y, c in enumerate(cash, 1)) - 4000 * factor
+        assert metrics['npv'][i] == pytest.approx(npv)
+    assert np.isnan(metrics['payback'][grid['tariff'] == 0.05]).all()  # never repaid at $0.05/kWh
+
+def test_financial_analysis_route_and_prompt_facts(client):
+    """/finance returns the scenario grid as JSON and design prompts carry the figures."""
+    response = client.get('/finance?daily_kwh=8&tariffs=0.12,0.2&diesel_price=1.5&lifetime=20')
+    result = response.get_json()
+    assert response.status_code == 200
+    assert [row['tariff'] for row in result['by_tariff']][-1].startswith('diesel')
+    assert result['scenarios'] == 3 * 3 * 2 * 3 and result['assumptions']['lifetime_years'] == 20
+    assert client.get('/finance').status_code == 400  # no demand known yet
+    assert client.get('/finance?daily_kwh=8&tariffs=a,b').status_code == 400
+
+    with patch.object(MockOpenAI.ChatCompletions, 'create', return_value=mock_chat_completion) as create:
+        client.post('/', data={'prompt': 'Design a solar system for a home using 6 kWh per day',
+                               'language': 'en'})
+    system_prompt = create.call_args.kwargs['messages'][0]['content']
+    assert 'FINANCIAL ANALYSIS' in system_prompt and 'payback' in system_prompt
+
+def test_minigrid_load_aggregation_diversifies_peak():
+    """Simulated mini-grid peaks sit well below the sum of household peaks, reproducibly."""
+    from load_aggregation import LoadAggregator, connection_mix, simulate
+    assert connection_mix("Mini-grid for 1,200 households and 30 shops") == \
+        {'tier1': 480, 'tier2': 540, 'tier3': 180, 'business': 30}
+    assert connection_mix("Solar for 300 tier 3 homes") == {'tier3': 300}
+    assert connection_mix("3 tier 2 homes and 200 homes") == {'tier1': 80, 'tier2': 93, 'tier3': 30}
+    assert connection_mix("100 homes at tier 3 and 50 tier 1 houses") == {'tier3': 100, 'tier1': 50}
+    assert connection_mix("Size a 3 kWh/day system in Mombasa") == {}
+
+    result = simulate({'tier2': 400, 'business': 10}, trials=96, seed=7)
+    assert result['peak_kw']['p90'] < result['undiversified_peak_kw']
+    assert 0 < result['coincidence_factor']['p50'] < 1
+    assert result['daily_kwh']['p10'] <= result['daily_kwh']['p50'] <= result['daily_kwh']['p90']
+    assert 18 <= result['peak_hour'] <= 21
+    assert simulate({'tier2': 400, 'business': 10}, trials=96, seed=7, workers=2)['peak_kw'] == result['peak_kw']
+    with pytest.raises(ValueError):
+        simulate({'mill': 3})
+
+    # Large sites get fewer trials but never more than the sample budget
+    aggregator = LoadAggregator(trials=1000, sample_budget=50000, min_trials=100, max_connections=20000)
+    assert aggregator.max_connections == 500
+    assert aggregator.simulate({'tier1': 400})['trials'] == 125
+    with pytest.raises(ValueError):
+        aggregator.simulate({'tier1': 600})
+
+def test_minigrid_prompt_gets_aggregated_demand(app, client):
+    """Mini-grid design prompts carry the simulated demand, which also sizes the catalog block."""
+    with patch.object(MockOpenAI.ChatCompletions, 'create', return_value=mock_chat_completion) as create:
+        client.post('/', data={'prompt': 'Design a solar mini-grid for 600 households in Marsabit',
+                               'language': 'en'})
+    system_prompt = create.call_args.kwargs['messages'][0]['content']
+    assert 'MINI-GRID LOAD AGGREGATION' in system_prompt and 'Connections: 600' in system_prompt
+    p90 = app.load_aggregator.simulate({'tier1': 240, 'tier2': 270, 'tier3': 90})['daily_kwh']['p90']
+    assert f"Battery bank target: {p90 * 2 / 0.9:.1f} kWh" in system_prompt
@@ -0,0 +1,150 @@
+"""Generate-once, translate-many pipeline for the supported report languages.
+
+The canonical report is generated once in English; other languages are
+produced by translating it section by section in parallel. Numbers are masked
+with placeholders before translation and restored afterwards, so every figure
+is identical across languages. Translated paragraphs are kept in a translation
+memory keyed by language and paragraph hash, so recurring boilerplate (safety
+notes, disclaimers, closing lines) costs nothing after the first time.
+"""
+import contextvars
+import hashlib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_utils import LRUCache
+
+logger = logging.getLogger('solar_assistant')
+
+TRANSLATION_INSTRUCTIONS = """You are a professional technical translator for solar PV engineering reports.
+Translate the user's text from English into {language}.
+Rules:
+- Each paragraph starts with a marker line like [[0]]; keep every marker line exactly as-is and in order.
+- Keep every placeholder such as ⟦3⟧ exactly as-is; they stand for numbers.
+- Preserve Markdown structure: headings, bullet points, tables, bold and separators.
+- Keep units (kWh, Wp, V, A, Ah, mm²), standards (IEC, NEC, KEBS) and catalog IDs untranslated.
+- Output only the translation.
+"""
+
+NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+PLACEHOLDER_RE = re.compile(r"⟦(\d+)⟧")
+MARKER_RE = re.compile(r"(?m)^\[\[(\d+)\]\]\s*$")
+LETTER_RE = re.compile(r"[^\W\d_]")
+
+MAX_CHUNK_CHARS = 3000
+
+
+def mask_numbers(text):
+    """Replace numbers with ⟦i⟧ placeholders; returns (masked text, numbers)"""
+    numbers = []
+
+    def replace(match):
+        numbers.append(match.group(0))
+        return f"⟦{len(numbers) - 1}⟧"
+
+    return NUMBER_RE.sub(replace, text), numbers
+
+
+def unmask_numbers(text, numbers):
+    """Restore placeholders; returns None if any number was lost or invented"""
+    found = [int(i) for i in PLACEHOLDER_RE.findall(text)]
+    if sorted(set(found)) != list(range(len(numbers))):
+        return None
+    return PLACEHOLDER_RE.sub(lambda m: numbers[int(m.group(1))], text)
+
+
+def split_paragraphs(text):
+    return [p for p in re.split(r"\n\s*\n", text.strip()) if p.strip()]
+
+
+def split_sections(report):
+    """Split a Markdown report into translation chunks at headings, capped in size"""
+    sections = [s for s in re.split(r"(?m)^(?=#{1,3} )", report) if s.strip()]
+    chunks = []
+    for section in sections:
+        current = []
+        size = 0
+        for paragraph in split_paragraphs(section):
+            if current and size + len(paragraph) > MAX_CHUNK_CHARS:
+                chunks.append(current)
+                current, size = [], 0
+            current.append(paragraph)
+            size += len(paragraph)
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def needs_translation(paragraph):
+    return bool(LETTER_RE.search(paragraph)) and paragraph.strip() != "---"
+
+
+class ReportTranslator:
+    """Translates canonical reports, reusing a translation memory of paragraphs"""
+
+    def __init__(self, call, max_parallel=4, memory_entries=20000):
+        """``call(system_prompt, text)`` returns the model's translation of ``text``"""
+        self.call = call
+        self.memory = LRUCache(memory_entries)
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="translate")
+
+    @staticmethod
+    def _memory_key(language, paragraph):
+        return (language, hashlib.sha1(paragraph.encode("utf-8")).hexdigest())
+
+    def _request(self, language, paragraphs):
+        """Translate masked paragraphs in one call; returns a list (None where unusable)"""
+        masked = [mask_numbers(p) for p in paragraphs]
+        text = "\n\n".join(f"[[{i}]]\n{m[0]}" for i, m in enumerate(masked))
+        reply = self.call(TRANSLATION_INSTRUCTIONS.format(language=language), text)
+
+        parts = MARKER_RE.split(reply)
+        translated = {}
+        for i in range(1, len(parts) - 1, 2):
+            translated[int(parts[i])] = parts[i + 1].strip()
+        return [unmask_numbers(translated[i], numbers) if i in translated else None
+                for i, (_, numbers) in enumerate(masked)]
+
+    def _translate_chunk(self, paragraphs, language):
+        out = list(paragraphs)
+        todo = []
+        for i, paragraph in enumerate(paragraphs):
+            if not needs_translation(paragraph):
+                continue
+            remembered = self.memory.get(self._memory_key(language, paragraph))
+            if remembered is not None:
+                out[i] = remembered
+            else:
+                todo.append(i)
+
+        for attempt in range(2):
+            if not todo:
+                break
+            try:
+                results = self._request(language, [paragraphs[i] for i in todo])
+            except Exception as e:
+                logger.warning(f"Translation to {language} failed (attempt {attempt + 1}): {e}")
+                continue
+            remaining = []
+            for i, result in zip(todo, results):
+                if result is None:
+                    remaining.append(i)
+                else:
+                    out[i] = result
+                    self.memory.put(self._memory_key(language, paragraphs[i]), result)
+            todo = remaining
+
+        if todo:
+            # Keep the English paragraph rather than risk altered figures
+            logger.warning(f"Kept {len(todo)} paragraph(s) untranslated to preserve numeric values")
+        return "\n\n".join(out)
+
+    def translate(self, report, language):
+        """Translate a canonical English report into ``language`` (a language name)"""
+        chunks = split_sections(report)
+        futures = [self._executor.submit(contextvars.copy_context().run, self._translate_chunk, c, language)
+                   for c in chunks]
+        translated = [f.result() for f in futures]
+        logger.info(f"Translated report into {language} in {len(chunks)} chunks")
+        return "\n\n".join(translated) + "\n"